@@ -0,0 +1,414 @@
+"""长期统计：周/月趋势、连续学习天数、各学习内容的移动平均、按星期和小时的热力图
+
+    python analytics.py weekly
+    python analytics.py monthly --backend sqlite
+    python analytics.py streaks
+    python analytics.py moving --window 7
+    python analytics.py heatmap
+
+历史记录读取为按列的数组（安装了 NumPy 时为 NumPy 数组，统计都用 bincount 等向量化运算），
+并缓存到 <历史文件>.npz，历史文件大小和修改时间不变时直接读取缓存。
+没有 NumPy 时使用纯 Python 实现，结果相同。
+"""
+import argparse
+import os
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
+
+from history_archive import read_archive
+from history_store import HISTORY_BACKENDS, open_history_store
+from remarks import RemarkDictionary
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+# 缓存格式变化时修改版本号，旧缓存自动失效
+CACHE_VERSION = 1
+
+
+def day_number(date_str):
+    """日期字符串 -> 1970-01-01 起的天数"""
+    return date.fromisoformat(date_str).toordinal() - EPOCH_ORDINAL
+
+
+def day_string(day):
+    """1970-01-01 起的天数 -> 日期字符串"""
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+def clock_seconds(time_str):
+    """HH:MM:SS -> 当天的秒数"""
+    hours, minutes, seconds = time_str.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+class HistoryColumns:
+    """按列保存的历史记录，每个下标是一条记录（或一行归档汇总）：
+
+    - day       1970-01-01 起的天数
+    - clock     开始时间在当天的秒数；归档汇总没有开始时间，为 -1
+    - duration  时长（秒）
+    - remark    备注编号，对应 remarks 中的下标
+    - count     次数：逐条记录为 1，归档汇总为当天该内容的学习次数
+    有 NumPy 时各列是 NumPy 数组，否则是列表。
+    """
+
+    def __init__(self, day, clock, duration, remark, count, remarks):
+        self.day = day
+        self.clock = clock
+        self.duration = duration
+        self.remark = remark
+        self.count = count
+        self.remarks = remarks
+
+    def __len__(self):
+        return len(self.day)
+
+
+def source_files(store):
+    """统计依赖的文件：历史文件，CSV 后端还有归档文件"""
+    files = [store.history_file]
+    archive_file = getattr(store, "archive_file", None)
+    if archive_file is not None:
+        files.append(archive_file)
+    return files
+
+
+def source_key(files):
+    """各文件的 (大小, 修改时间)，作为缓存是否有效的依据；文件不存在时为 (-1, -1)"""
+    key = []
+    for path in files:
+        try:
+            st = os.stat(path)
+            key += [st.st_size, st.st_mtime_ns]
+        except OSError:
+            key += [-1, -1]
+    return key
+
+
+def build_columns(store):
+    """遍历存储中的记录（以及归档汇总），构建按列的数组"""
+    day, clock, duration, remark, count = [], [], [], [], []
+    remarks = RemarkDictionary()
+    code_of = remarks.intern
+    # 日期大量重复，每个日期只解析一次
+    day_cache = {}
+
+    archive_file = getattr(store, "archive_file", None)
+    if archive_file is not None:
+        for (date_str, remark_text), (tenths, times) in read_archive(archive_file).items():
+            day.append(day_number(date_str))
+            clock.append(-1)
+            duration.append(tenths / 10)
+            remark.append(code_of(remark_text))
+            count.append(times)
+    for record in store.iter_records():
+        number = day_cache.get(record.date)
+        if number is None:
+            number = day_cache[record.date] = day_number(record.date)
+        day.append(number)
+        clock.append(clock_seconds(record.start))
+        duration.append(record.duration)
+        remark.append(code_of(record.remark))
+        count.append(1)
+    if np is not None:
+        return HistoryColumns(
+            np.array(day, dtype=np.int32), np.array(clock, dtype=np.int32),
+            np.array(duration, dtype=np.float64), np.array(remark, dtype=np.int32),
+            np.array(count, dtype=np.int32), remarks.texts
+        )
+    return HistoryColumns(day, clock, duration, remark, count, remarks.texts)
+
+
+def binary_columns(store):
+    """二进制后端的记录文件本身就是定长的列，直接用 NumPy 读取，不逐条解码"""
+    store.load_remarks()
+    records = np.fromfile(store.history_file, dtype=np.dtype([
+        ("start", "<i8"), ("end", "<i8"), ("tenths", "<i4"), ("remark", "<u4"),
+    ]))
+    return HistoryColumns(
+        (records["start"] // SECONDS_PER_DAY).astype(np.int32),
+        (records["start"] % SECONDS_PER_DAY).astype(np.int32),
+        records["tenths"] / 10,
+        records["remark"].astype(np.int32),
+        np.ones(len(records), dtype=np.int32),
+        list(store.remarks)
+    )
+
+
+def cache_file_for(history_file):
+    return history_file + ".npz"
+
+
+def read_cache(cache_file, key):
+    """读取 .npz 缓存，不存在、版本不同或源文件已变化时返回 None"""
+    try:
+        with np.load(cache_file) as data:
+            if int(data["version"]) != CACHE_VERSION or data["key"].tolist() != key:
+                return None
+            return HistoryColumns(
+                data["day"], data["clock"], data["duration"], data["remark"], data["count"],
+                data["remarks"].tolist()
+            )
+    except Exception:
+        # 缓存损坏时重新构建
+        return None
+
+
+def write_cache(cache_file, key, columns):
+    """写入 .npz 缓存（先写临时文件再替换）"""
+    temp_file = cache_file + ".tmp.npz"
+    try:
+        np.savez(
+            temp_file, version=CACHE_VERSION, key=np.array(key, dtype=np.int64),
+            day=columns.day, clock=columns.clock, duration=columns.duration,
+            remark=columns.remark, count=columns.count,
+            remarks=np.array(columns.remarks, dtype=str)
+        )
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"写入统计缓存失败: {e}")
+
+
+def apply_aliases(columns, table):
+    """按别名/合并表合并备注编号（缓存中保存的是原始备注，别名修改后不用重建缓存）"""
+    if not table or not any(text in table for text in columns.remarks):
+        return columns
+    merged = RemarkDictionary()
+    codes = [merged.intern(table.get(text, text)) for text in columns.remarks]
+    if np is not None:
+        remark = np.array(codes, dtype=np.int32)[columns.remark]
+    else:
+        remark = [codes[code] for code in columns.remark]
+    return HistoryColumns(columns.day, columns.clock, columns.duration, remark, columns.count, merged.texts)
+
+
+def load_columns(store, use_cache=True):
+    """读取按列的历史记录；有 NumPy 时使用 .npz 缓存。备注按别名合并"""
+    table = store.remark_aliases().mapping()
+    if np is not None and hasattr(store, "remark_file"):
+        # 二进制后端直接读取比读缓存还快
+        return apply_aliases(binary_columns(store), table)
+    if np is None or not use_cache:
+        return apply_aliases(build_columns(store), table)
+    cache_file = cache_file_for(store.history_file)
+    key = source_key(source_files(store))
+    columns = read_cache(cache_file, key)
+    if columns is None:
+        columns = build_columns(store)
+        write_cache(cache_file, key, columns)
+    return apply_aliases(columns, table)
+
+
+def group_sum(keys, weights):
+    """按 keys 分组求和，返回 (排序后的不同 key, 各组之和)"""
+    if np is not None:
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return unique.tolist(), np.bincount(inverse, weights=weights, minlength=len(unique)).tolist()
+    totals = {}
+    for key, weight in zip(keys, weights):
+        totals[key] = totals.get(key, 0.0) + weight
+    unique = sorted(totals)
+    return unique, [totals[key] for key in unique]
+
+
+def period_totals(columns, period="week"):
+    """按周（从周一开始）或按月汇总，返回 [(周一的日期 / YYYY-MM, 总时长)]，按时间升序"""
+    if len(columns) == 0:
+        return []
+    if period == "week":
+        # 1970-01-01 是星期四
+        if np is not None:
+            keys = columns.day - (columns.day + 3) % 7
+        else:
+            keys = [day - (day + 3) % 7 for day in columns.day]
+        unique, totals = group_sum(keys, columns.duration)
+        return [(day_string(day), total) for day, total in zip(unique, totals)]
+    if period == "month":
+        if np is not None:
+            keys = columns.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        else:
+            month_cache = {}
+            keys = []
+            for day in columns.day:
+                key = month_cache.get(day)
+                if key is None:
+                    d = date.fromordinal(day + EPOCH_ORDINAL)
+                    key = month_cache[day] = (d.year - 1970) * 12 + d.month - 1
+                keys.append(key)
+        unique, totals = group_sum(keys, columns.duration)
+        return [(f"{1970 + key // 12}-{key % 12 + 1:02d}", total) for key, total in zip(unique, totals)]
+    raise ValueError(f"未知的统计周期: {period}")
+
+
+def study_days(columns, min_seconds=0.0):
+    """学习总时长超过 min_seconds 的日期（天数），升序"""
+    days, totals = group_sum(columns.day, columns.duration)
+    return [day for day, total in zip(days, totals) if total > min_seconds]
+
+
+def streaks(columns, min_seconds=0.0, today=None):
+    """连续学习天数，返回 {"current", "longest", "longest_start", "longest_end"}；
+    今天还没有学习时，当前连续天数从昨天算起"""
+    days = study_days(columns, min_seconds)
+    result = {"current": 0, "longest": 0, "longest_start": None, "longest_end": None}
+    if not days:
+        return result
+    if np is not None:
+        values = np.array(days)
+        # 每一段连续日期的开头位置
+        breaks = np.flatnonzero(np.diff(values) != 1) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(values)]))
+        lengths = ends - starts
+        best = int(np.argmax(lengths))
+        runs = list(zip(values[starts].tolist(), values[ends - 1].tolist(), lengths.tolist()))
+    else:
+        runs = []
+        run_start = prev = days[0]
+        for day in days[1:]:
+            if day != prev + 1:
+                runs.append((run_start, prev, prev - run_start + 1))
+                run_start = day
+            prev = day
+        runs.append((run_start, prev, prev - run_start + 1))
+        best = max(range(len(runs)), key=lambda i: runs[i][2])
+    result["longest"] = runs[best][2]
+    result["longest_start"] = day_string(runs[best][0])
+    result["longest_end"] = day_string(runs[best][1])
+    today = day_number(today or date.today().isoformat())
+    last_start, last_end, last_length = runs[-1]
+    if last_end >= today - 1:
+        result["current"] = last_length
+    return result
+
+
+def daily_remark_matrix(columns):
+    """每天每个学习内容的总时长：返回 (第一天, 天数, 矩阵)，矩阵按 [天][备注编号]"""
+    width = len(columns.remarks)
+    if np is not None:
+        first = int(columns.day.min())
+        days = int(columns.day.max()) - first + 1
+        index = (columns.day - first).astype(np.int64) * width + columns.remark
+        matrix = np.bincount(index, weights=columns.duration, minlength=days * width)
+        return first, days, matrix.reshape(days, width)
+    first = min(columns.day)
+    days = max(columns.day) - first + 1
+    matrix = [[0.0] * width for _ in range(days)]
+    for day, remark, duration in zip(columns.day, columns.remark, columns.duration):
+        matrix[day - first][remark] += duration
+    return first, days, matrix
+
+
+def moving_averages(columns, window=7):
+    """各学习内容每天的 window 天移动平均（没有学习的日子按 0 计），
+    返回 {备注: [(日期, 当天时长, 移动平均)]}，日期从第一条记录到最后一条记录"""
+    if len(columns) == 0:
+        return {}
+    first, days, matrix = daily_remark_matrix(columns)
+    if np is not None:
+        cumulative = np.vstack((np.zeros((1, matrix.shape[1])), np.cumsum(matrix, axis=0)))
+        upper = np.arange(1, days + 1)
+        lower = np.maximum(upper - window, 0)
+        averages = (cumulative[upper] - cumulative[lower]) / (upper - lower)[:, None]
+        # 转置成按备注的列，生成结果时不必逐格访问二维数组
+        by_remark = matrix.T.tolist()
+        average_by_remark = averages.T.tolist()
+    else:
+        averages = []
+        sums = [0.0] * len(columns.remarks)
+        for i, row in enumerate(matrix):
+            for j, value in enumerate(row):
+                sums[j] += value
+                if i >= window:
+                    sums[j] -= matrix[i - window][j]
+            span = min(i + 1, window)
+            averages.append([total / span for total in sums])
+        by_remark = [list(column) for column in zip(*matrix)]
+        average_by_remark = [list(column) for column in zip(*averages)]
+    dates = [day_string(first + i) for i in range(days)]
+    return {
+        remark: list(zip(dates, by_remark[j], average_by_remark[j]))
+        for j, remark in enumerate(columns.remarks)
+    }
+
+
+def hour_heatmap(columns):
+    """按 星期(0=周一) × 小时 统计学习时长（秒），返回 7 行 24 列的列表。
+    跨越整点（以及午夜）的记录按实际时间拆分到各个小时；归档汇总没有开始时间，不计入"""
+    if np is not None:
+        exact = columns.clock >= 0
+        start = columns.day[exact].astype(np.int64) * SECONDS_PER_DAY + columns.clock[exact]
+        end = start + columns.duration[exact]
+        if len(start) == 0:
+            return [[0.0] * 24 for _ in range(7)]
+        first_hour = int(start.min() // 3600)
+        hours = int(end.max() // 3600) - first_hour + 2
+        start_hour = start // 3600 - first_hour
+        end_hour = (end // 3600).astype(np.int64) - first_hour
+        same = start_hour == end_hour
+        per_hour = np.bincount(start_hour[same], weights=end[same] - start[same], minlength=hours)
+        split = ~same
+        # 第一个小时和最后一个小时的零头
+        head = (start_hour[split] + first_hour + 1) * 3600 - start[split]
+        tail = end[split] - (end_hour[split] + first_hour) * 3600
+        per_hour += np.bincount(start_hour[split], weights=head, minlength=hours)
+        per_hour += np.bincount(end_hour[split], weights=tail, minlength=hours)
+        # 中间的整小时：差分数组再累加
+        diff = np.bincount(start_hour[split] + 1, minlength=hours + 1)[:hours + 1] \
+            - np.bincount(end_hour[split], minlength=hours + 1)[:hours + 1]
+        per_hour += np.cumsum(diff)[:hours] * 3600.0
+        absolute = np.arange(hours) + first_hour
+        # 1970-01-01 是星期四（周一为 0 时是 3）
+        weekday = (absolute // 24 + 3) % 7
+        heatmap = np.bincount(weekday * 24 + absolute % 24, weights=per_hour, minlength=7 * 24)
+        return heatmap.reshape(7, 24).tolist()
+    heatmap = [[0.0] * 24 for _ in range(7)]
+    for day, clock, duration in zip(columns.day, columns.clock, columns.duration):
+        if clock < 0:
+            continue
+        position = day * SECONDS_PER_DAY + clock
+        end = position + duration
+        while position < end:
+            hour = int(position // 3600)
+            chunk = min(end, (hour + 1) * 3600) - position
+            heatmap[(hour // 24 + 3) % 7][hour % 24] += chunk
+            position += chunk
+    return heatmap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学习历史的长期统计")
+    parser.add_argument("report", choices=["weekly", "monthly", "streaks", "moving", "heatmap"], help="统计类型")
+    parser.add_argument("--backend", default="csv", choices=sorted(HISTORY_BACKENDS), help="存储后端")
+    parser.add_argument("--file", help="历史记录文件（默认使用该后端的默认文件名）")
+    parser.add_argument("--window", type=int, default=7, help="移动平均的天数")
+    parser.add_argument("--no-cache", action="store_true", help="不使用 .npz 缓存")
+    args = parser.parse_args()
+
+    store = open_history_store(args.backend, args.file)
+    columns = load_columns(store, use_cache=not args.no_cache)
+    if args.report in ("weekly", "monthly"):
+        for label, total in period_totals(columns, "week" if args.report == "weekly" else "month"):
+            print(f"{label:<12} {total / 3600:8.1f}h")
+    elif args.report == "streaks":
+        result = streaks(columns)
+        print(f"当前连续学习: {result['current']} 天")
+        print(f"最长连续学习: {result['longest']} 天（{result['longest_start']} ~ {result['longest_end']}）")
+    elif args.report == "moving":
+        for remark, rows in moving_averages(columns, args.window).items():
+            date_str, _, average = rows[-1]
+            print(f"{remark:<10} 截至 {date_str} 的 {args.window} 天平均: {average / 60:.1f}min/天")
+    else:
+        print("      " + "".join(f"{hour:>5}" for hour in range(24)))
+        for weekday, row in zip("一二三四五六日", hour_heatmap(columns)):
+            print(f"星期{weekday}  " + "".join(f"{seconds / 3600:>5.1f}" for seconds in row))
+    if hasattr(store, "close"):
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""图表数据的基准测试：按天/周/月汇总的建立、读写缓存、随机缩放范围的取数和堆叠分层、增量追加
+
+    python benchmarks/bench_charts.py --rows 100000 1000000 --queries 1000
+
+记录在内存中生成（不写历史文件），只测量图表汇总本身和取数的开销（不含 Tk 绘制）。
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chart_rollups import ChartRollups  # noqa: E402
+from generate_history import generate_rows  # noqa: E402
+from history_aggregates import HistoryAggregates  # noqa: E402
+from history_store import Record  # noqa: E402
+from study_timer import chart_layers  # noqa: E402
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图表数据基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000], help="记录条数")
+    parser.add_argument("--queries", type=int, default=1000, help="随机范围的次数")
+    parser.add_argument("--points", type=int, default=240, help="每次最多的桶数（画布宽度 / 每点像素）")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    workdir = tempfile.mkdtemp(prefix="study_timer_charts_")
+
+    try:
+        for rows in args.rows:
+            aggregates = HistoryAggregates(keep_sessions=False)
+            for row in generate_rows(rows):
+                aggregates.add(Record(row[0], row[1], row[2], float(row[3]), row[4]))
+
+            start = time.perf_counter()
+            rollups = ChartRollups()
+            for date_str, remarks in aggregates.by_date_remark.items():
+                for remark, duration in remarks.items():
+                    rollups.add(date_str, remark, duration)
+            build = time.perf_counter() - start
+
+            cache_file = os.path.join(workdir, f"{rows}.charts.json")
+            start = time.perf_counter()
+            rollups.save(cache_file)
+            save = time.perf_counter() - start
+            start = time.perf_counter()
+            rollups = ChartRollups.load(cache_file)
+            load = time.perf_counter() - start
+
+            first, last = rollups.span()
+            low, high = date.fromisoformat(first).toordinal(), date.fromisoformat(last).toordinal()
+            latencies = []
+            levels = {}
+            for _ in range(args.queries):
+                since, until = sorted(rng.sample(range(low, high + 1), 2))
+                since, until = date.fromordinal(since).isoformat(), date.fromordinal(until).isoformat()
+                begin = time.perf_counter()
+                level, step, buckets = rollups.downsampled(since, until, args.points)
+                chart_layers(buckets)
+                latencies.append(time.perf_counter() - begin)
+                levels[level] = levels.get(level, 0) + 1
+            latencies.sort()
+
+            appends = []
+            for i in range(1000):
+                begin = time.perf_counter()
+                rollups.add(last, "高数", float(i % 600))
+                appends.append(time.perf_counter() - begin)
+            appends.sort()
+            print(f"{rows:>9} 条 / {len(rollups.keys('day'))} 天: 建立 {build * 1000:.0f}ms，"
+                  f"写缓存 {save * 1000:.0f}ms，读缓存 {load * 1000:.0f}ms；"
+                  f"取数+分层 p50 {percentile(latencies, 0.5):.2f}ms p99 {percentile(latencies, 0.99):.2f}ms "
+                  f"（粒度 {levels}）；追加 p50 {percentile(appends, 0.5) * 1000:.1f}us")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""并行读取 CSV 的基准测试：单进程逐行读取与 1/2/4/... 个进程分块读取的耗时，并核对结果相同
+
+    python benchmarks/bench_ingest.py --rows 10000000 --workers 1 2 4 8
+
+生成的历史文件写在临时目录中，测完删除。加速比受 CPU 核数限制，超过核数的进程数不会更快。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_history import write_history  # noqa: E402
+from parallel_ingest import ingest, same_aggregates, serial_aggregates  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行读取 CSV 的基准测试")
+    parser.add_argument("--rows", type=int, default=1000000, help="生成的记录条数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="进程数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="study_timer_ingest_")
+    try:
+        path = os.path.join(workdir, "timer_history.csv")
+        write_history(path, args.rows)
+        size = os.path.getsize(path) / 1e6
+        print(f"{args.rows} 条记录，{size:.0f}MB，CPU 核数 {os.cpu_count()}")
+
+        start = time.perf_counter()
+        expected = serial_aggregates([path])
+        serial = time.perf_counter() - start
+        print(f"  单进程逐行读取: {serial:.2f}s")
+        for workers in args.workers:
+            start = time.perf_counter()
+            aggregates = ingest([path], workers)
+            elapsed = time.perf_counter() - start
+            same = same_aggregates(aggregates, expected)
+            print(f"  {workers:>2} 个进程: {elapsed:.2f}s（{serial / elapsed:.2f}x，{size / elapsed:.0f}MB/s），"
+                  f"结果{'相同' if same else '不同'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
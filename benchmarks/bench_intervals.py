@@ -0,0 +1,67 @@
+"""去重（区间合并）引擎的基准测试：完整构建（extend）、增量追加，并与逐天排序合并的结果核对
+
+    python benchmarks/bench_intervals.py --rows 1000000 3000000
+
+记录在内存中生成（不写文件），只测量区间合并本身的开销。
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_history import generate_rows  # noqa: E402
+from history_store import Record  # noqa: E402
+from intervals import IntervalTotals, covered_seconds  # noqa: E402
+
+
+def records_of(rows):
+    return [Record(row[0], row[1], row[2], float(row[3]), row[4]) for row in generate_rows(rows)]
+
+
+def sort_merge_totals(records):
+    """对照：按天收集全部区间后排序合并"""
+    helper = IntervalTotals()
+    by_day = {}
+    for record in records:
+        by_day.setdefault(record.date, []).append(helper.interval_of(record))
+    return {date: covered_seconds(intervals) for date, intervals in by_day.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去重引擎基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000], help="记录条数")
+    parser.add_argument("--appends", type=int, default=10000, help="增量追加的次数")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        records = records_of(rows)
+        start = time.perf_counter()
+        totals = IntervalTotals()
+        totals.extend(records)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = sort_merge_totals(records)
+        sort_merge = time.perf_counter() - start
+        got = totals.daily_totals()
+        mismatches = sum(1 for date, total in expected.items() if abs(got.get(date, 0.0) - total) > 1e-6)
+
+        # 增量追加到最后一天：每次追加的延迟
+        last = records[-1]
+        latencies = []
+        for i in range(args.appends):
+            record = last._replace(duration=float(i % 600))
+            begin = time.perf_counter()
+            totals.add(record)
+            latencies.append(time.perf_counter() - begin)
+        latencies.sort()
+        print(f"{rows:>9} 条: 构建 {build:.2f}s ({rows / build:,.0f} 条/秒)，排序合并对照 {sort_merge:.2f}s，"
+              f"不一致的天数 {mismatches}；增量追加 p50 {latencies[len(latencies) // 2] * 1e6:.1f}us "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""日期范围查询（树状数组）的基准测试：由每日汇总建立、随机范围查询、增量追加，并与逐天累加的结果核对
+
+    python benchmarks/bench_ranges.py --rows 1000000 --queries 10000
+
+记录在内存中生成（不写文件），先累加成每日汇总，只测量范围索引本身的开销。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_history import generate_rows  # noqa: E402
+from history_aggregates import HistoryAggregates  # noqa: E402
+from history_store import Record  # noqa: E402
+from range_index import RangeIndex  # noqa: E402
+
+
+def scan_total(daily, since, until):
+    """对照：遍历每日汇总累加"""
+    return sum(total for date, (total, _) in daily.items() if since <= date <= until)
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日期范围查询基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000], help="记录条数")
+    parser.add_argument("--queries", type=int, default=10000, help="随机范围查询的次数")
+    parser.add_argument("--appends", type=int, default=10000, help="增量追加的次数")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    for rows in args.rows:
+        aggregates = HistoryAggregates(keep_sessions=False)
+        for row in generate_rows(rows):
+            aggregates.add(Record(row[0], row[1], row[2], float(row[3]), row[4]))
+        dates = sorted(aggregates.daily)
+
+        start = time.perf_counter()
+        ranges = RangeIndex()
+        ranges.extend(aggregates.daily, aggregates.by_date_remark)
+        build = time.perf_counter() - start
+
+        bounds = [sorted(rng.sample(dates, 2)) for _ in range(args.queries)]
+        latencies = []
+        remark_latencies = []
+        for since, until in bounds:
+            begin = time.perf_counter()
+            ranges.total(since, until)
+            latencies.append(time.perf_counter() - begin)
+            begin = time.perf_counter()
+            ranges.remark_totals(since, until)
+            remark_latencies.append(time.perf_counter() - begin)
+        latencies.sort()
+        remark_latencies.sort()
+
+        checked = bounds[:100]
+        start = time.perf_counter()
+        expected = [scan_total(aggregates.daily, since, until) for since, until in checked]
+        scan = (time.perf_counter() - start) / len(checked)
+        mismatches = sum(1 for (since, until), total in zip(checked, expected)
+                         if abs(ranges.total(since, until)[0] - total) > 1e-3)
+
+        append_latencies = []
+        for i in range(args.appends):
+            begin = time.perf_counter()
+            ranges.add(dates[-1], "高数", float(i % 600))
+            append_latencies.append(time.perf_counter() - begin)
+        append_latencies.sort()
+        print(f"{rows:>9} 条 / {len(dates)} 天: 建立 {build * 1000:.1f}ms；"
+              f"总时长查询 p50 {percentile(latencies, 0.5):.1f}us p99 {percentile(latencies, 0.99):.1f}us，"
+              f"按内容 p50 {percentile(remark_latencies, 0.5):.1f}us，逐天累加对照 {scan * 1e6:.0f}us，"
+              f"不一致 {mismatches}；增量追加 p50 {percentile(append_latencies, 0.5):.1f}us")
+
+
+if __name__ == "__main__":
+    main()
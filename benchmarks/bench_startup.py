@@ -0,0 +1,92 @@
+"""启动耗时基准测试：历史记录从 1k 增长到 1M 条时，首帧时间应保持不变
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --sizes 1000 10000 100000 1000000
+
+没有图形界面（无 DISPLAY）时只测量不依赖 tkinter 的部分：
+今天总时长的倒序读取耗时与完整读取耗时的对比。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_history import write_history  # noqa: E402
+from history_store import HistoryStore, tail_day_total  # noqa: E402
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def measure_headless(path):
+    """今天总时长：倒序读取 vs 完整读取"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    tail_seconds, _ = timed(lambda: tail_day_total(path, today))
+    full_seconds, _ = timed(lambda: HistoryStore(path).get_aggregates().day_total(today))
+    return tail_seconds, full_seconds
+
+
+def measure_first_frame(workdir):
+    """首帧时间与今天总时长就绪时间；没有图形界面时返回 None"""
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    from study_timer import StudyTimer
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        app = StudyTimer(root)
+        root.update()
+        first_frame = time.perf_counter() - start
+        # 等待后台线程读取到今天的总时长
+        while app.status_var.get() == "正在加载历史记录...":
+            root.update()
+            time.sleep(0.001)
+        total_ready = time.perf_counter() - start
+        app.on_close()
+    finally:
+        os.chdir(cwd)
+    return first_frame, total_ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="历史记录条数")
+    args = parser.parse_args()
+
+    print(f"{'记录数':>10} {'倒序读取今天':>12} {'完整读取':>10} {'首帧':>10} {'今天总时长就绪':>14}")
+    for rows in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="study_timer_bench_")
+        try:
+            path = os.path.join(workdir, "timer_history.csv")
+            write_history(path, rows)
+            tail_seconds, full_seconds = measure_headless(path)
+            frame = measure_first_frame(workdir)
+            if frame is None:
+                frame_text = ready_text = "无显示"
+            else:
+                frame_text = f"{frame[0] * 1000:.1f}ms"
+                ready_text = f"{frame[1] * 1000:.1f}ms"
+            print(f"{rows:>10} {tail_seconds * 1000:>10.2f}ms {full_seconds * 1000:>8.1f}ms "
+                  f"{frame_text:>10} {ready_text:>14}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""界面定时唤醒次数：计时中和暂停时每分钟执行了多少次 root.after 回调
+
+用法（需要图形界面）:
+    python benchmarks/bench_wakeups.py
+    python benchmarks/bench_wakeups.py --seconds 60
+
+通过包装 root.after 计数，不依赖 StudyTimer 内部的计数器，
+所以也可以在修改前的提交上运行同一个脚本进行对比。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def count_wakeups(root, seconds):
+    """运行事件循环 seconds 秒，返回期间执行的 after 回调次数"""
+    before = root.wakeups
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        root.update()
+        time.sleep(0.005)
+    return root.wakeups - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面定时唤醒次数")
+    parser.add_argument("--seconds", type=float, default=20, help="计时中和暂停时各测量多少秒")
+    args = parser.parse_args()
+
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print("没有图形界面（无 DISPLAY），无法测量")
+        return
+    from study_timer import StudyTimer
+
+    # 包装 root.after：每执行一次回调计数一次
+    root.wakeups = 0
+    after = root.after
+
+    def counted_after(ms, func=None, *args):
+        if func is None:
+            return after(ms)
+
+        def wrapped(*call_args):
+            root.wakeups += 1
+            return func(*call_args)
+        return after(ms, wrapped, *args)
+
+    root.after = counted_after
+
+    workdir = tempfile.mkdtemp(prefix="study_timer_wakeups_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        app = StudyTimer(root, use_daemon=False)
+        count_wakeups(root, 1)
+        paused = count_wakeups(root, args.seconds)
+        app.remark_combo.delete(0, "end")
+        app.remark_combo.insert(0, "高数")
+        app.toggle_timer()
+        count_wakeups(root, 1)
+        running = count_wakeups(root, args.seconds)
+        app.toggle_timer()
+        app.on_close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"暂停时: 每分钟 {paused * 60 / args.seconds:.0f} 次唤醒")
+    print(f"计时中: 每分钟 {running * 60 / args.seconds:.0f} 次唤醒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""合成历史记录生成器：生成与 timer_history.csv 格式相同的测试数据
+
+    python benchmarks/generate_history.py --rows 1000000 --output big_history.csv
+
+数据特点参照示例数据：
+- 学习内容按预设的 remark_options 分布，以“高数”为主，并混入“高数时间”这样的写法差异
+- 同一天内有时间重叠的记录（上一段还没结束就开始下一段），也有连续快速点击产生的几秒钟的记录
+- 偶尔有持续五六个小时的长记录和跨过午夜的记录
+- 按保存顺序（结束时间）写入，最后一天是今天
+逐天生成并写入，生成 1000 万行时内存占用也保持不变。
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from history_store import HEADER  # noqa: E402
+
+# 学习内容及其权重（与界面中的预设选项一致，另有少量写法不同的备注）
+REMARK_WEIGHTS = [
+    ("高数", 50), ("结构", 12), ("英语", 8), ("线代", 6), ("概率论", 5),
+    ("政治", 5), ("计组", 5), ("计网", 4), ("系统", 3), ("高数时间", 2),
+]
+
+
+def day_sessions(rng, day, count, remarks, weights):
+    """生成某一天的 count 条记录，返回按结束时间排序的 (开始, 结束, 时长, 备注) 列表"""
+    sessions = []
+    clock = day + timedelta(hours=8, seconds=rng.randint(0, 3600))
+    while len(sessions) < count:
+        kind = rng.random()
+        if kind < 0.05:
+            # 连续快速点击：几条相互重叠的几秒钟记录
+            remark = rng.choices(remarks, weights)[0]
+            for _ in range(min(rng.randint(3, 7), count - len(sessions))):
+                start = clock + timedelta(seconds=rng.randint(0, 2))
+                duration = round(rng.uniform(3, 8), 1)
+                sessions.append((start, start + timedelta(seconds=duration), duration, remark))
+                clock += timedelta(seconds=1)
+            continue
+        if kind < 0.10:
+            # 持续五六个小时的长记录
+            duration = rng.uniform(5 * 3600, 6.5 * 3600)
+        else:
+            duration = rng.lognormvariate(8, 0.6)  # 中位数约 50 分钟
+        duration = round(duration, 1)
+        start = clock
+        sessions.append((start, start + timedelta(seconds=duration), duration,
+                         rng.choices(remarks, weights)[0]))
+        if rng.random() < 0.15:
+            # 下一段在这一段结束前开始，产生重叠
+            clock = start + timedelta(seconds=duration * rng.uniform(0.3, 0.9))
+        else:
+            clock = start + timedelta(seconds=duration + rng.randint(60, 1800))
+    sessions.sort(key=lambda s: s[1])
+    return sessions
+
+
+def generate_rows(rows, sessions_per_day=8, seed=0, end_date=None):
+    """逐条生成 rows 条 CSV 行（不含表头），最后一天为 end_date（默认今天）"""
+    rng = random.Random(seed)
+    remarks = [remark for remark, _ in REMARK_WEIGHTS]
+    weights = [weight for _, weight in REMARK_WEIGHTS]
+    if end_date is None:
+        end_date = datetime.now()
+    end_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = max(1, -(-rows // sessions_per_day))
+    day = end_date - timedelta(days=days - 1)
+    produced = 0
+    while produced < rows:
+        count = min(rows - produced, sessions_per_day)
+        for start, end, duration, remark in day_sessions(rng, day, count, remarks, weights):
+            yield [
+                start.strftime("%Y-%m-%d"),
+                start.strftime("%H:%M:%S"),
+                end.strftime("%H:%M:%S"),
+                f"{duration:.1f}",
+                remark
+            ]
+        produced += count
+        day += timedelta(days=1)
+
+
+def write_history(path, rows, sessions_per_day=8, seed=0, end_date=None):
+    """把生成的记录写入 path"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(rows, sessions_per_day, seed, end_date))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成的学习历史记录")
+    parser.add_argument("--rows", type=int, default=100000, help="记录条数（1k ~ 10M）")
+    parser.add_argument("--output", default="synthetic_history.csv", help="输出文件")
+    parser.add_argument("--per-day", type=int, default=8, help="每天的记录条数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+    write_history(args.output, args.rows, args.per_day, args.seed)
+    print(f"已生成 {args.rows} 条记录: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
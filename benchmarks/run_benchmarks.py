@@ -0,0 +1,224 @@
+"""数据读写路径的基准测试（无需图形界面，不导入 tkinter）
+
+    python benchmarks/run_benchmarks.py --rows 1000 100000 1000000
+    python benchmarks/run_benchmarks.py --rows 100000 --backends csv binary sqlite
+    python benchmarks/run_benchmarks.py --compare results/旧.json results/新.json
+
+每个操作报告吞吐量、延迟分位数（p50/p95/p99）和峰值内存（tracemalloc），
+结果保存为 JSON（默认在 benchmarks/results/ 下，文件名包含提交号），便于在不同提交之间对比。
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+from generate_history import write_history  # noqa: E402
+from history_store import Record, open_history_store, tail_day_total  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def legacy_today_total(history_file, today):
+    """旧版 load_today_total_time_value 的做法：每次完整扫描 CSV，作为对比基线"""
+    total = 0.0
+    with open(history_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 5 and row[0] == today:
+                total += float(row[3])
+    return total
+
+
+def percentile(sorted_values, fraction):
+    """已排序列表的分位数（最近秩）"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(func, repeat, rows):
+    """重复执行 func，返回延迟分位数、吞吐量和峰值内存"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    # 峰值内存单独测一次，避免 tracemalloc 的开销影响计时
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mean = sum(latencies) / len(latencies)
+    return {
+        "repeat": repeat,
+        "mean_ms": mean * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "ops_per_sec": 1 / mean if mean else None,
+        # 每次操作涉及的历史记录条数 / 秒
+        "rows_per_sec": rows / mean if mean and rows else None,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def prepare_backend(backend, csv_file, workdir):
+    """把生成的 CSV 转换为指定后端的文件，返回文件路径"""
+    if backend == "csv":
+        return csv_file
+    if backend == "binary":
+        from binary_store import import_csv
+        path = os.path.join(workdir, "timer_history.bin")
+        import_csv(csv_file, path)
+        return path
+    from sqlite_store import migrate_csv
+    path = os.path.join(workdir, "timer_history.db")
+    migrate_csv(csv_file, path)
+    return path
+
+
+def bench_backend(backend, path, rows, repeat):
+    """对一个后端运行所有操作"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    store = open_history_store(backend, path)
+    # 取中间的某一天作为“查看详情”的日期
+    days = [row[0] for row in store.daily_rows()]
+    detail_date = days[len(days) // 2] if days else today
+
+    operations = {}
+    if backend == "csv":
+        operations["legacy_today_total_scan"] = (lambda: legacy_today_total(path, today), rows, max(1, repeat // 10))
+        operations["today_total_tail"] = (lambda: tail_day_total(path, today), 0, repeat)
+    operations["open_and_today_total"] = (
+        lambda: open_history_store(backend, path).today_total(), 0, repeat)
+    operations["full_aggregation"] = (
+        lambda: open_history_store(backend, path).preload(), rows, max(1, repeat // 10))
+    store.preload()
+    operations["today_total_cached"] = (store.today_total, 0, repeat)
+    operations["daily_summary"] = (store.daily_rows, 0, repeat)
+    operations["total_summary"] = (lambda: (store.grand_total(), store.remark_totals()), 0, repeat)
+    operations["daily_detail"] = (lambda: store.records_for_date(detail_date), 0, repeat)
+    operations["remark_summary_for_day"] = (lambda: store.remark_totals(detail_date), 0, repeat)
+
+    # 长期统计：按列读取（不用缓存 / 用 .npz 缓存）以及各类报表
+    operations["analytics_columns_build"] = (
+        lambda: analytics.load_columns(store, use_cache=False), rows, max(1, repeat // 10))
+    analytics.load_columns(store)
+    operations["analytics_columns_cached"] = (lambda: analytics.load_columns(store), rows, repeat)
+    columns = analytics.load_columns(store)
+
+    def analytics_reports():
+        analytics.period_totals(columns, "week")
+        analytics.period_totals(columns, "month")
+        analytics.streaks(columns)
+        analytics.moving_averages(columns)
+        analytics.hour_heatmap(columns)
+    operations["analytics_reports"] = (analytics_reports, rows, max(1, repeat // 10))
+
+    def save_record():
+        store.append(Record(today, "23:00:00", "23:30:00", 1800.0, "高数"))
+    operations["save_record"] = (save_record, 0, repeat)
+
+    results = {}
+    for name, (func, op_rows, op_repeat) in operations.items():
+        results[name] = measure(func, op_repeat, op_rows)
+        print(f"  {backend:>6} {name:<26} p50 {results[name]['p50_ms']:>10.3f}ms "
+              f"p95 {results[name]['p95_ms']:>10.3f}ms  峰值内存 {results[name]['peak_memory_kb']:>10.1f}KB")
+    if hasattr(store, "close"):
+        store.close()
+    return results
+
+
+def git_commit():
+    """当前提交号，获取失败时返回 None"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": {},
+    }
+    for rows in args.rows:
+        workdir = tempfile.mkdtemp(prefix="study_timer_bench_")
+        try:
+            csv_file = os.path.join(workdir, "timer_history.csv")
+            start = time.perf_counter()
+            write_history(csv_file, rows, seed=args.seed)
+            print(f"{rows} 条记录（生成耗时 {time.perf_counter() - start:.1f}s）")
+            for backend in args.backends:
+                path = prepare_backend(backend, csv_file, workdir)
+                report["results"].setdefault(str(rows), {})[backend] = bench_backend(
+                    backend, path, rows, args.repeat)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{report['commit'] or 'unknown'}-{stamp}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+
+def compare(old_file, new_file):
+    """对比两次结果的 p50 延迟，比值大于 1 表示变慢"""
+    with open(old_file, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for rows, backends in new["results"].items():
+        for backend, operations in backends.items():
+            for name, result in operations.items():
+                before = old["results"].get(rows, {}).get(backend, {}).get(name)
+                if before is None or not before["p50_ms"]:
+                    continue
+                ratio = result["p50_ms"] / before["p50_ms"]
+                flag = "  变慢" if ratio > 1.2 else ""
+                print(f"{rows:>9} {backend:>6} {name:<26} {before['p50_ms']:>10.3f}ms -> "
+                      f"{result['p50_ms']:>10.3f}ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="学习计时器数据路径基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000], help="历史记录条数")
+    parser.add_argument("--backends", nargs="+", default=["csv"], choices=["csv", "binary", "sqlite"],
+                        help="要测试的存储后端")
+    parser.add_argument("--repeat", type=int, default=50, help="每个操作的重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="生成数据的随机种子")
+    parser.add_argument("--output", help="结果 JSON 文件（默认保存到 benchmarks/results/）")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两个结果文件")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import date
+
+from history_aggregates import HistoryAggregates
+from history_store import HEADER, BaseHistoryStore, Record
+
+# 每条记录定长 24 字节：开始时间、结束时间（本地时间的秒数）、时长（0.1 秒）、备注编号
+RECORD = struct.Struct("<qqiI")
+# 本地时间按日历直接换算成秒数（不涉及时区和夏令时），这样日期 = 秒数 // 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+# 小端机器上可以直接把 mmap 按列解释，不需要逐条解包
+NATIVE_LAYOUT = sys.byteorder == "little"
+
+
+def to_local_seconds(date_str, time_str):
+    """把 CSV 中的日期和时间字符串换算成本地时间的秒数"""
+    year, month, day = date_str.split("-")
+    hours, minutes, seconds = time_str.split(":")
+    days = date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL
+    return days * SECONDS_PER_DAY + int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def format_clock(local_seconds):
+    """把本地时间秒数格式化为 HH:MM:SS"""
+    rem = local_seconds % SECONDS_PER_DAY
+    return "{:02d}:{:02d}:{:02d}".format(rem // 3600, rem % 3600 // 60, rem % 60)
+
+
+class BinaryHistoryStore(BaseHistoryStore):
+    """定长二进制历史记录：只追加写入，通过 mmap 按列读取，备注存放在单独的编号表中"""
+
+    def __init__(self, history_file):
+        self.history_file = history_file
+        # 备注编号表：每行一个 JSON 字符串，行号即编号
+        self.remark_file = history_file + ".remarks"
+        self.remarks = []
+        self.remark_ids = {}
+        # 日期 -> 当天总学习时间（秒），第一次需要时才统计
+        self.daily_totals = None
+        # 完整汇总在第一次打开汇总窗口时才构建
+        self.aggregates = None
+        self.file_stat = None
+        # 天数 -> 日期字符串的缓存
+        self.date_cache = {}
+        self.create_history_file()
+        self.load_remarks()
+
+    def create_history_file(self):
+        """创建记录文件和备注编号表（如果不存在）"""
+        for path in (self.history_file, self.remark_file):
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+
+    def current_file_stat(self):
+        """返回记录文件当前的 (修改时间, 大小)"""
+        try:
+            st = os.stat(self.history_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load_remarks(self):
+        """读取备注编号表"""
+        remarks = []
+        with open(self.remark_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    remarks.append(json.loads(line))
+        self.remarks = remarks
+        self.remark_ids = {remark: i for i, remark in enumerate(remarks)}
+
+    def intern_remark(self, remark):
+        """返回备注的编号，新备注先写入编号表再使用"""
+        remark_id = self.remark_ids.get(remark)
+        if remark_id is None:
+            remark_id = len(self.remarks)
+            with open(self.remark_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(remark, ensure_ascii=False) + "\n")
+            self.remarks.append(remark)
+            self.remark_ids[remark] = remark_id
+        return remark_id
+
+    def date_of(self, local_seconds):
+        """返回本地时间秒数对应的日期字符串"""
+        day = local_seconds // SECONDS_PER_DAY
+        date_str = self.date_cache.get(day)
+        if date_str is None:
+            date_str = date.fromordinal(day + EPOCH_ORDINAL).strftime("%Y-%m-%d")
+            self.date_cache[day] = date_str
+        return date_str
+
+    def scan(self, func):
+        """把记录文件映射到内存，以 (开始, 结束, 时长, 备注编号) 四列调用 func"""
+        size = os.path.getsize(self.history_file)
+        count = size // RECORD.size
+        if count == 0:
+            return func((), (), (), ())
+        with open(self.history_file, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                # 忽略写入中断留下的不完整尾部记录
+                view = memoryview(mm)[:count * RECORD.size]
+                try:
+                    if NATIVE_LAYOUT:
+                        as_q = view.cast('q')
+                        as_i = view.cast('i')
+                        as_u = view.cast('I')
+                        try:
+                            return func(as_q[0::3], as_q[1::3], as_i[4::6], as_u[5::6])
+                        finally:
+                            as_q.release()
+                            as_i.release()
+                            as_u.release()
+                    columns = list(zip(*RECORD.iter_unpack(view)))
+                    return func(*columns)
+                finally:
+                    view.release()
+            finally:
+                mm.close()
+
+    def load(self):
+        """读取备注编号表，并按列统计每日总时长"""
+        def daily(starts, ends, durations, remark_ids):
+            totals = {}
+            for start, duration in zip(starts, durations):
+                day = start // SECONDS_PER_DAY
+                totals[day] = totals.get(day, 0) + duration
+            return totals
+
+        try:
+            self.load_remarks()
+            totals = self.scan(daily)
+            self.daily_totals = {self.date_of(day * SECONDS_PER_DAY): tenths / 10
+                                 for day, tenths in totals.items()}
+        except Exception as e:
+            print(f"读取历史记录失败: {e}")
+            self.daily_totals = {}
+        self.aggregates = None
+        self.file_stat = self.current_file_stat()
+
+    def refresh(self):
+        """尚未统计或文件被外部修改（修改时间或大小变化）时重新读取"""
+        if self.daily_totals is None or self.current_file_stat() != self.file_stat:
+            self.load()
+
+    def iter_records(self):
+        """按写入顺序逐条返回记录（分块读取，内存占用与文件大小无关）"""
+        block_size = RECORD.size * 4096
+        with open(self.history_file, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                # 忽略写入中断留下的不完整尾部记录
+                usable = len(block) - len(block) % RECORD.size
+                for start, end, duration, remark_id in RECORD.iter_unpack(block[:usable]):
+                    yield Record(self.date_of(start), format_clock(start), format_clock(end),
+                                 duration / 10, self.remarks[remark_id])
+                if len(block) < block_size:
+                    break
+
+    def get_aggregates(self):
+        """返回完整汇总，只有缓存失效时才重新构建：直接在映射内存上按 (日期, 备注编号) 累加，
+        不为每条记录创建 Record；单日的记录由 records_for_date 按列查找，不在内存中保留"""
+        def rollup(starts, ends, durations, remark_ids):
+            totals = {}
+            for start, duration, remark_id in zip(starts, durations, remark_ids):
+                key = (start // SECONDS_PER_DAY, remark_id)
+                entry = totals.get(key)
+                if entry is None:
+                    totals[key] = [duration, 1]
+                else:
+                    entry[0] += duration
+                    entry[1] += 1
+            return totals
+
+        self.refresh()
+        if self.aggregates is None:
+            aggregates = HistoryAggregates(keep_sessions=False)
+            for (day, remark_id), (tenths, count) in self.scan(rollup).items():
+                aggregates.add_rollup(self.date_of(day * SECONDS_PER_DAY), self.remarks[remark_id],
+                                      tenths / 10, count)
+            self.aggregates = aggregates
+        return self.aggregates
+
+    def records_for_date(self, date_str):
+        """在映射内存的开始时间列上查找当天的记录，只为这些记录创建 Record"""
+        day_start = to_local_seconds(date_str, "00:00:00")
+        day_end = day_start + SECONDS_PER_DAY
+
+        def select(starts, ends, durations, remark_ids):
+            return [Record(date_str, format_clock(start), format_clock(ends[i]),
+                           durations[i] / 10, self.remarks[remark_ids[i]])
+                    for i, start in enumerate(starts) if day_start <= start < day_end]
+
+        self.refresh()
+        return self.scan(select)
+
+    def total_seconds(self):
+        """直接在映射内存上求和，得到所有记录的总时长（秒）"""
+        return self.scan(lambda starts, ends, durations, remark_ids: sum(durations)) / 10
+
+    def encode(self, record):
+        """把记录编码为定长二进制"""
+        start = to_local_seconds(record.date, record.start)
+        end = to_local_seconds(record.date, record.end)
+        if end < start:
+            # 跨过午夜的记录，结束时间属于第二天
+            end += SECONDS_PER_DAY
+        tenths = int(round(float(f"{record.duration:.1f}") * 10))
+        return RECORD.pack(start, end, tenths, self.intern_remark(record.remark))
+
+    def append(self, record):
+        """追加一条记录，并同步更新内存中的汇总"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """一次打开文件追加多条记录，并同步更新内存中的汇总"""
+        in_sync = self.current_file_stat() == self.file_stat
+        encoded = [(record, self.encode(record)) for record in records]
+        with open(self.history_file, 'ab') as f:
+            f.write(b"".join(data for _, data in encoded))
+        for record, data in encoded:
+            # 与 CSV 后端保持相同的精度
+            duration = RECORD.unpack(data)[2] / 10
+            if self.daily_totals is not None:
+                self.daily_totals[record.date] = self.daily_totals.get(record.date, 0.0) + duration
+            if self.aggregates is not None:
+                self.aggregates.add(record._replace(duration=duration))
+        if in_sync:
+            self.file_stat = self.current_file_stat()
+
+    def chart_sources(self):
+        return [(self.history_file, False), (self.remark_file, False)]
+
+    def sync(self):
+        """记录文件和备注编号表都刷到磁盘"""
+        for path in (self.history_file, self.remark_file):
+            with open(path, 'ab') as f:
+                os.fsync(f.fileno())
+
+    def day_total(self, date_str):
+        """返回指定日期的总学习时间（秒）：已统计时只查内存，否则从文件末尾向前读取"""
+        if self.daily_totals is not None:
+            return self.daily_totals.get(date_str, 0.0)
+        day_start = to_local_seconds(date_str, "00:00:00")
+        day_end = day_start + SECONDS_PER_DAY
+
+        def tail(starts, ends, durations, remark_ids):
+            tenths = 0
+            for i in range(len(starts) - 1, -1, -1):
+                start = starts[i]
+                if day_start <= start < day_end:
+                    tenths += durations[i]
+                elif ends[i] < day_start:
+                    # 在这一天开始之前就已结束（保存）的记录，之前的记录都更早
+                    break
+            return tenths
+
+        return self.scan(tail) / 10
+
+    def grand_total(self):
+        """所有记录的总时长直接在映射内存上求和，不需要构建完整汇总"""
+        self.refresh()
+        return self.total_seconds()
+
+
+def import_csv(csv_file, binary_file):
+    """把 CSV 历史记录导入二进制记录文件（追加到已有记录之后），返回导入条数"""
+    store = BinaryHistoryStore(binary_file)
+    count = 0
+    with open(csv_file, 'r', encoding='utf-8') as src, open(binary_file, 'ab') as dst:
+        reader = csv.reader(src)
+        next(reader, None)  # 跳过标题行
+        for line_no, row in enumerate(reader, start=2):
+            if len(row) < 5:
+                continue
+            try:
+                record = Record(row[0], row[1], row[2], float(row[3]), row[4])
+                dst.write(store.encode(record))
+            except ValueError as e:
+                raise ValueError(f"{csv_file} 第 {line_no} 行格式错误: {e}")
+            count += 1
+    return count
+
+
+def export_csv(binary_file, csv_file):
+    """把二进制记录文件导出为 CSV 历史记录，返回导出条数"""
+    store = BinaryHistoryStore(binary_file)
+    count = 0
+    with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for record in store.iter_records():
+            writer.writerow([record.date, record.start, record.end,
+                             f"{record.duration:.1f}", record.remark])
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV 与二进制历史记录互相转换")
+    parser.add_argument("command", choices=["import", "export"], help="import: CSV -> 二进制；export: 二进制 -> CSV")
+    parser.add_argument("source", help="源文件")
+    parser.add_argument("target", help="目标文件")
+    args = parser.parse_args()
+    if args.command == "import":
+        count = import_csv(args.source, args.target)
+    else:
+        count = export_csv(args.source, args.target)
+    print(f"已转换 {count} 条记录")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""图表用的多分辨率汇总：每个学习内容按天/周/月的时长，缓存在磁盘上（<历史文件>.charts.json）
+
+缓存中记下生成时各源文件的大小、修改时间和校验和。CSV 历史文件只在末尾追加了记录时
+（变大且原有部分的校验和不变，例如保存了新的计时记录），只读取新增的字节累加进去，
+新增的部分累计超过 SAVE_PENDING_BYTES 才重写缓存；
+其他变化（手动编辑、压缩归档、二进制/SQLite 后端的文件变化）时由每日汇总重新生成。
+图表按可见范围选择粒度：桶数不超过可画的点数时用最细的一级，按月也放不下时每几个月合并成一个点，
+所以缩放时画的点数有上限。
+"""
+import json
+import os
+import zlib
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from instrumentation import metrics
+
+# 从细到粗的粒度
+LEVELS = ("day", "week", "month")
+# 缓存格式变化时修改版本号，旧缓存自动失效
+CACHE_VERSION = 1
+# 校验和只计算开头和末尾各 4KB
+CHECKSUM_BYTES = 4096
+# 追加后未写入缓存的字节超过这个值才重写缓存：重写整个缓存比读取少量新增的行慢得多，
+# 下次启动时按缓存中记下的大小读取新增的部分即可
+SAVE_PENDING_BYTES = 1024 * 1024
+
+
+def bucket_start(date_str, level):
+    """日期所在的桶：当天 / 所在周的周一 / 所在月的 1 日"""
+    if level == "day":
+        return date_str
+    if level == "month":
+        return date_str[:7] + "-01"
+    day = date.fromisoformat(date_str)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def bucket_days(start, level, step=1):
+    """从 start 开始的 step 个桶有多少天"""
+    if level == "day":
+        return step
+    if level == "week":
+        return 7 * step
+    year, month = int(start[:4]), int(start[5:7])
+    index = year * 12 + month - 1 + step
+    return (date(index // 12, index % 12 + 1, 1) - date(year, month, 1)).days
+
+
+def bucket_count(since, until, level):
+    """[since, until] 覆盖多少个桶"""
+    first = date.fromisoformat(since)
+    last = date.fromisoformat(until)
+    if level == "day":
+        return (last - first).days + 1
+    if level == "week":
+        return ((last - first).days + first.weekday()) // 7 + 1
+    return (last.year * 12 + last.month) - (first.year * 12 + first.month) + 1
+
+
+def pick_level(since, until, max_points, finest="day"):
+    """从 finest 开始，桶数不超过 max_points 的最细一级；都超过时用按月"""
+    for level in LEVELS[LEVELS.index(finest):]:
+        if bucket_count(since, until, level) <= max_points:
+            return level
+    return LEVELS[-1]
+
+
+def merge_months(buckets, step):
+    """把按月的桶每 step 个月合并成一个（按月份对齐，缺少记录的月份不影响分组），
+    范围太大、按月也放不下时使用"""
+    merged = []
+    current = None
+    for start, remarks in buckets:
+        index = (int(start[:4]) * 12 + int(start[5:7]) - 1) // step * step
+        if current is None or current[0] != index:
+            current = [index, {}]
+            merged.append(current)
+        totals = current[1]
+        for remark, duration in remarks.items():
+            totals[remark] = totals.get(remark, 0.0) + duration
+    return [[f"{index // 12:04d}-{index % 12 + 1:02d}-01", totals] for index, totals in merged]
+
+
+def file_signature(path, size=None):
+    """文件的 [大小, 修改时间, 校验和]；指定 size 时只计算前 size 字节的校验和（大小和修改时间不变时不计算）"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    size = st.st_size if size is None else size
+    with open(path, 'rb') as f:
+        head = f.read(min(CHECKSUM_BYTES, size))
+        f.seek(max(0, size - CHECKSUM_BYTES))
+        tail = f.read(min(CHECKSUM_BYTES, size))
+    return [size, st.st_mtime_ns, zlib.crc32(tail, zlib.crc32(head))]
+
+
+def unchanged(path, signature):
+    """文件的大小和修改时间与记下的一致"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return signature is None
+    return signature is not None and signature[0] == st.st_size and signature[1] == st.st_mtime_ns
+
+
+def appended_from(path, signature):
+    """CSV 文件只在末尾追加时返回新增部分的起始偏移，否则返回 None"""
+    if signature is None:
+        return 0
+    current = file_signature(path)
+    if current is None or current[0] < signature[0]:
+        return None
+    if file_signature(path, signature[0])[2] != signature[2]:
+        return None
+    return signature[0]
+
+
+class ChartRollups:
+    """按天/周/月的时长：粒度 -> {桶的开始日期: {备注: 秒}}"""
+
+    def __init__(self):
+        self.buckets = {level: {} for level in LEVELS}
+        # 各粒度排序后的桶（有新桶时置为 None，查询时重新排序）
+        self.sorted_keys = {level: None for level in LEVELS}
+        # 源文件 -> 生成（或最后一次累加）时的签名
+        self.sources = {}
+        # 源文件 -> 写入磁盘缓存时的大小
+        self.saved_sizes = {}
+        # 日期 -> 所在的周
+        self.weeks = {}
+
+    def add(self, date_str, remark, duration):
+        week = self.weeks.get(date_str)
+        if week is None:
+            week = self.weeks[date_str] = bucket_start(date_str, "week")
+        for level, start in (("day", date_str), ("week", week), ("month", date_str[:7] + "-01")):
+            bucket = self.buckets[level].get(start)
+            if bucket is None:
+                bucket = self.buckets[level][start] = {}
+                self.sorted_keys[level] = None
+            bucket[remark] = bucket.get(remark, 0.0) + duration
+
+    def extend(self, rows):
+        """累加 (日期, 备注, 时长) 行"""
+        for date_str, remark, duration in rows:
+            self.add(date_str, remark, duration)
+
+    def keys(self, level):
+        if self.sorted_keys[level] is None:
+            self.sorted_keys[level] = sorted(self.buckets[level])
+        return self.sorted_keys[level]
+
+    def span(self):
+        """(最早的日期, 最晚的日期)，没有记录时为 (None, None)"""
+        days = self.keys("day")
+        return (days[0], days[-1]) if days else (None, None)
+
+    def series(self, level, since, until):
+        """[since, until] 范围内的桶 [(开始日期, {备注: 秒})]，按时间顺序；只查找范围内的桶"""
+        keys = self.keys(level)
+        buckets = self.buckets[level]
+        start = bisect_left(keys, bucket_start(since, level))
+        end = bisect_right(keys, until)
+        return [(key, buckets[key]) for key in keys[start:end]]
+
+    def downsampled(self, since, until, max_points, finest="day"):
+        """[since, until] 范围内不超过 max_points 个桶：从 finest 开始选能放下的最细一级，
+        按月也放不下时每 step 个月合并成一个。返回 (粒度, step, 桶)"""
+        level = pick_level(since, until, max_points, finest)
+        buckets = self.series(level, since, until)
+        step = 1
+        if level == "month" and len(buckets) > max_points:
+            step = -(-bucket_count(since, until, "month") // max(1, max_points))
+            buckets = merge_months(buckets, step)
+        return level, step, buckets
+
+    def pending_bytes(self):
+        """追加后还没有写入磁盘缓存的字节数"""
+        return sum(signature[0] - self.saved_sizes.get(path, 0)
+                   for path, signature in self.sources.items() if signature is not None)
+
+    def save(self, cache_file):
+        """先写临时文件再替换"""
+        temp_file = cache_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"version": CACHE_VERSION, "sources": self.sources, "buckets": self.buckets},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_file, cache_file)
+            self.saved_sizes = {path: signature[0] for path, signature in self.sources.items() if signature is not None}
+        except OSError as e:
+            print(f"写入图表缓存失败: {e}")
+
+    @classmethod
+    def load(cls, cache_file):
+        """读取缓存，不存在、损坏或版本不同时返回 None"""
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_VERSION:
+                return None
+            rollups = cls()
+            rollups.sources = data["sources"]
+            rollups.buckets = {level: data["buckets"][level] for level in LEVELS}
+            rollups.saved_sizes = {path: signature[0] for path, signature in rollups.sources.items() if signature is not None}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return rollups
+
+
+def update_chart_rollups(rollups, store):
+    """返回与 store 的文件一致的图表汇总：rollups 为内存中上一次的结果（可以为 None），
+    没有时读取磁盘缓存；CSV 只追加了记录时累加新增的部分，其他变化时由每日汇总重新生成"""
+    # 延迟导入：history_store 在模块级导入本模块，parallel_ingest 会加载 multiprocessing，
+    # 放在这里不拖慢命令行和守护进程的启动
+    from parallel_ingest import aggregate_chunk
+
+    cache_file = store.chart_cache_file()
+    sources = store.chart_sources()
+    if rollups is None:
+        rollups = ChartRollups.load(cache_file)
+        metrics.count("charts.cache_loads" if rollups is not None else "charts.cache_misses")
+    changed = []
+    if rollups is not None:
+        paths = {path for path, _ in sources}
+        if any(path not in paths for path in rollups.sources):
+            rollups = None
+        else:
+            changed = [(path, appendable) for path, appendable in sources
+                       if not unchanged(path, rollups.sources.get(path))]
+    if rollups is not None and changed:
+        # 只有追加过的 CSV：读取新增的部分
+        offsets = []
+        for path, appendable in changed:
+            offset = appended_from(path, rollups.sources.get(path)) if appendable else None
+            if offset is None:
+                rollups = None
+                break
+            offsets.append((path, offset))
+        if rollups is not None:
+            for path, offset in offsets:
+                if offset == 0:
+                    with open(path, 'rb') as f:
+                        offset = len(f.readline())  # 新文件跳过标题行
+                part = aggregate_chunk((path, offset, os.path.getsize(path)))
+                if part is None:
+                    # 新增的部分有跨多行的记录，由每日汇总重新生成
+                    rollups = None
+                    break
+                for date_str, remarks in part.by_date_remark.items():
+                    for remark, duration in remarks.items():
+                        rollups.add(date_str, remark, duration)
+                rollups.sources[path] = file_signature(path)
+        if rollups is not None:
+            metrics.count("charts.appends")
+            if rollups.pending_bytes() >= SAVE_PENDING_BYTES:
+                rollups.save(cache_file)
+    if rollups is None:
+        rollups = ChartRollups()
+        rollups.extend(store.chart_rows())
+        rollups.sources = {path: file_signature(path) for path, _ in sources}
+        metrics.count("charts.rebuilds")
+        rollups.save(cache_file)
+    return rollups
@@ -0,0 +1,98 @@
+import argparse
+import csv
+import os
+from datetime import datetime, timedelta
+
+from history_archive import archive_file_for, finish_compaction, read_archive, stage_archive, to_tenths
+from history_store import HEADER
+
+# 默认保留最近一年的逐条记录
+DEFAULT_HORIZON_DAYS = 365
+
+
+def compact_history(history_file, horizon_days=DEFAULT_HORIZON_DAYS, archive_file=None):
+    """把早于保留期限的记录合并为按 (日期, 备注) 的汇总行，写入归档文件。
+
+    总时长和次数保持不变，汇总窗口显示的数字与压缩前一致。
+    返回 (合并的记录数, 归档文件中的汇总行数)。仅适用于 CSV 后端。
+
+    新的归档先写到 .pending，替换历史文件之后才换上（见 history_archive.stage_archive）：
+    任何一步崩溃都不会让同一条记录同时留在两个文件中，重新运行压缩也不会重复合并。
+    """
+    if archive_file is None:
+        archive_file = archive_file_for(history_file)
+    cutoff = (datetime.now() - timedelta(days=horizon_days)).strftime("%Y-%m-%d")
+
+    # 上一次压缩中途退出：历史文件已替换就换上新归档，否则放弃
+    finish_compaction(archive_file, discard=True)
+    rollups = read_archive(archive_file)
+    folded = 0
+    temp_file = history_file + ".tmp"
+    with open(history_file, 'rb') as src, open(history_file, 'r', encoding='utf-8', newline='') as text, \
+            open(temp_file, 'wb') as dst:
+        # 只处理开始时的文件内容，压缩期间计时器追加的行在最后原样复制
+        size = os.fstat(src.fileno()).st_size
+        offset = 0
+        # 用 csv 模块分行（备注中可能有引号括起来的换行），同时记下每条记录的原始文本
+        consumed = []
+
+        def lines():
+            for line in text:
+                consumed.append(line)
+                yield line
+
+        for row in csv.reader(lines()):
+            raw = "".join(consumed).encode('utf-8')
+            consumed.clear()
+            offset += len(raw)
+            if row and len(row) >= 5 and row != HEADER and row[0] < cutoff:
+                rollup = rollups.setdefault((row[0], row[4]), [0, 0])
+                rollup[0] += to_tenths(row[3])
+                rollup[1] += 1
+                folded += 1
+            else:
+                dst.write(raw)
+            if offset >= size:
+                break
+
+        if folded == 0:
+            dst.close()
+            os.remove(temp_file)
+            return 0, len(rollups)
+        # 复制压缩期间新追加的行，直到文件不再变大
+        offset = copy_tail(src, dst, offset)
+        dst.flush()
+        os.fsync(dst.fileno())
+    stage_archive(archive_file, rollups, history_file, temp_file)
+    # 替换前最后检查一次（写归档期间计时器可能又追加了记录）；
+    # 替换时不能还开着文件（Windows 上会失败），所以关闭后再替换
+    with open(history_file, 'rb') as src, open(temp_file, 'ab') as dst:
+        copy_tail(src, dst, offset)
+    os.replace(temp_file, history_file)
+    finish_compaction(archive_file)
+    return folded, len(rollups)
+
+
+def copy_tail(src, dst, offset):
+    """把 src 中 offset 之后的内容追加到 dst，直到 src 不再变大；返回新的 offset"""
+    while True:
+        src.seek(offset)
+        tail = src.read()
+        if not tail:
+            return offset
+        dst.write(tail)
+        offset += len(tail)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩历史记录：把早期的逐条记录合并为每日汇总")
+    parser.add_argument("--file", default="timer_history.csv", help="历史记录文件")
+    parser.add_argument("--days", type=int, default=DEFAULT_HORIZON_DAYS,
+                        help=f"保留最近多少天的逐条记录（默认 {DEFAULT_HORIZON_DAYS}）")
+    args = parser.parse_args()
+    folded, rollup_rows = compact_history(args.file, args.days)
+    print(f"已合并 {folded} 条记录，归档文件共 {rollup_rows} 行汇总")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import csv
+import json
+import os
+import zlib
+
+from instrumentation import metrics, timed
+
+# 校验和只计算文件开头和末尾各 4KB，避免每次校验都读取整个文件
+CHECKSUM_BYTES = 4096
+
+
+class DayIndex:
+    """CSV 历史记录的按日索引：记录每个日期的行在文件中的字节范围，保存在旁边的 .idx 文件中。
+
+    读取某一天的记录只需一次 seek 加一次有限长度的读取。
+    文件的大小、修改时间或校验和与索引不一致时（例如手动编辑过 CSV），索引会被重建。
+    """
+
+    def __init__(self, history_file):
+        self.history_file = history_file
+        self.index_file = history_file + ".idx"
+        # 日期 -> [起始偏移, 结束偏移]，None 表示尚未加载
+        self.days = None
+        # 建立索引时文件的 (修改时间, 大小)
+        self.file_stat = None
+
+    def current_file_stat(self):
+        """返回历史文件当前的 (修改时间, 大小)"""
+        try:
+            st = os.stat(self.history_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def checksum(self, size):
+        """计算文件前 size 字节中开头和末尾部分的校验和"""
+        with open(self.history_file, 'rb') as f:
+            head = f.read(min(CHECKSUM_BYTES, size))
+            f.seek(max(0, size - CHECKSUM_BYTES))
+            tail = f.read(min(CHECKSUM_BYTES, size))
+        return zlib.crc32(tail, zlib.crc32(head))
+
+    def load(self):
+        """读取索引文件，与历史文件一致时返回 True"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            file_stat = (data["mtime_ns"], data["size"])
+            if file_stat != self.current_file_stat():
+                return False
+            if data["checksum"] != self.checksum(data["size"]):
+                return False
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self.days = data["days"]
+        self.file_stat = file_stat
+        return True
+
+    def is_valid(self):
+        """索引是否与当前的历史文件一致（已加载时只比较修改时间和大小）"""
+        if self.days is None:
+            return self.load()
+        return self.file_stat == self.current_file_stat()
+
+    def ensure(self):
+        """确保索引可用，不一致时重建"""
+        if not self.is_valid():
+            self.rebuild()
+
+    def rebuild(self):
+        """完整扫描一次历史文件，重建按日索引"""
+        days = {}
+        with open(self.history_file, 'rb') as f:
+            offset = 0
+            for line in f:
+                end = offset + len(line)
+                # 日期在第一列且不含逗号，不需要完整解析 CSV
+                date = line.split(b",", 1)[0].decode('utf-8').strip()
+                if date and date != "日期":
+                    span = days.get(date)
+                    if span is None:
+                        days[date] = [offset, end]
+                    else:
+                        span[1] = end
+                offset = end
+        self.days = days
+        self.file_stat = self.current_file_stat()
+        self.save()
+
+    def save(self):
+        """写入索引文件（先写临时文件再替换，避免写到一半的索引）"""
+        data = {
+            "mtime_ns": self.file_stat[0],
+            "size": self.file_stat[1],
+            "checksum": self.checksum(self.file_stat[1]),
+            "days": self.days,
+        }
+        temp_file = self.index_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                # json.dumps 使用 C 编码器，比逐段写入的 json.dump 快得多
+                f.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            print(f"保存日期索引失败: {e}")
+
+    def add(self, date, start, end):
+        """登记追加到文件中的一行（调用方写入完成后调用 commit）"""
+        span = self.days.get(date)
+        if span is None:
+            self.days[date] = [start, end]
+        else:
+            span[0] = min(span[0], start)
+            span[1] = max(span[1], end)
+
+    def commit(self):
+        """追加完成后更新文件状态并保存索引"""
+        self.file_stat = self.current_file_stat()
+        self.save()
+
+    @timed("csv.read_day")
+    def read_day(self, date):
+        """读取指定日期的所有行（字符串列表），只读取该日期所在的字节范围"""
+        span = self.days.get(date)
+        if span is None:
+            return []
+        with open(self.history_file, 'rb') as f:
+            f.seek(span[0])
+            data = f.read(span[1] - span[0])
+        rows = []
+        lines = data.decode('utf-8').splitlines()
+        for row in csv.reader(lines):
+            # 范围内可能夹杂其他日期的行（例如跨过午夜的记录），需要再按日期过滤
+            if len(row) >= 5 and row[0] == date:
+                rows.append(row)
+        metrics.count("csv.rows_scanned", len(lines))
+        return rows
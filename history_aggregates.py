@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+# 单条学习记录（history_store 也导出它；放在这里是为了 parallel_ingest 不必导入 history_store）
+Record = namedtuple("Record", ["date", "start", "end", "duration", "remark"])
+
+
+class HistoryAggregates:
+    """历史记录汇总：一次遍历同时得到按日期、按备注、按(日期, 备注)和总计的统计"""
+
+    def __init__(self, keep_sessions=True):
+        # 是否在内存中保留每条记录；有按日索引的后端不需要保留
+        self.keep_sessions = keep_sessions
+        # 日期 -> [总学习时间（秒）, 学习次数]
+        self.daily = {}
+        # 备注 -> 总学习时间（秒）
+        self.by_remark = {}
+        # 日期 -> {备注: 总学习时间（秒）}
+        self.by_date_remark = {}
+        # 日期 -> 当天的记录列表（按写入顺序）
+        self.sessions = {}
+        self.grand_total = 0.0
+        self.session_count = 0
+        # 去重后的时长（同一天内重叠的时间只算一次，IntervalTotals），第一次查询时才由存储后端构建
+        self.intervals = None
+        # 按日期范围查询的树状数组（RangeIndex），第一次范围查询时由每日汇总构建
+        self.ranges = None
+
+    def add(self, record):
+        """把一条记录累加到所有汇总中"""
+        date = record.date
+        remark = record.remark
+        duration = record.duration
+
+        day = self.daily.get(date)
+        if day is None:
+            self.daily[date] = [duration, 1]
+            self.by_date_remark[date] = {remark: duration}
+            if self.keep_sessions:
+                self.sessions[date] = [record]
+        else:
+            day[0] += duration
+            day[1] += 1
+            remarks = self.by_date_remark[date]
+            remarks[remark] = remarks.get(remark, 0.0) + duration
+            if self.keep_sessions:
+                self.sessions[date].append(record)
+
+        self.by_remark[remark] = self.by_remark.get(remark, 0.0) + duration
+        self.grand_total += duration
+        self.session_count += 1
+        if self.intervals is not None:
+            self.intervals.add(record)
+        if self.ranges is not None:
+            self.ranges.add(date, remark, duration)
+
+    def add_rollup(self, date, remark, duration, count):
+        """累加一行归档汇总（某天某个学习内容的总时长和次数）"""
+        day = self.daily.get(date)
+        if day is None:
+            self.daily[date] = [duration, count]
+            self.by_date_remark[date] = {remark: duration}
+        else:
+            day[0] += duration
+            day[1] += count
+            remarks = self.by_date_remark[date]
+            remarks[remark] = remarks.get(remark, 0.0) + duration
+        self.by_remark[remark] = self.by_remark.get(remark, 0.0) + duration
+        self.grand_total += duration
+        self.session_count += count
+        if self.intervals is not None:
+            self.intervals.add_rollup(date, remark, duration)
+        if self.ranges is not None:
+            self.ranges.add(date, remark, duration, count)
+
+    def day_total(self, date):
+        """返回指定日期的总学习时间（秒）"""
+        day = self.daily.get(date)
+        return day[0] if day else 0.0
+
+    def daily_rows(self):
+        """返回 (日期, 总时长, 次数) 列表，按日期降序"""
+        return [
+            (date, self.daily[date][0], self.daily[date][1])
+            for date in sorted(self.daily, reverse=True)
+        ]
+
+    def remark_totals(self, date=None):
+        """返回按备注汇总的 (备注, 总时长) 列表，按总时长降序；指定日期时只统计当天"""
+        if date is None:
+            totals = self.by_remark
+        else:
+            totals = self.by_date_remark.get(date, {})
+        return sorted(totals.items(), key=lambda x: x[1], reverse=True)
+
+    def records_for_date(self, date):
+        """返回指定日期的所有记录"""
+        return list(self.sessions.get(date, ()))
+
+    def merge(self, other):
+        """合并另一份汇总（例如按月分片的历史记录中每个分片的汇总）"""
+        for date, (total, count) in other.daily.items():
+            day = self.daily.get(date)
+            if day is None:
+                self.daily[date] = [total, count]
+                self.by_date_remark[date] = dict(other.by_date_remark.get(date, {}))
+            else:
+                day[0] += total
+                day[1] += count
+                remarks = self.by_date_remark[date]
+                for remark, duration in other.by_date_remark.get(date, {}).items():
+                    remarks[remark] = remarks.get(remark, 0.0) + duration
+            if self.keep_sessions and date in other.sessions:
+                self.sessions.setdefault(date, []).extend(other.sessions[date])
+        for remark, duration in other.by_remark.items():
+            self.by_remark[remark] = self.by_remark.get(remark, 0.0) + duration
+        self.grand_total += other.grand_total
+        self.session_count += other.session_count
@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+
+# 归档文件表头：每行是某一天某个学习内容的汇总
+ARCHIVE_HEADER = ["日期", "备注", "持续时间(秒)", "次数"]
+# 压缩过程中新的归档先写到 <归档文件>.pending，<归档文件>.pending.json 记下压缩后的历史文件；
+# 历史文件替换完成后才换上新的归档，中途崩溃时由下一次读取（或压缩）完成或放弃
+PENDING_SUFFIX = ".pending"
+MARKER_SUFFIX = ".pending.json"
+
+
+def archive_file_for(history_file):
+    """返回历史文件对应的归档文件名，例如 timer_history.csv -> timer_history_archive.csv"""
+    base, ext = os.path.splitext(history_file)
+    return f"{base}_archive{ext or '.csv'}"
+
+
+def read_archive(archive_file):
+    """读取归档文件，返回 {(日期, 备注): [总时长（0.1 秒）, 次数]}；文件不存在时返回空字典。
+    上一次压缩已替换历史文件、还没换上新归档时先完成这一步"""
+    finish_compaction(archive_file)
+    rollups = {}
+    if not os.path.exists(archive_file):
+        return rollups
+    with open(archive_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # 跳过标题行
+        for row in reader:
+            if len(row) >= 4:
+                rollup = rollups.setdefault((row[0], row[1]), [0, 0])
+                rollup[0] += to_tenths(row[2])
+                rollup[1] += int(row[3])
+    return rollups
+
+
+def write_archive(archive_file, rollups):
+    """按日期、备注排序写入归档文件（先写临时文件再替换）"""
+    temp_file = archive_file + ".tmp"
+    with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_HEADER)
+        for (date, remark), (tenths, count) in sorted(rollups.items()):
+            writer.writerow([date, remark, f"{tenths / 10:.1f}", count])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, archive_file)
+
+
+def stage_archive(archive_file, rollups, history_file, compacted_file):
+    """压缩的第一步：把新的归档写到 .pending，并记下压缩后的历史文件（compacted_file）的 inode。
+    compacted_file 替换历史文件后 inode 不变，据此判断替换是否已经完成"""
+    write_archive(archive_file + PENDING_SUFFIX, rollups)
+    marker = {"history": os.path.basename(history_file), "inode": os.stat(compacted_file).st_ino}
+    temp_file = archive_file + MARKER_SUFFIX + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(marker, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, archive_file + MARKER_SUFFIX)
+
+
+def finish_compaction(archive_file, discard=False):
+    """历史文件已经换成压缩后的文件时换上 .pending 中的新归档；
+    还没有替换时保留旧归档，discard 为 True 时（开始新的压缩前）删除未完成的 .pending。
+    返回是否换上了新归档"""
+    marker_file = archive_file + MARKER_SUFFIX
+    if not os.path.exists(marker_file):
+        return False
+    try:
+        with open(marker_file, 'r', encoding='utf-8') as f:
+            marker = json.load(f)
+        history_file = os.path.join(os.path.dirname(archive_file), marker["history"])
+        replaced = os.stat(history_file).st_ino == marker["inode"]
+    except (OSError, ValueError, KeyError):
+        replaced = False
+    if not replaced and not discard:
+        return False
+    try:
+        if replaced:
+            os.replace(archive_file + PENDING_SUFFIX, archive_file)
+        else:
+            os.remove(archive_file + PENDING_SUFFIX)
+    except FileNotFoundError:
+        pass  # 另一个进程已经处理过
+    try:
+        os.remove(marker_file)
+    except FileNotFoundError:
+        pass
+    return replaced
+
+
+def to_tenths(duration_str):
+    """把秒数字符串换算成以 0.1 秒为单位的整数，累加时不会产生浮点误差"""
+    return int(round(float(duration_str) * 10))
@@ -0,0 +1,434 @@
+"""历史记录的导出与导入（流式处理，内存占用与历史记录的长短无关）
+
+    python history_export.py export backup.jsonl
+    python history_export.py export 高数.ics --remark 高数 --since 2025-07-01
+    python history_export.py export backup.stcol --backend sqlite
+    python history_export.py import other_machine.jsonl
+    python history_export.py --profile 小明 export 小明.jsonl
+
+格式按扩展名选择（也可用 --format 指定）：
+- .csv     与 timer_history.csv 相同的格式
+- .jsonl   每行一个 JSON 对象 {"date", "start", "end", "duration", "remark"}
+- .stcol   紧凑的列式二进制：每 ROW_GROUP_SIZE 条记录一组，各列（32 位整数，日期差分编码）分别用 zlib 压缩
+- .ics     iCalendar 日历文件，每条记录一个事件，可导入日历工具（只能导出）
+导入时用已有记录的哈希索引去重，同一份文件重复导入不会产生重复记录。
+压缩归档的汇总导出为每个 (日期, 学习内容) 一条从 00:00:00 开始的记录，总时长不变（次数合并为一次）。
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date, datetime, timedelta, timezone
+
+from history_archive import to_tenths
+from history_store import HEADER, HISTORY_BACKENDS, Record
+from profiles import DEFAULT_PROFILE, open_profile_store
+from timer_client import connect
+from timer_core import format_clock
+
+EXPORT_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".stcol": "columnar",
+    ".ics": "ics",
+}
+
+# 列式文件：文件头、每组记录的组头 (标记, 记录数, 新备注数)
+COLUMNAR_MAGIC = b"STCOL1\n"
+GROUP_HEADER = struct.Struct("<4sII")
+GROUP_MARK = b"RGRP"
+# 每组的记录数：写入时只在内存中缓存一组
+ROW_GROUP_SIZE = 65536
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# 追加到存储时每批的记录数
+IMPORT_BATCH_SIZE = 1000
+
+
+def format_of(path, fmt=None):
+    """按扩展名确定格式"""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"无法从扩展名判断格式: {path}（支持 {', '.join(EXPORT_FORMATS)}）")
+    return EXPORT_FORMATS[ext]
+
+
+def filter_records(records, since=None, until=None, remarks=None):
+    """按日期范围（包含两端，YYYY-MM-DD）和学习内容筛选记录（生成器）"""
+    remarks = set(remarks) if remarks else None
+    for record in records:
+        if since is not None and record.date < since:
+            continue
+        if until is not None and record.date > until:
+            continue
+        if remarks is not None and record.remark not in remarks:
+            continue
+        yield record
+
+
+def clock_seconds(clock):
+    hours, minutes, seconds = clock.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+# ---------- CSV ----------
+
+def write_csv(records, path):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for record in records:
+            writer.writerow([record.date, record.start, record.end, f"{record.duration:.1f}", record.remark])
+            count += 1
+    return count
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if len(row) < 5 or row == HEADER:
+                continue
+            yield Record(row[0], row[1], row[2], float(row[3]), row[4])
+
+
+# ---------- JSONL ----------
+
+def write_jsonl(records, path):
+    count = 0
+    # 日期、时间和学习内容大量重复，每个不同的字符串只做一次 JSON 编码
+    encoded = {}
+
+    def encode(text):
+        value = encoded.get(text)
+        if value is None:
+            value = encoded[text] = json.dumps(text, ensure_ascii=False)
+        return value
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(f'{{"date": {encode(record.date)}, "start": {encode(record.start)}, '
+                    f'"end": {encode(record.end)}, "duration": {float(record.duration)!r}, '
+                    f'"remark": {encode(record.remark)}}}\n')
+            count += 1
+            if len(encoded) > 1000000:
+                encoded.clear()
+    return count
+
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                yield Record(item["date"], item["start"], item["end"], float(item["duration"]), item["remark"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path} 第 {line_no} 行格式错误: {e}")
+
+
+# ---------- 列式二进制 ----------
+
+def pack_column(values, delta=False):
+    """一列 32 位整数：可选差分编码（日期按记录顺序递增，差分后几乎都是 0），再用 zlib 压缩"""
+    column = array('i', values)
+    if delta:
+        for i in range(len(column) - 1, 0, -1):
+            column[i] -= column[i - 1]
+    if sys.byteorder != "little":
+        column.byteswap()
+    data = zlib.compress(column.tobytes(), 6)
+    return struct.pack("<I", len(data)) + data
+
+
+def unpack_column(f, count, delta=False):
+    size, = struct.unpack("<I", f.read(4))
+    column = array('i')
+    column.frombytes(zlib.decompress(f.read(size)))
+    if sys.byteorder != "little":
+        column.byteswap()
+    if len(column) != count:
+        raise ValueError("列式文件已损坏：列长度与记录数不一致")
+    if delta:
+        for i in range(1, count):
+            column[i] += column[i - 1]
+    return column
+
+
+class ColumnarWriter:
+    """列式文件写入：记录先缓存一组，满 ROW_GROUP_SIZE 条后按列写出；备注编号在整个文件中共用"""
+
+    def __init__(self, f):
+        self.f = f
+        self.remark_ids = {}
+        self.new_remarks = []
+        self.group = []
+        # 日期 -> 天数、时间 -> 秒数的缓存（最多几万个不同的值）
+        self.day_numbers = {}
+        self.clock_numbers = {}
+        f.write(COLUMNAR_MAGIC)
+
+    def write(self, record):
+        self.group.append(record)
+        if len(self.group) >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def remark_id(self, remark):
+        remark_id = self.remark_ids.get(remark)
+        if remark_id is None:
+            remark_id = self.remark_ids[remark] = len(self.remark_ids)
+            self.new_remarks.append(remark)
+        return remark_id
+
+    def flush(self):
+        if not self.group:
+            return
+        dates, starts, ends, durations, remarks = zip(*self.group)
+        day_numbers = self.day_numbers
+        for date_str in set(dates).difference(day_numbers):
+            year, month, day = date_str.split("-")
+            day_numbers[date_str] = date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL
+        clock_numbers = self.clock_numbers
+        for clock in set(starts).union(ends).difference(clock_numbers):
+            clock_numbers[clock] = clock_seconds(clock)
+        remark_ids = [self.remark_id(remark) for remark in remarks]
+        self.f.write(GROUP_HEADER.pack(GROUP_MARK, len(self.group), len(self.new_remarks)))
+        for remark in self.new_remarks:
+            data = remark.encode('utf-8')
+            self.f.write(struct.pack("<I", len(data)) + data)
+        self.f.write(pack_column([day_numbers[date_str] for date_str in dates], delta=True))
+        self.f.write(pack_column([clock_numbers[clock] for clock in starts]))
+        self.f.write(pack_column([clock_numbers[clock] for clock in ends]))
+        self.f.write(pack_column([int(round(duration * 10)) for duration in durations]))
+        self.f.write(pack_column(remark_ids))
+        self.new_remarks = []
+        self.group = []
+
+
+def write_columnar(records, path):
+    count = 0
+    with open(path, 'wb') as f:
+        writer = ColumnarWriter(f)
+        for record in records:
+            writer.write(record)
+            count += 1
+        writer.flush()
+    return count
+
+
+def read_columnar(path):
+    remarks = []
+    dates = {}
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} 不是列式历史记录文件")
+        while True:
+            header = f.read(GROUP_HEADER.size)
+            if not header:
+                break
+            if len(header) < GROUP_HEADER.size:
+                raise ValueError("列式文件已损坏：组头不完整")
+            mark, count, new_remarks = GROUP_HEADER.unpack(header)
+            if mark != GROUP_MARK:
+                raise ValueError("列式文件已损坏：找不到组头")
+            for _ in range(new_remarks):
+                size, = struct.unpack("<I", f.read(4))
+                remarks.append(f.read(size).decode('utf-8'))
+            days = unpack_column(f, count, delta=True)
+            starts = unpack_column(f, count)
+            ends = unpack_column(f, count)
+            tenths = unpack_column(f, count)
+            remark_ids = unpack_column(f, count)
+            for i in range(count):
+                day = days[i]
+                date_str = dates.get(day)
+                if date_str is None:
+                    date_str = dates[day] = date.fromordinal(day + EPOCH_ORDINAL).strftime("%Y-%m-%d")
+                yield Record(date_str, format_clock(starts[i]), format_clock(ends[i]),
+                             tenths[i] / 10, remarks[remark_ids[i]])
+
+
+# ---------- iCalendar ----------
+
+def ics_escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def ics_line(line):
+    """按 RFC 5545 把超过 75 字节的行折行（续行以空格开头）"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    while data:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(data))
+        # 不在多字节字符中间断开
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def record_key(record):
+    """记录的去重键：日期、开始、结束、时长（0.1 秒）和学习内容都相同才算同一条"""
+    return f"{record.date}\x1f{record.start}\x1f{record.end}\x1f{to_tenths(record.duration)}\x1f{record.remark}"
+
+
+def record_hash(record):
+    """记录的 64 位哈希（导入去重的索引和 .ics 的 UID 都用它）"""
+    return int.from_bytes(hashlib.blake2b(record_key(record).encode('utf-8'), digest_size=8).digest(), "little")
+
+
+def write_ics(records, path):
+    """每条记录一个事件，时间为本地的“浮动时间”（不带时区），跨过午夜的记录结束于第二天"""
+    count = 0
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//StudyTimer//学习计时器//ZH\r\nCALSCALE:GREGORIAN\r\n")
+        for record in records:
+            start = datetime.strptime(f"{record.date} {record.start}", "%Y-%m-%d %H:%M:%S")
+            end = datetime.strptime(f"{record.date} {record.end}", "%Y-%m-%d %H:%M:%S")
+            if end < start:
+                end += timedelta(days=1)
+            f.write("BEGIN:VEVENT\r\n")
+            f.write(ics_line(f"UID:{record_hash(record):016x}@study-timer"))
+            f.write(f"DTSTAMP:{stamp}\r\n")
+            f.write(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}\r\n")
+            f.write(f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}\r\n")
+            f.write(ics_line(f"SUMMARY:{ics_escape(record.remark)}"))
+            f.write(ics_line(f"DESCRIPTION:{ics_escape(f'学习时长 {record.duration:.1f} 秒')}"))
+            f.write("END:VEVENT\r\n")
+            count += 1
+        f.write("END:VCALENDAR\r\n")
+    return count
+
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "columnar": write_columnar,
+    "ics": write_ics,
+}
+
+READERS = {
+    "csv": read_csv,
+    "jsonl": read_jsonl,
+    "columnar": read_columnar,
+}
+
+
+def export_history(store, path, fmt=None, since=None, until=None, remarks=None):
+    """把存储中的记录（筛选后）导出到文件，返回导出条数。
+    压缩归档的汇总也一并导出，每个 (日期, 学习内容) 一条记录（见 archived_records），总时长不会丢失"""
+    fmt = format_of(path, fmt)
+    records = itertools.chain(store.archived_records(), store.iter_records())
+    return WRITERS[fmt](filter_records(records, since, until, remarks), path)
+
+
+def read_records(path, fmt=None):
+    """逐条读取导出文件中的记录（生成器）"""
+    fmt = format_of(path, fmt)
+    if fmt not in READERS:
+        raise ValueError(f"不支持从 {fmt} 格式导入")
+    return READERS[fmt](path)
+
+
+def build_hash_index(records):
+    """已有记录的哈希集合（每条记录一个 64 位整数），导入时 O(1) 判断是否重复"""
+    return {record_hash(record) for record in records}
+
+
+def import_history(store, path, fmt=None, since=None, until=None, remarks=None,
+                   existing=None, target=None, archived_dates=()):
+    """把文件中的记录（筛选后）追加到存储，跳过已有的记录。
+
+    existing 为已有记录的迭代器（默认 store.iter_records()），target 为实际写入的存储（默认 store，
+    守护进程运行时是 RemoteHistoryStore）。已压缩归档的日期只有汇总，无法逐条去重，这些日期的记录会跳过。
+    返回 (导入条数, 重复跳过条数, 归档日期跳过条数)。
+    """
+    records = filter_records(read_records(path, fmt), since, until, remarks)
+    index = build_hash_index(store.iter_records() if existing is None else existing)
+    target = store if target is None else target
+    imported = duplicates = archived = 0
+    batch = []
+    for record in records:
+        if record.date in archived_dates:
+            archived += 1
+            continue
+        key = record_hash(record)
+        if key in index:
+            duplicates += 1
+            continue
+        # 文件中重复出现的记录也只导入一次
+        index.add(key)
+        batch.append(record._replace(duration=to_tenths(record.duration) / 10))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            target.append_many(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        target.append_many(batch)
+        imported += len(batch)
+    return imported, duplicates, archived
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出 / 导入学习记录（CSV、JSONL、列式二进制、iCalendar）")
+    parser.add_argument("command", choices=["export", "import"], help="export: 历史记录 -> 文件；import: 文件 -> 历史记录")
+    parser.add_argument("path", help="导出或导入的文件（按扩展名判断格式）")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="文件格式（默认按扩展名判断）")
+    parser.add_argument("--since", help="起始日期（含），如 2025-07-01")
+    parser.add_argument("--until", help="结束日期（含），如 2025-07-31")
+    parser.add_argument("--remark", action="append", help="只处理这些学习内容（可重复指定）")
+    parser.add_argument("--backend", choices=sorted(HISTORY_BACKENDS), default="csv", help="存储后端")
+    parser.add_argument("--file", help="历史记录文件（默认为该后端的默认文件）")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help=f"用户（默认“{DEFAULT_PROFILE}”）")
+    parser.add_argument("--port", type=int, help="计时服务端口（导入时计时服务在运行则通过它写入）")
+    parser.add_argument("--no-daemon", action="store_true", help="导入时不通过计时服务，直接写入历史文件")
+    args = parser.parse_args(argv)
+
+    try:
+        store = open_profile_store(args.profile, args.backend, args.file)
+        if args.command == "export":
+            count = export_history(store, args.path, args.format, args.since, args.until, args.remark)
+            print(f"已导出 {count} 条记录到 {args.path}")
+            return 0
+        service = None if args.no_daemon else connect(args.port, args.profile)
+        target = None
+        if service is not None:
+            # 计时服务独占历史文件的写入：先让它写完缓冲中的记录，再由它追加导入的记录
+            service.store.preload()
+            target = service.store
+        archived_dates = {record.date for record in store.archived_records()}
+        try:
+            imported, duplicates, archived = import_history(
+                store, args.path, args.format, args.since, args.until, args.remark,
+                target=target, archived_dates=archived_dates
+            )
+        finally:
+            if service is not None:
+                service.close()
+    except (OSError, ValueError) as e:
+        print(f"{'导出' if args.command == 'export' else '导入'}失败: {e}", file=sys.stderr)
+        return 1
+    message = f"已导入 {imported} 条记录，跳过重复 {duplicates} 条"
+    if archived:
+        message += f"，已归档日期的记录 {archived} 条"
+    print(message)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+import csv
+import io
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from chart_rollups import update_chart_rollups
+from day_index import DayIndex
+from history_aggregates import HistoryAggregates, Record
+from history_archive import archive_file_for, read_archive
+from instrumentation import metrics, timed
+from intervals import IntervalTotals
+from range_index import RangeIndex
+from remarks import ALIAS_FILE, RemarkAliases, merge_remark_days
+
+# CSV 文件表头（与旧版本保持一致）
+HEADER = ["日期", "开始时间", "结束时间", "持续时间(秒)", "备注"]
+
+# 可选的存储后端及其默认文件名
+HISTORY_BACKENDS = {
+    "csv": "timer_history.csv",
+    "binary": "timer_history.bin",
+    "sqlite": "timer_history.db",
+}
+
+# 从末尾向前读到更早的日期后，再读多少行确认日期仍按顺序
+TAIL_LOOKBACK_ROWS = 256
+
+
+def open_history_store(backend="csv", history_file=None):
+    """按后端名称创建历史记录存储，未指定文件时使用该后端的默认文件名"""
+    if backend not in HISTORY_BACKENDS:
+        raise ValueError(f"未知的存储后端: {backend}")
+    if history_file is None:
+        history_file = HISTORY_BACKENDS[backend]
+    if backend == "binary":
+        # 延迟导入，默认的 CSV 后端不需要加载 mmap/struct
+        from binary_store import BinaryHistoryStore
+        return BinaryHistoryStore(history_file)
+    if backend == "sqlite":
+        from sqlite_store import SqliteHistoryStore
+        return SqliteHistoryStore(history_file)
+    return HistoryStore(history_file)
+
+
+def parse_duration(value, history_file, line_no):
+    """CSV 中的时长（秒），格式错误时抛出带文件名和行号的 ValueError"""
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{history_file} 第 {line_no} 行的时长格式错误: {value!r}") from None
+
+
+@timed("csv.tail_day_total")
+def tail_day_total(history_file, date_str, block_size=65536, lookback=TAIL_LOOKBACK_ROWS):
+    """从文件末尾向前读取，累加指定日期的学习时间（秒）。
+
+    记录按保存时间追加，遇到更早日期且没有跨过午夜的记录后，再核对 lookback 行日期仍按顺序，
+    之前的记录都保存于这一天之前，可以停止读取，因此耗时只与当天的记录数有关。
+    向前读到的日期反而变晚时（导入了更早的记录、手动编辑等），文件不是按日期顺序的，返回 None，
+    由调用方改用按日索引。
+    """
+    total = 0.0
+    scanned = 0
+    # 文件中后一行的日期，以及遇到更早日期之后又读了多少行
+    later = None
+    older = 0
+    with open(history_file, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        # 上一块开头不完整的一行，与下一块的末尾拼接
+        remainder = b""
+        while pos > 0:
+            read = min(block_size, pos)
+            pos -= read
+            f.seek(pos)
+            lines = (f.read(read) + remainder).split(b"\n")
+            # 还没读到文件开头时，第一行可能不完整
+            remainder = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                scanned += 1
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if not row or len(row) < 5 or row == HEADER:
+                    continue
+                if later is not None and row[0] > later:
+                    metrics.count("csv.tail_rows_scanned", scanned)
+                    metrics.count("csv.tail_out_of_order")
+                    return None
+                later = row[0]
+                if row[0] == date_str:
+                    total += float(row[3])
+                elif row[0] < date_str and (older or row[2] >= row[1]):
+                    older += 1
+                    if older > lookback:
+                        pos = 0
+                        break
+    metrics.count("csv.tail_rows_scanned", scanned)
+    return total
+
+
+class BaseHistoryStore(ABC):
+    """各存储后端共用的记录/汇总查询接口，默认基于内存中的汇总缓存实现"""
+
+    @abstractmethod
+    def get_aggregates(self):
+        """返回最新的 HistoryAggregates，由具体后端实现"""
+
+    @abstractmethod
+    def day_total(self, date_str):
+        """返回指定日期的总学习时间（秒），由具体后端实现"""
+
+    def today_total(self):
+        """返回今天的总学习时间（秒）"""
+        return self.day_total(datetime.now().strftime("%Y-%m-%d"))
+
+    def preload(self):
+        """预先构建汇总缓存，让之后的查询不必等待读取文件"""
+        self.get_aggregates()
+
+    def append_many(self, records):
+        """批量追加记录，后端可以覆盖为一次写入"""
+        for record in records:
+            self.append(record)
+
+    def sync(self):
+        """把已追加的记录刷到磁盘（fsync），成批写入后调用一次"""
+        with open(self.history_file, 'ab') as f:
+            os.fsync(f.fileno())
+
+    def daily_rows(self):
+        """返回 (日期, 总时长, 次数) 列表，按日期降序"""
+        return self.get_aggregates().daily_rows()
+
+    def remark_totals(self, date=None):
+        """返回 (备注, 总时长) 列表，按总时长降序；指定日期时只统计当天。备注按别名合并"""
+        return self.remark_aliases().merge_totals(self.get_aggregates().remark_totals(date))
+
+    def range_index(self):
+        """按日期范围查询的树状数组：第一次查询时由每日汇总构建（不重新读取记录），之后随追加增量更新"""
+        aggregates = self.get_aggregates()
+        if aggregates.ranges is None:
+            ranges = RangeIndex()
+            ranges.extend(aggregates.daily, aggregates.by_date_remark)
+            aggregates.ranges = ranges
+        return aggregates.ranges
+
+    def range_totals(self, since=None, until=None):
+        """[since, until] 日期范围（含两端，None 为不限）的 (总时长, 次数, [(备注, 时长)])，
+        O(log 天数)；备注按别名合并"""
+        ranges = self.range_index()
+        total, count = ranges.total(since, until)
+        return total, count, self.remark_aliases().merge_totals(ranges.remark_totals(since, until))
+
+    def chart_sources(self):
+        """图表缓存依赖的文件 [(路径, 是否是只在末尾追加的 CSV)]"""
+        return [(self.history_file, False)]
+
+    def chart_cache_file(self):
+        return self.history_file + ".charts.json"
+
+    def chart_rows(self):
+        """(日期, 备注, 时长) 的每日汇总，图表缓存需要重新生成时使用"""
+        for date, remarks in self.get_aggregates().by_date_remark.items():
+            for remark, duration in remarks.items():
+                yield date, remark, duration
+
+    def chart_rollups(self):
+        """图表用的按天/周/月汇总（ChartRollups），见 chart_rollups.py"""
+        self.charts = update_chart_rollups(getattr(self, "charts", None), self)
+        return self.charts
+
+    def chart_series(self, since=None, until=None, max_points=400, level="day"):
+        """图表数据：[since, until]（None 为不限）范围内不超过 max_points 个桶，
+        粒度从 level 开始选能放下的最细一级，按月也放不下时每 step 个月合并成一个桶。
+        返回 {level, step, first, last, buckets: [[开始日期, {备注: 秒}]]}，
+        first / last 是全部记录的日期范围；备注按别名合并"""
+        rollups = self.chart_rollups()
+        first, last = rollups.span()
+        if first is None:
+            return {"level": level, "step": 1, "first": None, "last": None, "buckets": []}
+        level, step, series = rollups.downsampled(since or first, until or last, max_points, level)
+        table = self.remark_aliases().mapping()
+        buckets = []
+        for start, remarks in series:
+            if table:
+                merged = {}
+                for remark, duration in remarks.items():
+                    remark = table.get(remark, remark)
+                    merged[remark] = merged.get(remark, 0.0) + duration
+                remarks = merged
+            buckets.append([start, remarks])
+        return {"level": level, "step": step, "first": first, "last": last, "buckets": buckets}
+
+    def archived_records(self):
+        """压缩归档的汇总，每个 (日期, 学习内容) 一条合成的记录（导出时使用）；没有归档的后端为空"""
+        return []
+
+    def archived_totals(self, date):
+        """已归档（压缩后没有逐条记录）的某天每个学习内容的汇总 [(备注, 总时长, 次数)]；没有归档的后端为空"""
+        return []
+
+    def alias_file(self):
+        """别名/合并表的文件，与历史记录在同一目录"""
+        return os.path.join(os.path.dirname(self.history_file), ALIAS_FILE)
+
+    def remark_aliases(self):
+        """备注的别名/合并表（RemarkAliases），只在读取汇总时应用，不改写历史记录"""
+        if getattr(self, "aliases", None) is None:
+            self.aliases = RemarkAliases(self.alias_file())
+        return self.aliases
+
+    def remark_days(self):
+        """所有 (日期, 备注) 对（每天每个备注一次）"""
+        for date, remarks in self.get_aggregates().by_date_remark.items():
+            for remark in remarks:
+                yield date, remark
+
+    def remark_stats(self):
+        """各学习内容的 [(备注, 学习天数, 最近一次的日期)]（按别名合并），用于输入时的自动补全排序"""
+        return merge_remark_days(self.remark_days(), self.remark_aliases().mapping())
+
+    def records_for_date(self, date):
+        """返回指定日期的所有记录"""
+        return self.get_aggregates().records_for_date(date)
+
+    def grand_total(self):
+        """返回所有记录的总学习时间（秒）"""
+        return self.get_aggregates().grand_total
+
+    def build_intervals(self):
+        """遍历全部记录构建去重汇总，有归档的后端还要计入归档汇总"""
+        intervals = IntervalTotals()
+        intervals.extend(self.iter_records())
+        return intervals
+
+    def dedup_totals(self):
+        """返回去重后的汇总（IntervalTotals）：第一次查询时构建，之后随追加增量更新，
+        追加到旧日期的记录在这里重新计算"""
+        aggregates = self.get_aggregates()
+        if aggregates.intervals is None:
+            aggregates.intervals = self.build_intervals()
+        intervals = aggregates.intervals
+        if intervals.stale:
+            intervals.resolve(self.records_for_date, self.archived_totals)
+        return intervals
+
+    def dedup_daily_totals(self):
+        """返回 {日期: 去重后的总学习时间（秒）}，同一天内重叠的时间只算一次"""
+        return self.dedup_totals().daily_totals()
+
+    def dedup_remark_totals(self, date=None):
+        """返回去重后的 (备注, 总时长) 列表，按总时长降序；指定日期时只统计当天。
+        别名与合并到的备注各自去重后相加（两者之间重叠的时间不再去重）"""
+        return self.remark_aliases().merge_totals(self.dedup_totals().remark_totals(date))
+
+    def dedup_grand_total(self):
+        """返回去重后所有记录的总学习时间（秒）"""
+        return self.dedup_totals().grand_total()
+
+
+class HistoryStore(BaseHistoryStore):
+    """历史记录存储：只完整读取一次 CSV，之后在内存中维护各类汇总。
+    完整读取推迟到第一次需要汇总时，启动时只从文件末尾读取今天的记录；
+    单日的详细记录通过按日索引直接定位读取，不在内存中保留每条记录。"""
+
+    def __init__(self, history_file):
+        self.history_file = history_file
+        # 完整汇总，第一次需要时才构建
+        self.aggregates = None
+        # 按日索引（timer_history.csv.idx）
+        self.index = DayIndex(history_file)
+        # 压缩后的早期记录（timer_history_archive.csv），见 compact.py
+        self.archive_file = archive_file_for(history_file)
+        # 上次读取后文件的 (修改时间, 大小)，用于判断缓存是否失效
+        self.file_stat = None
+        self.create_history_file()
+
+    def create_history_file(self):
+        """创建历史记录文件（如果不存在）"""
+        if not os.path.exists(self.history_file):
+            with open(self.history_file, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(HEADER)
+
+    def current_file_stat(self):
+        """返回历史文件当前的 (修改时间, 大小)"""
+        try:
+            st = os.stat(self.history_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def iter_records(self):
+        """按文件顺序逐条读取记录（流式，不占用额外内存）"""
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # 跳过标题行
+            for row in reader:
+                if len(row) >= 5:
+                    yield Record(row[0], row[1], row[2], parse_duration(row[3], self.history_file, reader.line_num),
+                                 row[4])
+
+    def archived_records(self):
+        """归档中每个 (日期, 学习内容) 的汇总作为一条从 00:00:00 开始的记录，按日期排序"""
+        for (date, remark), (tenths, count) in sorted(read_archive(self.archive_file).items()):
+            duration = tenths / 10
+            end = datetime.min + timedelta(seconds=min(int(duration), 86399))
+            yield Record(date, "00:00:00", end.strftime("%H:%M:%S"), duration, remark)
+
+    def build_intervals(self):
+        """读取出错（如时长格式错误）时抛出异常，不缓存读到一半的结果"""
+        intervals = IntervalTotals()
+        for (date, remark), (tenths, count) in read_archive(self.archive_file).items():
+            intervals.add_rollup(date, remark, tenths / 10)
+        intervals.extend(self.iter_records())
+        return intervals
+
+    def chart_sources(self):
+        """历史文件只在末尾追加，图表缓存可以只读取新增的部分；归档文件变化时重新生成"""
+        return [(self.history_file, True), (self.archive_file, False)]
+
+    @timed("csv.load")
+    def load(self):
+        """完整读取一次历史文件，单次遍历重建所有汇总；大文件分块多进程读取（见 parallel_ingest.py）。
+        有格式错误的行时抛出 ValueError（带行号），不缓存读到一半的汇总，由调用方显示错误"""
+        from parallel_ingest import PARALLEL_MIN_BYTES, ingest
+        file_stat = self.current_file_stat()
+        # 单核时分块读取没有收益，仍逐行读取
+        if file_stat is not None and file_stat[1] >= PARALLEL_MIN_BYTES and (os.cpu_count() or 1) > 1:
+            try:
+                self.aggregates = ingest([self.history_file])
+                self.file_stat = file_stat
+                metrics.count("csv.parallel_loads")
+                metrics.count("csv.rows_scanned", self.aggregates.session_count)
+                return
+            except Exception as e:
+                print(f"并行读取历史记录失败，改为逐行读取: {e}")
+        aggregates = HistoryAggregates(keep_sessions=False)
+        # 日期和备注大量重复，复用同一个字符串对象以节省内存
+        interned = {}
+        # 先累加归档的每日汇总，再累加逐条记录
+        for (date, remark), (tenths, count) in read_archive(self.archive_file).items():
+            aggregates.add_rollup(date, remark, tenths / 10, count)
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # 跳过标题行
+            for row in reader:
+                if len(row) >= 5:
+                    date = interned.setdefault(row[0], row[0])
+                    remark = interned.setdefault(row[4], row[4])
+                    duration = parse_duration(row[3], self.history_file, reader.line_num)
+                    aggregates.add(Record(date, row[1], row[2], duration, remark))
+        self.aggregates = aggregates
+        self.file_stat = self.current_file_stat()
+        metrics.count("csv.loads")
+        metrics.count("csv.rows_scanned", aggregates.session_count)
+
+    def refresh(self):
+        """尚未读取或文件被外部修改（修改时间或大小变化）时重新读取"""
+        if self.aggregates is None or self.current_file_stat() != self.file_stat:
+            self.load()
+
+    def get_aggregates(self):
+        """返回最新的汇总结果，只有缓存失效时才重新读取文件"""
+        self.refresh()
+        return self.aggregates
+
+    def append(self, record):
+        """追加一条记录到文件，并同步更新内存中的汇总"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """一次打开文件追加多条记录，并同步更新内存中的汇总和按日索引"""
+        # 追加前文件已被外部修改时，不更新 file_stat，让下次读取时重建汇总
+        in_sync = self.current_file_stat() == self.file_stat
+        index_valid = self.index.is_valid()
+        saved = []
+        # 逐行编码后以二进制追加，才能得到每一行准确的字节偏移
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        with open(self.history_file, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            for record in records:
+                duration_str = f"{record.duration:.1f}"
+                writer.writerow([
+                    record.date,
+                    record.start,
+                    record.end,
+                    duration_str,
+                    record.remark
+                ])
+                data = buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                f.write(data)
+                if index_valid:
+                    self.index.add(record.date, offset, offset + len(data))
+                offset += len(data)
+                # 与文件中保存的精度保持一致
+                saved.append(record._replace(duration=float(duration_str)))
+        if index_valid:
+            self.index.commit()
+        if self.aggregates is None:
+            # 还没有完整读取过，以后读取时自然包含这些记录
+            return
+        for record in saved:
+            self.aggregates.add(record)
+        if in_sync:
+            self.file_stat = self.current_file_stat()
+
+    def day_total(self, date_str):
+        """返回指定日期的总学习时间（秒）：已完整读取时只查内存，
+        否则通过按日索引读取当天的行，索引不可用时从文件末尾倒序读取"""
+        if self.aggregates is not None:
+            return self.aggregates.day_total(date_str)
+        if self.index.is_valid():
+            return sum(float(row[3]) for row in self.index.read_day(date_str))
+        total = tail_day_total(self.history_file, date_str)
+        if total is None:
+            # 日期顺序被打乱，不能只读末尾：重建按日索引后读取
+            self.index.ensure()
+            total = sum(float(row[3]) for row in self.index.read_day(date_str))
+        return total
+
+    def records_for_date(self, date):
+        """通过按日索引读取指定日期的记录：一次 seek 加一次有限长度的读取。
+        只返回历史文件中的逐条记录，已归档的部分见 archived_totals"""
+        self.index.ensure()
+        return [Record(row[0], row[1], row[2], float(row[3]), row[4])
+                for row in self.index.read_day(date)]
+
+    def archived_totals(self, date):
+        return [(remark, tenths / 10, count)
+                for (archived_date, remark), (tenths, count) in sorted(read_archive(self.archive_file).items())
+                if archived_date == date]
+
+    def preload(self):
+        """在后台预先检查/重建按日索引并构建汇总缓存"""
+        self.index.ensure()
+        self.get_aggregates()
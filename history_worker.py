@@ -0,0 +1,122 @@
+import queue
+import threading
+
+
+class HistoryWorker:
+    """历史记录 I/O 后台线程：所有存储操作都在这个线程中按顺序执行，
+    结果放入结果队列，由 Tk 主线程通过 root.after 取回并执行回调"""
+
+    # 有任务未完成时，主线程检查结果队列的间隔（毫秒）
+    POLL_INTERVAL = 20
+
+    def __init__(self, root, store_factory):
+        self.root = root
+        # 在后台线程中打开存储，避免启动时读取文件阻塞界面
+        self.store_factory = store_factory
+        self.store = None
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        # 已提交但回调尚未执行的任务数，只有大于 0 时才轮询结果队列
+        self.pending = 0
+        self.polling = False
+        self.thread = threading.Thread(target=self.run, name="history-io", daemon=True)
+        self.thread.start()
+
+    def submit(self, func, callback=None, errback=None):
+        """在后台线程中执行 func(store)，完成后在主线程中调用 callback(结果) 或 errback(异常)"""
+        self.tasks.put(("call", func, callback, errback))
+        self.task_added()
+
+    def append(self, record, callback=None, errback=None):
+        """追加一条记录；连续提交的多条记录会合并成一次写入"""
+        self.tasks.put(("append", record, callback, errback))
+        self.task_added()
+
+    def task_added(self):
+        self.pending += 1
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        """主线程：执行已完成任务的回调，还有未完成任务时继续轮询"""
+        while True:
+            try:
+                callback, errback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            try:
+                if error is not None:
+                    if errback is not None:
+                        errback(error)
+                    else:
+                        print(f"历史记录操作失败: {error}")
+                elif callback is not None:
+                    callback(result)
+            except Exception as e:
+                print(f"历史记录回调失败: {e}")
+        if self.pending > 0:
+            self.root.after(self.POLL_INTERVAL, self.poll)
+        else:
+            self.polling = False
+
+    def run(self):
+        """后台线程主循环"""
+        try:
+            self.store = self.store_factory()
+            store_error = None
+        except Exception as e:
+            store_error = e
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            if store_error is not None:
+                self.results.put((task[2], task[3], None, store_error))
+                continue
+            if task[0] == "append":
+                # 把队列中紧跟着的追加任务合并成一批写入
+                batch = [task]
+                stop = False
+                while True:
+                    try:
+                        following = self.tasks.get_nowait()
+                    except queue.Empty:
+                        following = None
+                        break
+                    if following is None:
+                        stop = True
+                        break
+                    if following[0] != "append":
+                        break
+                    batch.append(following)
+                self.run_appends(batch)
+                if stop:
+                    break
+                if following is not None:
+                    self.run_call(following)
+            else:
+                self.run_call(task)
+
+    def run_call(self, task):
+        _, func, callback, errback = task
+        try:
+            self.results.put((callback, errback, func(self.store), None))
+        except Exception as e:
+            self.results.put((callback, errback, None, e))
+
+    def run_appends(self, batch):
+        records = [record for _, record, _, _ in batch]
+        try:
+            self.store.append_many(records)
+            error = None
+        except Exception as e:
+            error = e
+        for _, record, callback, errback in batch:
+            self.results.put((callback, errback, record, error))
+
+    def stop(self, timeout=5):
+        """处理完已提交的任务后结束后台线程"""
+        self.tasks.put(None)
+        self.thread.join(timeout)
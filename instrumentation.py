@@ -0,0 +1,176 @@
+"""运行时统计：计数器和耗时直方图，以及可选的 cProfile 采样
+
+    from instrumentation import metrics, timed
+
+    @timed("ui.update_timer")
+    def update_timer(self): ...
+
+    metrics.count("csv.rows_scanned", n)
+    with metrics.timer("csv.load"):
+        ...
+
+默认关闭，关闭时每次调用只多一次属性判断。设置环境变量 STUDY_TIMER_METRICS=1 启动时开启，
+STUDY_TIMER_PROFILE=1 启动时同时开始 cProfile；界面中按 Ctrl+Shift+D 打开诊断窗口，可以随时开关。
+"""
+import io
+import json
+import os
+import time
+from functools import wraps
+
+# 直方图的桶数：第 i 个桶统计耗时在 [2^(i-1), 2^i) 微秒之间的次数，最后一个桶收纳更长的耗时
+BUCKETS = 32
+
+
+class Histogram:
+    """耗时直方图（按 2 的幂分桶，分位数取所在桶的上界）"""
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = int(seconds * 1e6).bit_length()
+        self.buckets[index if index < BUCKETS else BUCKETS - 1] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """近似分位数（秒）"""
+        if not self.count:
+            return 0.0
+        target = self.count * fraction
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return min((1 << index) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """计数器和耗时直方图。界面线程和历史记录线程都会写入，只用于诊断，不加锁"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.since = time.time()
+        self.profiler = None
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        """记录一次耗时（秒）"""
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        """with metrics.timer(名称): 统计代码块的耗时"""
+        return Timer(self, name)
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.since = time.time()
+
+    def snapshot(self):
+        """当前的统计（可以 JSON 序列化）"""
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "counters": dict(self.counters),
+            "timings": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def dump(self, path):
+        """把统计写入 JSON 文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_profile(self):
+        """开始 cProfile 采样（只采样调用它的线程，界面中就是主线程）"""
+        if self.profiler is None:
+            # 用到时才导入，默认不采样时不加载 cProfile/pstats
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, path=None, limit=30):
+        """结束采样，返回按累计耗时排序的前 limit 项；指定 path 时同时保存 .prof 文件"""
+        if self.profiler is None:
+            return ""
+        profiler, self.profiler = self.profiler, None
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        import pstats
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(limit)
+        return text.getvalue()
+
+
+class Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        if self.metrics.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.metrics.enabled and self.start:
+            self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+# 进程内共用的统计
+metrics = Metrics(enabled=os.environ.get("STUDY_TIMER_METRICS", "0") != "0")
+
+
+def timed(name):
+    """装饰器：统计函数每次调用的耗时"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def profile_from_environment():
+    """STUDY_TIMER_PROFILE=1 时启动即开始 cProfile 采样（同时开启统计）"""
+    if os.environ.get("STUDY_TIMER_PROFILE", "0") != "0":
+        metrics.enabled = True
+        metrics.start_profile()
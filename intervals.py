@@ -0,0 +1,200 @@
+from datetime import date
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+
+def merge_intervals(intervals):
+    """把 (开始, 结束) 列表排序后合并，返回合并后的区间列表（O(n log n)）"""
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def covered_seconds(intervals):
+    """区间并集的总时长（秒），重叠部分只算一次"""
+    return sum(end - start for start, end in merge_intervals(intervals))
+
+
+class DayIntervals:
+    """某一天的记录区间。追加只是记下区间，需要时才排序合并（全部记录的并集，以及每个学习内容各自的并集），
+    结果缓存到下一次追加为止"""
+
+    def __init__(self):
+        self.intervals = []
+        self.cached = None
+
+    def add(self, remark, start, end):
+        self.intervals.append((start, end, remark))
+        self.cached = None
+
+    def totals(self):
+        """返回 (去重总时长, {备注: 去重时长})。按开始时间排序一次，
+        同一次遍历中合并全部记录和每个学习内容各自的区间"""
+        if self.cached is None:
+            total = 0.0
+            current_start = current_end = None
+            # 备注 -> [已合并的时长, 当前区间开始, 当前区间结束]
+            remarks = {}
+            for start, end, remark in sorted(self.intervals):
+                if end <= start:
+                    continue
+                if current_end is None or start > current_end:
+                    if current_end is not None:
+                        total += current_end - current_start
+                    current_start, current_end = start, end
+                elif end > current_end:
+                    current_end = end
+                state = remarks.get(remark)
+                if state is None:
+                    remarks[remark] = [0.0, start, end]
+                elif start > state[2]:
+                    state[0] += state[2] - state[1]
+                    state[1], state[2] = start, end
+                elif end > state[2]:
+                    state[2] = end
+            if current_end is not None:
+                total += current_end - current_start
+            self.cached = (total, {remark: done + end - start for remark, (done, start, end) in remarks.items()})
+        return self.cached
+
+
+class IntervalTotals:
+    """去重后的学习时长：同一天内时间重叠的记录（同时开着两段计时、连续快速点击）只算一次。
+
+    每天的区间排序后合并（O(n log n)），追加一条记录只需重新合并它所在的那一天。
+    记录按日期（开始日期）归属，与原始汇总一致；跨过午夜的记录整段算在开始那天。
+    只保留最近 RETAINED_DAYS 天的区间用于增量追加，更早的日期只保留去重后的总时长，
+    所以完整读取时内存占用与历史长短无关。追加到已不保留区间的旧日期时，
+    该日期标记为待重算，查询前由 resolve() 用当天的记录重新计算。
+    归档汇总没有开始/结束时间，无法去重，按原始时长计入。
+    """
+
+    # 保留区间的最近天数（今天和昨天，覆盖跨过午夜的计时）
+    RETAINED_DAYS = 2
+
+    def __init__(self):
+        # 已不保留区间的日期：日期 -> 去重总时长 / {备注: 去重时长}
+        self.day_totals = {}
+        self.remark_totals_by_date = {}
+        # 最近几天的区间：日期 -> DayIntervals
+        self.retained = {}
+        # 需要用当天记录重新计算的日期
+        self.stale = set()
+        # 日期字符串 -> 当天 0 点的秒数
+        self.day_starts = {}
+
+    def interval_of(self, record):
+        """记录的 (开始, 结束)，以本地时间的秒数表示；结束时间由时长推算，跨过午夜也正确"""
+        day_start = self.day_starts.get(record.date)
+        if day_start is None:
+            year, month, day = record.date.split("-")
+            day_start = (date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+            self.day_starts[record.date] = day_start
+        clock = record.start
+        start = day_start + int(clock[0:2]) * 3600 + int(clock[3:5]) * 60 + int(clock[6:8])
+        return start, start + record.duration
+
+    def add(self, record):
+        """累加一条记录（增量）"""
+        date_str = record.date
+        day = self.retained.get(date_str)
+        if day is None:
+            if date_str in self.day_totals:
+                # 旧日期的区间已丢弃，查询前重新计算
+                self.stale.add(date_str)
+                return
+            day = self.retained[date_str] = DayIntervals()
+        start, end = self.interval_of(record)
+        day.add(record.remark, start, end)
+        if len(self.retained) > self.RETAINED_DAYS:
+            self.release(min(self.retained))
+
+    def extend(self, records):
+        """一次累加大量记录（完整构建）：先按天收集区间，再逐天排序合并，最后只保留最近几天的区间"""
+        days = {}
+        for record in records:
+            day = days.get(record.date)
+            if day is None:
+                if record.date in self.day_totals or record.date in self.retained:
+                    self.add(record)
+                    continue
+                day = days[record.date] = DayIntervals()
+            start, end = self.interval_of(record)
+            day.add(record.remark, start, end)
+        self.retained.update(days)
+        for date_str in sorted(self.retained)[:-self.RETAINED_DAYS]:
+            self.release(date_str)
+
+    def add_rollup(self, date_str, remark, duration):
+        """归档汇总无法去重，按原始时长计入"""
+        self.day_totals[date_str] = self.day_totals.get(date_str, 0.0) + duration
+        remarks = self.remark_totals_by_date.setdefault(date_str, {})
+        remarks[remark] = remarks.get(remark, 0.0) + duration
+
+    def release(self, date_str):
+        """不再保留某天的区间，只保留去重后的总时长"""
+        total, by_remark = self.retained.pop(date_str).totals()
+        self.day_totals[date_str] = self.day_totals.get(date_str, 0.0) + total
+        remarks = self.remark_totals_by_date.setdefault(date_str, {})
+        for remark, duration in by_remark.items():
+            remarks[remark] = remarks.get(remark, 0.0) + duration
+
+    def resolve(self, records_for_date, archived_totals=None):
+        """用 records_for_date(日期) 重新计算待重算的日期；
+        archived_totals(日期) 返回当天已归档的 [(备注, 总时长, 次数)]"""
+        for date_str in list(self.stale):
+            day = DayIntervals()
+            # 归档的汇总没有开始时间，按原始时长计入
+            rollup_total = 0.0
+            remarks = {}
+            for remark, duration, count in (archived_totals(date_str) if archived_totals else ()):
+                rollup_total += duration
+                remarks[remark] = remarks.get(remark, 0.0) + duration
+            for record in records_for_date(date_str):
+                start, end = self.interval_of(record)
+                day.add(record.remark, start, end)
+            total, by_remark = day.totals()
+            self.day_totals[date_str] = total + rollup_total
+            for remark, duration in by_remark.items():
+                remarks[remark] = remarks.get(remark, 0.0) + duration
+            self.remark_totals_by_date[date_str] = remarks
+            self.stale.discard(date_str)
+
+    def day_total(self, date_str):
+        """某天去重后的总时长（秒）"""
+        day = self.retained.get(date_str)
+        total = self.day_totals.get(date_str, 0.0)
+        return total + day.totals()[0] if day is not None else total
+
+    def daily_totals(self):
+        """日期 -> 去重后的总时长（秒）"""
+        totals = dict(self.day_totals)
+        for date_str, day in self.retained.items():
+            totals[date_str] = totals.get(date_str, 0.0) + day.totals()[0]
+        return totals
+
+    def remark_totals(self, date=None):
+        """按备注的去重时长 [(备注, 时长)]，按时长降序；不指定日期时是各天之和"""
+        totals = {}
+        if date is None:
+            sources = list(self.remark_totals_by_date.values())
+            sources += [day.totals()[1] for day in self.retained.values()]
+        else:
+            sources = [self.remark_totals_by_date.get(date, {})]
+            if date in self.retained:
+                sources.append(self.retained[date].totals()[1])
+        for remarks in sources:
+            for remark, value in remarks.items():
+                totals[remark] = totals.get(remark, 0.0) + value
+        return sorted(totals.items(), key=lambda x: x[1], reverse=True)
+
+    def grand_total(self):
+        return sum(self.daily_totals().values())
@@ -0,0 +1,179 @@
+"""并行读取 CSV 历史记录：按换行对齐的字节范围分块，多进程解析并各自汇总，最后合并
+
+    python parallel_ingest.py timer_history.csv
+    python parallel_ingest.py 小明.csv 小红.csv --workers 4     # 合并多份导出的历史记录一起统计
+    python parallel_ingest.py timer_history.csv --check        # 与单进程逐行读取的结果核对
+
+每个块在子进程中解析成一份 HistoryAggregates（按日期/备注/(日期, 备注)的汇总），
+只把汇总传回主进程，按文件和块的顺序合并，结果与单进程读取相同。
+带引号的备注中含换行时一条记录跨多行，按换行分的块可能从记录中间开始，
+这样的文件整个改用 csv 模块单进程读取。子进程用 spawn 方式启动，不复制界面等父进程的状态。
+HistoryStore 在多核的电脑上读取超过 PARALLEL_MIN_BYTES 的历史文件时自动使用。
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from history_aggregates import HistoryAggregates, Record
+from history_archive import archive_file_for, read_archive
+
+# 超过这个大小的文件才分块并行读取，较小的文件启动进程池的开销比解析还大
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+# 每块最多多少字节（块数至少与进程数相同）
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def chunk_ranges(path, chunk_bytes=CHUNK_BYTES, chunks=1):
+    """把文件（跳过标题行）分成 [开始, 结束) 字节范围，每个范围都从一行的开头开始、在换行之后结束"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()  # 跳过标题行
+        start = f.tell()
+        if start >= size:
+            return []
+        step = max(1, min(chunk_bytes, -(-(size - start) // max(1, chunks))))
+        ranges = []
+        while start < size:
+            end = start + step
+            if end < size:
+                f.seek(end)
+                f.readline()  # 移到下一行的开头
+                end = f.tell()
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def aggregate_chunk(task):
+    """子进程：解析文件中 [开始, 结束) 的行并汇总。
+    有一行的引号个数是奇数时（带引号的字段中有换行，记录跨多行）返回 None，由调用方改用 csv_aggregates"""
+    path, start, end = task
+    aggregates = HistoryAggregates(keep_sessions=False)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        # 只按 \n 分行（与 csv 模块一致，不把备注中的 \u2028 等字符当作换行）
+        lines = f.read(end - start).decode('utf-8').replace("\r\n", "\n").split("\n")
+    # 日期和备注大量重复，复用同一个字符串对象
+    interned = {}
+    add = aggregates.add
+    for line in lines:
+        # 绝大多数行没有引号，直接按逗号拆分；有引号（备注中含逗号等）时才交给 csv 解析
+        if '"' not in line:
+            row = line.split(",")
+        elif line.count('"') % 2:
+            return None
+        else:
+            row = next(csv.reader([line]), [])
+        if len(row) >= 5:
+            date = interned.setdefault(row[0], row[0])
+            remark = interned.setdefault(row[4], row[4])
+            add(Record(date, row[1], row[2], float(row[3]), remark))
+    return aggregates
+
+
+def csv_aggregates(path):
+    """用 csv 模块逐条读取一个文件（跳过标题行）并汇总，记录可以跨多行"""
+    aggregates = HistoryAggregates(keep_sessions=False)
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # 跳过标题行
+        for row in reader:
+            if len(row) >= 5:
+                aggregates.add(Record(row[0], row[1], row[2], float(row[3]), row[4]))
+    return aggregates
+
+
+def ingest(paths, workers=None, chunk_bytes=CHUNK_BYTES, include_archive=True):
+    """读取一个或多个 CSV 历史文件（以及各自的归档汇总），返回合并后的 HistoryAggregates。
+    workers 为进程数（默认 CPU 核数），为 1 时在本进程中逐块读取"""
+    workers = workers or os.cpu_count() or 1
+    aggregates = HistoryAggregates(keep_sessions=False)
+    if include_archive:
+        for path in paths:
+            for (date, remark), (tenths, count) in read_archive(archive_file_for(path)).items():
+                aggregates.add_rollup(date, remark, tenths / 10, count)
+    tasks = [(path, start, end) for path in paths for start, end in chunk_ranges(path, chunk_bytes, workers)]
+    if workers == 1 or len(tasks) <= 1:
+        parts = [aggregate_chunk(task) for task in tasks]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as executor:
+            # map 按提交顺序返回，合并顺序与文件中的顺序一致
+            parts = list(executor.map(aggregate_chunk, tasks))
+    by_path = {}
+    for (path, _, _), part in zip(tasks, parts):
+        by_path.setdefault(path, []).append(part)
+    for path in paths:
+        file_parts = by_path.get(path, [])
+        if any(part is None for part in file_parts):
+            file_parts = [csv_aggregates(path)]
+        for part in file_parts:
+            aggregates.merge(part)
+    return aggregates
+
+
+def serial_aggregates(paths):
+    """对照：单进程逐行读取（与 HistoryStore.load 的小文件路径相同）"""
+    aggregates = HistoryAggregates(keep_sessions=False)
+    for path in paths:
+        for (date, remark), (tenths, count) in read_archive(archive_file_for(path)).items():
+            aggregates.add_rollup(date, remark, tenths / 10, count)
+    for path in paths:
+        aggregates.merge(csv_aggregates(path))
+    return aggregates
+
+
+def same_aggregates(a, b, tolerance=1e-6):
+    """两份汇总是否相同（求和顺序不同，时长允许浮点误差）"""
+    if a.session_count != b.session_count or abs(a.grand_total - b.grand_total) > tolerance * max(1.0, a.grand_total):
+        return False
+    if a.daily.keys() != b.daily.keys() or a.by_remark.keys() != b.by_remark.keys():
+        return False
+    for date, (total, count) in a.daily.items():
+        other = b.daily[date]
+        if count != other[1] or abs(total - other[0]) > tolerance * max(1.0, total):
+            return False
+        remarks = b.by_date_remark[date]
+        if a.by_date_remark[date].keys() != remarks.keys():
+            return False
+        if any(abs(duration - remarks[remark]) > tolerance * max(1.0, duration)
+               for remark, duration in a.by_date_remark[date].items()):
+            return False
+    return all(abs(total - b.by_remark[remark]) <= tolerance * max(1.0, total) for remark, total in a.by_remark.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行读取 CSV 历史记录并汇总")
+    parser.add_argument("files", nargs="+", help="CSV 历史文件（多个时合并统计）")
+    parser.add_argument("--workers", type=int, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--check", action="store_true", help="同时单进程读取一次，核对结果是否相同")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        aggregates = ingest(args.files, args.workers)
+    except (OSError, ValueError) as e:
+        print(f"读取失败: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"{aggregates.session_count} 条记录，{len(aggregates.daily)} 天，"
+          f"总时长 {aggregates.grand_total / 3600:.1f} 小时（{elapsed:.2f}s）")
+    for remark, total in aggregates.remark_totals()[:10]:
+        print(f"  {remark:<10} {total / 3600:.1f} 小时")
+    if args.check:
+        start = time.perf_counter()
+        expected = serial_aggregates(args.files)
+        serial = time.perf_counter() - start
+        same = same_aggregates(aggregates, expected)
+        print(f"单进程读取 {serial:.2f}s，结果{'相同' if same else '不同'}")
+        return 0 if same else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
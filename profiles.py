@@ -0,0 +1,383 @@
+"""多用户：每个用户一个目录，历史记录按月分片（profiles/小明/2025-07.csv）
+
+    python profiles.py list
+    python profiles.py leaderboard --period week
+    python profiles.py split timer_history.csv 小明
+
+默认用户（DEFAULT_PROFILE）仍使用原来的 timer_history.csv（或其他后端的文件），升级后不需要迁移；
+其他用户只使用 CSV 分片。查询某天只读取那个月的分片，汇总只合并当前用户的分片。
+排行榜读取每个分片的每日汇总缓存（rollups.json），分片没有变化时不再读取。
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+from history_aggregates import HistoryAggregates
+from history_archive import archive_file_for, read_archive
+from history_store import HEADER, HISTORY_BACKENDS, BaseHistoryStore, HistoryStore, Record, open_history_store
+from intervals import IntervalTotals
+from remarks import ALIAS_FILE
+from session_journal import JOURNAL_FILE
+
+PROFILES_DIR = "profiles"
+DEFAULT_PROFILE = "默认"
+# 每个用户目录中的分片每日汇总缓存
+ROLLUP_FILE = "rollups.json"
+# 每个用户目录中的图表缓存
+CHART_CACHE_FILE = "charts.json"
+# 默认用户的历史文件不分片，它的缓存放在用户目录的上一级
+DEFAULT_ROLLUP_FILE = ".default_rollups.json"
+SHARD_NAME = re.compile(r"^(\d{4}-\d{2})\.csv$")
+
+
+def validate_profile(name):
+    """检查用户名可以作为目录名，返回去掉首尾空白后的名字；不合法时抛出 ValueError"""
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("用户名不能为空")
+    if name.startswith(".") or any(ch in name for ch in '/\\:*?"<>|'):
+        raise ValueError(f"用户名不能以 . 开头，也不能包含 / \\ : * ? \" < > |: {name}")
+    return name
+
+
+def profile_dir(profile, root=PROFILES_DIR):
+    return os.path.join(root, profile)
+
+
+def list_profiles(root=PROFILES_DIR):
+    """所有用户：默认用户在最前，其余按名字排序"""
+    names = []
+    if os.path.isdir(root):
+        names = sorted(name for name in os.listdir(root)
+                       if not name.startswith(".") and os.path.isdir(os.path.join(root, name)))
+    return [DEFAULT_PROFILE] + [name for name in names if name != DEFAULT_PROFILE]
+
+
+def profile_journal(profile, root=PROFILES_DIR):
+    """用户的计时日志：默认用户沿用 timer_journal.log，其他用户在各自的目录中"""
+    if profile == DEFAULT_PROFILE:
+        return JOURNAL_FILE
+    return os.path.join(profile_dir(profile, root), JOURNAL_FILE)
+
+
+def open_profile_store(profile=DEFAULT_PROFILE, backend="csv", history_file=None, root=PROFILES_DIR):
+    """打开用户的历史记录：默认用户按后端打开原来的文件，其他用户打开按月分片的 CSV"""
+    if profile == DEFAULT_PROFILE:
+        return open_history_store(backend, history_file)
+    return ShardedHistoryStore(profile_dir(validate_profile(profile), root))
+
+
+def month_of(date_str):
+    return date_str[:7]
+
+
+class ShardedHistoryStore(BaseHistoryStore):
+    """按月分片的 CSV 历史记录：每月一个 HistoryStore（各自有按日索引和归档文件）。
+
+    某天的查询只打开那个月的分片；完整汇总由各分片的汇总合并而成，
+    某个分片重新读取后（被外部修改）才重新合并。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # 月份 -> HistoryStore，用到时才打开
+        self.shards = {}
+        # 合并后的汇总，以及合并时各分片的汇总对象（用于判断是否需要重新合并）
+        self.aggregates = None
+        self.parts = None
+        # 追加后还没有同步到磁盘的分片
+        self.unsynced = set()
+
+    def shard_file(self, month):
+        return os.path.join(self.directory, f"{month}.csv")
+
+    def months(self):
+        """已有分片的月份，按时间顺序"""
+        months = []
+        for name in os.listdir(self.directory):
+            match = SHARD_NAME.match(name)
+            if match:
+                months.append(match.group(1))
+        return sorted(months)
+
+    def shard(self, month):
+        store = self.shards.get(month)
+        if store is None:
+            store = self.shards[month] = HistoryStore(self.shard_file(month))
+        return store
+
+    def existing_shard(self, date_str):
+        """日期所在月份的分片，还没有这个分片时返回 None（不创建文件）"""
+        month = month_of(date_str)
+        if month not in self.shards and not os.path.exists(self.shard_file(month)):
+            return None
+        return self.shard(month)
+
+    def iter_records(self):
+        for month in self.months():
+            yield from self.shard(month).iter_records()
+
+    def archived_records(self):
+        for month in self.months():
+            yield from self.shard(month).archived_records()
+
+    def refresh(self):
+        for month in self.months():
+            self.shard(month).refresh()
+
+    def get_aggregates(self):
+        """合并各分片的汇总；各分片的汇总都没有重新读取时直接返回上次合并的结果"""
+        parts = [self.shard(month).get_aggregates() for month in self.months()]
+        if (self.aggregates is None or len(parts) != len(self.parts)
+                or any(part is not previous for part, previous in zip(parts, self.parts))):
+            aggregates = HistoryAggregates(keep_sessions=False)
+            for part in parts:
+                aggregates.merge(part)
+            self.aggregates = aggregates
+            self.parts = parts
+        return self.aggregates
+
+    def build_intervals(self):
+        intervals = IntervalTotals()
+        for month in self.months():
+            shard = self.shard(month)
+            for (date, remark), (tenths, count) in read_archive(shard.archive_file).items():
+                intervals.add_rollup(date, remark, tenths / 10)
+            intervals.extend(shard.iter_records())
+        return intervals
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        """按月份分组追加到各分片，并同步更新合并后的汇总"""
+        by_month = {}
+        for record in records:
+            by_month.setdefault(month_of(record.date), []).append(record)
+        for month, group in by_month.items():
+            shard = self.shard(month)
+            before = shard.aggregates
+            shard.append_many(group)
+            self.unsynced.add(month)
+            # 分片的汇总在追加后仍是同一个对象时，合并后的汇总也按同样的记录更新；
+            # 否则（分片还没读取过或新建了分片）下次查询时重新合并
+            if self.aggregates is not None and before is not None and shard.aggregates is before:
+                for record in group:
+                    self.aggregates.add(record._replace(duration=float(f"{record.duration:.1f}")))
+
+    def alias_file(self):
+        """每个用户有自己的别名/合并表"""
+        return os.path.join(self.directory, ALIAS_FILE)
+
+    def chart_sources(self):
+        """各分片只在末尾追加；新分片出现时也只需读取它"""
+        sources = []
+        for month in self.months():
+            sources.append((self.shard_file(month), True))
+            sources.append((archive_file_for(self.shard_file(month)), False))
+        return sources
+
+    def chart_cache_file(self):
+        return os.path.join(self.directory, CHART_CACHE_FILE)
+
+    def sync(self):
+        for month in sorted(self.unsynced):
+            self.shard(month).sync()
+        self.unsynced.clear()
+
+    def day_total(self, date_str):
+        """只读取日期所在月份的分片"""
+        shard = self.existing_shard(date_str)
+        return shard.day_total(date_str) if shard is not None else 0.0
+
+    def records_for_date(self, date):
+        shard = self.existing_shard(date)
+        return shard.records_for_date(date) if shard is not None else []
+
+    def archived_totals(self, date):
+        shard = self.existing_shard(date)
+        return shard.archived_totals(date) if shard is not None else []
+
+    def preload(self):
+        for month in self.months():
+            self.shard(month).index.ensure()
+        self.get_aggregates()
+
+
+def file_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def scan_daily(history_file):
+    """读取一个历史文件（及其归档文件），返回 {日期: [总时长, 次数]}"""
+    daily = {}
+    for (date, remark), (tenths, count) in read_archive(archive_file_for(history_file)).items():
+        day = daily.setdefault(date, [0.0, 0])
+        day[0] += tenths / 10
+        day[1] += count
+    with open(history_file, 'r', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 5 or row == HEADER:
+                continue
+            day = daily.setdefault(row[0], [0.0, 0])
+            day[0] += float(row[3])
+            day[1] += 1
+    return daily
+
+
+class ShardRollups:
+    """分片的每日汇总缓存（JSON）：以分片和归档文件的 (修改时间, 大小) 作为校验，变化时才重新读取分片"""
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.changed = False
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def daily(self, history_file):
+        """分片的 {日期: [总时长, 次数]}"""
+        key = os.path.basename(history_file)
+        stat = [file_stat(history_file), file_stat(archive_file_for(history_file))]
+        entry = self.entries.get(key)
+        if entry is None or entry.get("stat") != stat:
+            entry = self.entries[key] = {"stat": stat, "daily": scan_daily(history_file)}
+            self.changed = True
+        return entry["daily"]
+
+    def save(self):
+        if not self.changed:
+            return
+        temp_file = self.cache_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(temp_file, self.cache_file)
+            self.changed = False
+        except OSError as e:
+            print(f"保存排行榜缓存失败: {e}")
+
+
+def period_range(period, today=None):
+    """排行榜的统计范围：today / week / month / all，返回 (起始日期, 结束日期)，不限时为 None"""
+    today = today or datetime.now()
+    if period == "today":
+        day = today.strftime("%Y-%m-%d")
+        return day, day
+    if period == "week":
+        return (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+    if period == "month":
+        return today.strftime("%Y-%m-01"), today.strftime("%Y-%m-%d")
+    return None, None
+
+
+def sum_daily(daily, since, until):
+    total = 0.0
+    count = 0
+    for date, (seconds, sessions) in daily.items():
+        if (since is None or date >= since) and (until is None or date <= until):
+            total += seconds
+            count += sessions
+    return total, count
+
+
+def leaderboard(since=None, until=None, root=PROFILES_DIR, backend="csv", default_file=None):
+    """各用户在日期范围内的学习时长排行 [(用户, 总时长, 次数)]，按总时长降序。
+    只读取范围内月份的分片，且分片没有变化时直接使用缓存的每日汇总；
+    默认用户按 backend 读取它的历史文件"""
+    default_file = default_file or HISTORY_BACKENDS[backend]
+    results = []
+    if os.path.exists(default_file) and backend != "csv":
+        store = open_profile_store(DEFAULT_PROFILE, backend, default_file)
+        results.append((DEFAULT_PROFILE,) + tuple(store.range_totals(since, until)[:2]))
+        if hasattr(store, "close"):
+            store.close()
+    elif os.path.exists(default_file):
+        rollups = ShardRollups(os.path.join(root, DEFAULT_ROLLUP_FILE)) if os.path.isdir(root) else None
+        daily = rollups.daily(default_file) if rollups is not None else scan_daily(default_file)
+        results.append((DEFAULT_PROFILE,) + sum_daily(daily, since, until))
+        if rollups is not None:
+            rollups.save()
+    for profile in list_profiles(root)[1:]:
+        store = ShardedHistoryStore(profile_dir(profile, root))
+        rollups = ShardRollups(os.path.join(store.directory, ROLLUP_FILE))
+        total = 0.0
+        count = 0
+        for month in store.months():
+            if (since is not None and month < month_of(since)) or (until is not None and month > month_of(until)):
+                continue
+            seconds, sessions = sum_daily(rollups.daily(store.shard_file(month)), since, until)
+            total += seconds
+            count += sessions
+        rollups.save()
+        results.append((profile, total, count))
+    return sorted(results, key=lambda row: row[1], reverse=True)
+
+
+def split_history(history_file, profile, root=PROFILES_DIR):
+    """把一个 CSV 历史文件的记录按月份复制到用户的分片中（原文件不变），返回复制的条数"""
+    store = ShardedHistoryStore(profile_dir(validate_profile(profile), root))
+    count = 0
+    batch = []
+    with open(history_file, 'r', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 5 or row == HEADER:
+                continue
+            batch.append(Record(row[0], row[1], row[2], float(row[3]), row[4]))
+            if len(batch) >= 10000:
+                store.append_many(batch)
+                count += len(batch)
+                batch = []
+    if batch:
+        store.append_many(batch)
+        count += len(batch)
+    store.sync()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多用户：列出用户、学习时长排行、把历史文件拆分到用户的按月分片")
+    parser.add_argument("--root", default=PROFILES_DIR, help="用户目录")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    commands.add_parser("list", help="列出所有用户")
+    board = commands.add_parser("leaderboard", help="学习时长排行")
+    board.add_argument("--period", choices=["today", "week", "month", "all"], default="week", help="统计范围")
+    board.add_argument("--backend", default="csv", choices=sorted(HISTORY_BACKENDS), help="默认用户的存储后端")
+    board.add_argument("--file", help="默认用户的历史记录文件（默认使用该后端的默认文件名）")
+    split = commands.add_parser("split", help="把 CSV 历史文件的记录复制到用户的按月分片")
+    split.add_argument("source", help="CSV 历史文件")
+    split.add_argument("profile", help="用户名")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for profile in list_profiles(args.root):
+            print(profile)
+    elif args.command == "leaderboard":
+        since, until = period_range(args.period)
+        for rank, (profile, total, count) in enumerate(leaderboard(since, until, args.root, args.backend, args.file), start=1):
+            print(f"{rank:>3}. {profile:<10} {total / 3600:>7.1f} 小时  {count} 次")
+    else:
+        try:
+            count = split_history(args.source, args.profile, args.root)
+        except (OSError, ValueError) as e:
+            print(f"拆分失败: {e}")
+            return 1
+        print(f"已复制 {count} 条记录到 {profile_dir(args.profile, args.root)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""任意日期范围的学习时长：按天 × 学习内容的树状数组（Fenwick 树）
+
+每天的总时长、学习次数和每个学习内容的时长各是一棵树状数组，
+[起始, 结束] 日期范围的合计是两次前缀和之差，O(log 天数)；追加一条记录也只更新 O(log 天数) 个节点。
+"""
+from datetime import date
+
+from remarks import RemarkDictionary
+
+# 第一次建立时的最小容量（天）
+MIN_CAPACITY = 64
+
+
+class FenwickTree:
+    """树状数组：单点累加和前缀和都是 O(log n)，下标从 0 开始"""
+
+    def __init__(self, size):
+        self.tree = [0.0] * (size + 1)
+
+    @classmethod
+    def from_values(cls, values):
+        """由每个位置的值 O(n) 建树"""
+        fenwick = cls(0)
+        tree = fenwick.tree = [0.0] + list(values)
+        size = len(tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, index, delta):
+        i = index + 1
+        size = len(self.tree)
+        tree = self.tree
+        while i < size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, end):
+        """[0, end) 之和"""
+        total = 0.0
+        i = min(end, len(self.tree) - 1)
+        tree = self.tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start, end):
+        """[start, end) 之和"""
+        return self.prefix(end) - self.prefix(start) if end > start else 0.0
+
+    def values(self):
+        """还原每个位置的值（扩容时使用，O(n)）"""
+        values = self.tree[1:]
+        for i in range(len(values), 0, -1):
+            parent = i + (i & -i)
+            if parent <= len(values):
+                values[parent - 1] -= values[i - 1]
+        return values
+
+
+class RangeIndex:
+    """按日期范围查询总时长、次数和各学习内容的时长。
+
+    数组下标是距起点的天数；日期超出容量时容量翻倍重建（均摊 O(1)），
+    早于起点的日期（例如导入更早的记录）向前扩容，空余的位置留在前面。
+    """
+
+    def __init__(self):
+        # 下标 0 对应的日期序数，以及出现过的最晚日期
+        self.first = None
+        self.last = None
+        self.capacity = 0
+        self.totals = FenwickTree(0)
+        self.counts = FenwickTree(0)
+        self.remarks = RemarkDictionary()
+        # 备注编号 -> FenwickTree
+        self.by_remark = []
+        # 日期字符串 -> 日期序数
+        self.ordinals = {}
+
+    def ordinal(self, date_str):
+        value = self.ordinals.get(date_str)
+        if value is None:
+            value = self.ordinals[date_str] = date.fromisoformat(date_str).toordinal()
+        return value
+
+    def resize(self, first, capacity):
+        """以 first 为起点、capacity 天的容量重建所有树状数组"""
+        shift = self.first - first if self.first is not None else 0
+
+        def rebuilt(tree):
+            values = [0.0] * capacity
+            old = tree.values()
+            values[shift:shift + len(old)] = old
+            return FenwickTree.from_values(values)
+
+        self.totals = rebuilt(self.totals)
+        self.counts = rebuilt(self.counts)
+        self.by_remark = [rebuilt(tree) for tree in self.by_remark]
+        self.first = first
+        self.capacity = capacity
+
+    def slot(self, date_str):
+        """日期对应的下标，需要时扩容"""
+        day = self.ordinal(date_str)
+        if self.first is None:
+            self.resize(day, MIN_CAPACITY)
+            self.last = day
+        elif day < self.first:
+            capacity = grown(self.capacity, self.last - day + 1)
+            self.resize(self.last - capacity + 1, capacity)
+        elif day - self.first >= self.capacity:
+            self.resize(self.first, grown(self.capacity, day - self.first + 1))
+        if day > self.last:
+            self.last = day
+        return day - self.first
+
+    def add(self, date_str, remark, duration, count=1):
+        """累加一条记录（或一行归档汇总），O(log 天数)"""
+        index = self.slot(date_str)
+        self.totals.add(index, duration)
+        self.counts.add(index, count)
+        remark_id = self.remarks.intern(remark)
+        if remark_id == len(self.by_remark):
+            self.by_remark.append(FenwickTree(self.capacity))
+        self.by_remark[remark_id].add(index, duration)
+
+    def extend(self, daily, by_date_remark):
+        """由每日汇总（HistoryAggregates.daily / by_date_remark）一次建立，O(天数 × 学习内容数)"""
+        if not daily:
+            return
+        ordinals = [self.ordinal(date_str) for date_str in daily]
+        first, last = min(ordinals), max(ordinals)
+        if self.first is not None:
+            first = min(first, self.first)
+            last = max(last, self.last)
+        self.resize(first, grown(self.capacity, last - first + 1))
+        self.last = last
+        totals = self.totals.values()
+        counts = self.counts.values()
+        by_remark = [tree.values() for tree in self.by_remark]
+        for date_str, (total, count) in daily.items():
+            index = self.ordinal(date_str) - first
+            totals[index] += total
+            counts[index] += count
+            for remark, duration in by_date_remark.get(date_str, {}).items():
+                remark_id = self.remarks.intern(remark)
+                if remark_id == len(by_remark):
+                    by_remark.append([0.0] * self.capacity)
+                by_remark[remark_id][index] += duration
+        self.totals = FenwickTree.from_values(totals)
+        self.counts = FenwickTree.from_values(counts)
+        self.by_remark = [FenwickTree.from_values(values) for values in by_remark]
+
+    def bounds(self, since, until):
+        """[since, until]（含两端，None 为不限）对应的下标范围 [start, end)"""
+        if self.first is None:
+            return 0, 0
+        start = 0 if since is None else max(0, self.ordinal(since) - self.first)
+        end = self.capacity if until is None else min(self.capacity, self.ordinal(until) - self.first + 1)
+        return start, end
+
+    def total(self, since=None, until=None):
+        """日期范围内的 (总时长, 次数)"""
+        start, end = self.bounds(since, until)
+        return self.totals.range_sum(start, end), int(round(self.counts.range_sum(start, end)))
+
+    def remark_totals(self, since=None, until=None):
+        """日期范围内各学习内容的 [(备注, 时长)]，按时长降序"""
+        start, end = self.bounds(since, until)
+        totals = []
+        for remark_id, tree in enumerate(self.by_remark):
+            duration = tree.range_sum(start, end)
+            # 前缀和相减可能留下浮点误差
+            if duration > 1e-6:
+                totals.append((self.remarks.text(remark_id), duration))
+        return sorted(totals, key=lambda x: x[1], reverse=True)
+
+
+def grown(capacity, needed):
+    """容量翻倍直到至少为 needed"""
+    capacity = max(capacity, MIN_CAPACITY)
+    while capacity < needed:
+        capacity *= 2
+    return capacity
@@ -0,0 +1,295 @@
+"""学习内容（备注）：备注字典、别名/合并表、输入时的自动补全索引
+
+    python remarks.py alias 高数时间 高数     # 以后统计时“高数时间”合并到“高数”（不改写历史记录）
+    python remarks.py unalias 高数时间
+    python remarks.py aliases
+    python remarks.py search gs               # 拼音首字母、全拼或原文的前缀都可以
+
+安装 pypinyin 后可以用拼音搜索中文备注，没有安装时只按原文前缀搜索。
+"""
+import argparse
+import json
+import os
+import sys
+from bisect import bisect_left
+from datetime import date, datetime
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 别名/合并表的文件名（与历史记录在同一目录）
+ALIAS_FILE = "remark_aliases.json"
+
+# 排序时最近一次学习的权重：每过这么多天，学习天数的权重减半
+RECENCY_HALF_LIFE = 30
+
+
+class RemarkDictionary:
+    """备注字典：每个不同的备注只保存一份字符串，用从 0 开始的紧凑编号表示"""
+
+    def __init__(self, texts=()):
+        self.ids = {}
+        self.texts = []
+        for text in texts:
+            self.intern(text)
+
+    def intern(self, text):
+        """返回备注的编号，第一次出现时分配新编号"""
+        remark_id = self.ids.get(text)
+        if remark_id is None:
+            remark_id = self.ids[text] = len(self.texts)
+            self.texts.append(text)
+        return remark_id
+
+    def text(self, remark_id):
+        return self.texts[remark_id]
+
+    def __contains__(self, text):
+        return text in self.ids
+
+    def __len__(self):
+        return len(self.texts)
+
+
+class RemarkAliases:
+    """别名/合并表（remark_aliases.json，{别名: 合并到的备注}）。
+    只在读取汇总时合并，不改写历史记录；文件被修改后下次读取时重新加载"""
+
+    def __init__(self, path):
+        self.path = path
+        # 别名 -> 最终合并到的备注（已展开 a -> b -> c 这样的链）
+        self.table = {}
+        self.file_stat = None
+
+    def refresh(self):
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat = None
+        if stat == self.file_stat:
+            return
+        self.file_stat = stat
+        self.table = {}
+        if stat is None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.table = resolve_chains(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"读取备注别名失败: {e}")
+
+    def mapping(self):
+        """最新的 {别名: 合并到的备注}"""
+        self.refresh()
+        return self.table
+
+    def canonical(self, remark):
+        return self.mapping().get(remark, remark)
+
+    def merge_totals(self, rows):
+        """按别名合并 (备注, 时长) 列表，仍按时长降序；没有别名时原样返回"""
+        table = self.mapping()
+        if not table:
+            return rows
+        totals = {}
+        for remark, duration in rows:
+            remark = table.get(remark, remark)
+            totals[remark] = totals.get(remark, 0.0) + duration
+        return sorted(totals.items(), key=lambda x: x[1], reverse=True)
+
+    def set(self, alias, target):
+        """把 alias 合并到 target；会形成循环时抛出 ValueError"""
+        alias = alias.strip()
+        target = target.strip()
+        if not alias or not target:
+            raise ValueError("备注不能为空")
+        table = self.read()
+        if resolve_chains(table).get(target, target) == alias:
+            raise ValueError(f"“{alias}”和“{target}”之间的合并会形成循环")
+        table[alias] = target
+        self.write(table)
+
+    def remove(self, alias):
+        """取消一个别名，不存在时抛出 ValueError"""
+        table = self.read()
+        if alias not in table:
+            raise ValueError(f"没有这个别名: {alias}")
+        del table[alias]
+        self.write(table)
+
+    def read(self):
+        """文件中原始的 {别名: 备注}（未展开链）"""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write(self, table):
+        """先写临时文件再替换"""
+        temp_file = self.path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(table, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_file, self.path)
+
+
+def resolve_chains(table):
+    """展开别名链（a -> b、b -> c 时 a -> c），成环的别名忽略"""
+    resolved = {}
+    for alias in table:
+        seen = {alias}
+        target = table[alias]
+        while target in table and target not in seen:
+            seen.add(target)
+            target = table[target]
+        if target not in seen:
+            resolved[alias] = target
+    return resolved
+
+
+def merge_remark_days(pairs, table):
+    """由 (日期, 备注) 对统计 [(备注, 学习天数, 最近一次的日期)]，备注先按别名合并"""
+    stats = {}
+    for date_str, remark in pairs:
+        remark = table.get(remark, remark)
+        entry = stats.get(remark)
+        if entry is None:
+            stats[remark] = [{date_str}, date_str]
+        else:
+            entry[0].add(date_str)
+            if date_str > entry[1]:
+                entry[1] = date_str
+    return [(remark, len(days), last) for remark, (days, last) in stats.items()]
+
+
+def search_keys(text):
+    """备注可以被搜索到的前缀：原文（小写），有 pypinyin 时还有全拼和拼音首字母"""
+    keys = {text.lower()}
+    if lazy_pinyin is not None:
+        syllables = [syllable.lower() for syllable in lazy_pinyin(text) if syllable.strip()]
+        if syllables:
+            keys.add("".join(syllables))
+            keys.add("".join(syllable[0] for syllable in syllables))
+    return keys
+
+
+class RemarkIndex:
+    """输入学习内容时的自动补全：按原文/拼音前缀查找历史备注，
+    按学习天数和最近一次学习的时间排序（最近常学的在前）。
+
+    所有前缀键排序后保存在一个列表中，查找是一次二分加顺序扫描匹配的区间；
+    重新统计时只为新出现的备注计算拼音。
+    """
+
+    def __init__(self, presets=()):
+        self.remarks = RemarkDictionary()
+        # 编号 -> [学习天数, 最近一次的日期序数]
+        self.stats = []
+        # 排序后的 (前缀键, 编号)
+        self.keys = []
+        for text in presets:
+            self.add(text)
+
+    def add(self, text):
+        """加入一个备注（已存在时不变），返回编号"""
+        if text in self.remarks:
+            return self.remarks.ids[text]
+        remark_id = self.remarks.intern(text)
+        self.stats.append([0, 0])
+        for key in search_keys(text):
+            self.keys.insert(bisect_left(self.keys, (key, remark_id)), (key, remark_id))
+        return remark_id
+
+    def update(self, rows):
+        """用 [(备注, 学习天数, 最近一次的日期)]（store.remark_stats() 的结果）更新排序依据"""
+        for remark, days, last in rows:
+            stat = self.stats[self.add(remark)]
+            stat[0] = days
+            stat[1] = date.fromisoformat(last).toordinal() if last else 0
+
+    def touch(self, remark, date_str):
+        """保存了一条记录：当天第一次学习这个内容时学习天数加一"""
+        stat = self.stats[self.add(remark)]
+        day = date.fromisoformat(date_str).toordinal()
+        if day != stat[1]:
+            stat[0] += 1
+            stat[1] = max(stat[1], day)
+
+    def score(self, remark_id, today):
+        days, last = self.stats[remark_id]
+        if not days:
+            return 0.0
+        return days * 0.5 ** (max(0, today - last) / RECENCY_HALF_LIFE)
+
+    def ranked(self, ids, limit, today):
+        today = today or datetime.now().date().toordinal()
+        ordered = sorted(ids, key=lambda remark_id: (-self.score(remark_id, today), remark_id))
+        return [self.remarks.text(remark_id) for remark_id in ordered[:limit]]
+
+    def search(self, prefix, limit=10, today=None):
+        """前缀匹配原文、全拼或拼音首字母的备注，按常用程度排序；没有前缀匹配时退回按原文包含匹配"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return self.top(limit, today)
+        ids = set()
+        position = bisect_left(self.keys, (prefix, -1))
+        while position < len(self.keys) and self.keys[position][0].startswith(prefix):
+            ids.add(self.keys[position][1])
+            position += 1
+        if not ids:
+            ids = {remark_id for remark_id, text in enumerate(self.remarks.texts) if prefix in text.lower()}
+        return self.ranked(ids, limit, today)
+
+    def top(self, limit=10, today=None):
+        """最常用的备注"""
+        return self.ranked(range(len(self.remarks)), limit, today)
+
+
+def main(argv=None):
+    from history_store import HISTORY_BACKENDS
+    from profiles import DEFAULT_PROFILE, open_profile_store
+
+    parser = argparse.ArgumentParser(description="学习内容的别名/合并表和搜索")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="用户")
+    parser.add_argument("--backend", default="csv", choices=sorted(HISTORY_BACKENDS), help="存储后端")
+    parser.add_argument("--file", help="历史记录文件（默认使用该后端的默认文件名）")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    alias = commands.add_parser("alias", help="把一个备注合并到另一个（只影响统计，不改写历史记录）")
+    alias.add_argument("alias", help="被合并的备注，如：高数时间")
+    alias.add_argument("target", help="合并到的备注，如：高数")
+    unalias = commands.add_parser("unalias", help="取消合并")
+    unalias.add_argument("alias")
+    commands.add_parser("aliases", help="列出所有别名")
+    search = commands.add_parser("search", help="按原文或拼音前缀搜索历史备注")
+    search.add_argument("prefix")
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    try:
+        store = open_profile_store(args.profile, args.backend, args.file)
+        aliases = store.remark_aliases()
+        if args.command == "alias":
+            aliases.set(args.alias, args.target)
+            print(f"已合并: {args.alias} -> {args.target}")
+        elif args.command == "unalias":
+            aliases.remove(args.alias)
+            print(f"已取消: {args.alias}")
+        elif args.command == "aliases":
+            for name, target in sorted(aliases.mapping().items()):
+                print(f"{name} -> {target}")
+        else:
+            index = RemarkIndex()
+            index.update(store.remark_stats())
+            for text in index.search(args.prefix, args.limit):
+                print(text)
+    except (OSError, ValueError) as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
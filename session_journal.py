@@ -0,0 +1,150 @@
+import json
+import os
+import time
+
+from history_store import Record
+
+# 正在进行的计时和尚未写入历史文件的记录保存在这个日志中，界面、命令行和守护进程共用
+JOURNAL_FILE = "timer_journal.log"
+
+
+class SessionJournal:
+    """正在进行的计时的日志（每行一个 JSON，只追加）：
+
+    - start       开始计时（立即 fsync）
+    - checkpoint  计时中每隔 checkpoint_interval 秒记录一次当前时间，fsync 每隔 fsync_interval 秒才做一次
+    - detach      进程正常退出但计时还在继续（命令行开始计时后退出，或关闭窗口时仍在计时）
+    - end         暂停后的记录（立即 fsync），写入历史文件之前都保存在这里
+    记录成批写入并同步到历史文件后 commit() 清空日志。
+
+    程序崩溃或断电后，下次启动时 recover() 把未提交的记录和以最后一次 checkpoint 结束的计时交回，
+    最多丢失 checkpoint_interval + fsync_interval 秒。
+    """
+
+    def __init__(self, path=JOURNAL_FILE, checkpoint_interval=30, fsync_interval=120):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.fsync_interval = fsync_interval
+        self.file = None
+        self.last_checkpoint = 0.0
+        self.last_fsync = 0.0
+        # 已写入但还没有 fsync 的行数
+        self.unsynced = 0
+        # I/O 计数，见 TimerService.stats()
+        self.stats = {
+            "checkpoints": 0,
+            "fsyncs": 0,
+            "bytes_written": 0,
+            "commits": 0,
+            "recovered_sessions": 0,
+            "recovered_records": 0,
+        }
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        return self.file
+
+    def write(self, entry, sync=False):
+        data = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+        f = self.open()
+        f.write(data)
+        f.flush()
+        self.stats["bytes_written"] += len(data)
+        self.unsynced += 1
+        if sync:
+            self.sync()
+
+    def sync(self):
+        """把已写入的行刷到磁盘（没有新写入时不做）"""
+        if self.file is None or not self.unsynced:
+            return
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_fsync = time.monotonic()
+        self.stats["fsyncs"] += 1
+
+    def start(self, remark, start_time):
+        self.write({"op": "start", "remark": remark, "start_time": start_time}, sync=True)
+        self.last_checkpoint = time.monotonic()
+
+    def checkpoint(self, now=None, force=False):
+        """计时中定期调用：到了间隔才写 checkpoint，到了 fsync 间隔才同步"""
+        if not force and time.monotonic() - self.last_checkpoint < self.checkpoint_interval:
+            return
+        self.write({"op": "checkpoint", "time": time.time() if now is None else now})
+        self.last_checkpoint = time.monotonic()
+        self.stats["checkpoints"] += 1
+        if force or time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.sync()
+
+    def detach(self):
+        """进程退出但计时继续：下次启动时恢复为仍在计时"""
+        self.checkpoint(force=True)
+        self.write({"op": "detach"}, sync=True)
+
+    def end(self, record):
+        self.write({"op": "end", "record": list(record)}, sync=True)
+
+    def end_many(self, records):
+        """多条记录（批量导入）都写入后只 fsync 一次"""
+        for record in records:
+            self.write({"op": "end", "record": list(record)})
+        self.sync()
+
+    def commit(self, running_session=None):
+        """记录都已写入历史文件：清空日志，仍在计时时重新写入 start"""
+        self.close()
+        with open(self.path, 'wb'):
+            pass
+        self.stats["commits"] += 1
+        if running_session is not None:
+            self.start(*running_session)
+            # 保留计时已经进行到的时间，清空后马上崩溃也不会丢失
+            self.checkpoint(force=True)
+
+    def recover(self):
+        """读取上次留下的日志，返回 (未写入的记录列表, 正在进行的计时)。
+
+        正在进行的计时为 None，或 {"remark", "start_time", "checkpoint", "detached"}：
+        detached 为 True 时表示计时还在继续，否则是崩溃时中断的计时，应以 checkpoint 作为结束时间。
+        """
+        records = []
+        session = None
+        try:
+            with open(self.path, 'rb') as f:
+                lines = f.read().split(b"\n")
+        except OSError:
+            return records, session
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 崩溃时写了一半的最后一行
+                continue
+            op = entry.get("op")
+            if op == "start":
+                session = {
+                    "remark": entry["remark"],
+                    "start_time": entry["start_time"],
+                    "checkpoint": entry["start_time"],
+                    "detached": False,
+                }
+            elif op == "checkpoint" and session is not None:
+                session["checkpoint"] = entry["time"]
+                session["detached"] = False
+            elif op == "detach" and session is not None:
+                session["detached"] = True
+            elif op == "end":
+                records.append(Record(*entry["record"]))
+                session = None
+        self.stats["recovered_records"] += len(records)
+        if session is not None and not session["detached"]:
+            self.stats["recovered_sessions"] += 1
+        return records, session
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,250 @@
+import argparse
+import csv
+import sqlite3
+
+from history_aggregates import HistoryAggregates
+from history_store import BaseHistoryStore, Record
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    duration REAL NOT NULL,
+    remark TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions (date);
+CREATE INDEX IF NOT EXISTS idx_sessions_remark ON sessions (remark);
+
+-- 预先汇总的每日总时长
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    date TEXT PRIMARY KEY,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+
+-- 预先汇总的每日每个备注的总时长
+CREATE TABLE IF NOT EXISTS daily_remark_rollup (
+    date TEXT NOT NULL,
+    remark TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (date, remark)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_remark_rollup_remark ON daily_remark_rollup (remark);
+"""
+
+
+class SqliteHistoryStore(BaseHistoryStore):
+    """SQLite 历史记录：按日期和备注建立索引，并维护每日汇总表，查询都走索引"""
+
+    def __init__(self, history_file):
+        self.history_file = history_file
+        self.conn = sqlite3.connect(history_file)
+        self.conn.executescript(SCHEMA)
+        # 日期 -> 当天总学习时间（秒），供计时刷新时直接查询
+        self.daily_totals = {}
+        # 完整汇总（去重统计需要逐条记录），第一次需要时才构建
+        self.aggregates = None
+        # 数据库被其他连接修改时 data_version 会变化
+        self.data_version = None
+        self.load()
+
+    def current_data_version(self):
+        """返回数据库当前的 data_version"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self):
+        """从每日汇总表读取每日总时长（每天一行，数据量很小）"""
+        rows = self.conn.execute("SELECT date, total FROM daily_rollup").fetchall()
+        self.daily_totals = dict(rows)
+        self.aggregates = None
+        self.data_version = self.current_data_version()
+
+    def refresh(self):
+        """数据库被其他连接修改时重新读取每日总时长"""
+        if self.current_data_version() != self.data_version:
+            self.load()
+
+    def append(self, record):
+        """在同一个事务中写入记录并更新汇总表"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """多条记录在同一个事务中写入（只提交一次）"""
+        with self.conn:
+            saved = [(record.date, self.insert(record)) for record in records]
+        # 事务提交后再更新内存中的每日总时长
+        for date, duration in saved:
+            self.daily_totals[date] = self.daily_totals.get(date, 0.0) + duration
+        if self.aggregates is not None:
+            for record, (_, duration) in zip(records, saved):
+                self.aggregates.add(record._replace(duration=duration))
+
+    def sync(self):
+        """事务提交时 SQLite 已经同步到磁盘"""
+
+    def insert(self, record):
+        """写入一条记录并更新汇总表（在调用者的事务中），返回保存的时长"""
+        duration = float(f"{record.duration:.1f}")
+        self.conn.execute(
+            "INSERT INTO sessions (date, start, end, duration, remark) VALUES (?, ?, ?, ?, ?)",
+            (record.date, record.start, record.end, duration, record.remark)
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO daily_rollup (date, total, count) VALUES (?, 0, 0)",
+            (record.date,)
+        )
+        self.conn.execute(
+            "UPDATE daily_rollup SET total = total + ?, count = count + 1 WHERE date = ?",
+            (duration, record.date)
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO daily_remark_rollup (date, remark, total, count) VALUES (?, ?, 0, 0)",
+            (record.date, record.remark)
+        )
+        self.conn.execute(
+            "UPDATE daily_remark_rollup SET total = total + ?, count = count + 1 "
+            "WHERE date = ? AND remark = ?",
+            (duration, record.date, record.remark)
+        )
+        return duration
+
+    def rebuild_rollups(self):
+        """根据 sessions 表重新生成汇总表（批量导入后使用）"""
+        with self.conn:
+            self.conn.execute("DELETE FROM daily_rollup")
+            self.conn.execute("DELETE FROM daily_remark_rollup")
+            self.conn.execute(
+                "INSERT INTO daily_rollup (date, total, count) "
+                "SELECT date, SUM(duration), COUNT(*) FROM sessions GROUP BY date"
+            )
+            self.conn.execute(
+                "INSERT INTO daily_remark_rollup (date, remark, total, count) "
+                "SELECT date, remark, SUM(duration), COUNT(*) FROM sessions GROUP BY date, remark"
+            )
+        self.load()
+
+    def iter_records(self):
+        """按写入顺序逐条返回记录"""
+        cursor = self.conn.execute("SELECT date, start, end, duration, remark FROM sessions ORDER BY id")
+        for row in cursor:
+            yield Record(*row)
+
+    def get_aggregates(self):
+        """构建完整汇总（只有去重统计需要，窗口的其他查询都走汇总表），数据库未变化时复用"""
+        self.refresh()
+        if self.aggregates is None:
+            aggregates = HistoryAggregates(keep_sessions=False)
+            for record in self.iter_records():
+                aggregates.add(record)
+            self.aggregates = aggregates
+        return self.aggregates
+
+    def preload(self):
+        """查询都走索引和汇总表，不需要预先构建汇总"""
+
+    def day_total(self, date_str):
+        """返回指定日期的总学习时间（秒），只查内存；其他连接写入过时先重新读取每日总时长"""
+        self.refresh()
+        return self.daily_totals.get(date_str, 0.0)
+
+    def daily_rows(self):
+        """每日汇总直接读取汇总表"""
+        return self.conn.execute(
+            "SELECT date, total, count FROM daily_rollup ORDER BY date DESC"
+        ).fetchall()
+
+    def remark_totals(self, date=None):
+        """按备注汇总：指定日期时是主键查询，否则在每日汇总表上分组；备注按别名合并"""
+        if date is None:
+            cursor = self.conn.execute(
+                "SELECT remark, SUM(total) AS total FROM daily_remark_rollup "
+                "GROUP BY remark ORDER BY total DESC"
+            )
+        else:
+            cursor = self.conn.execute(
+                "SELECT remark, total FROM daily_remark_rollup WHERE date = ? ORDER BY total DESC",
+                (date,)
+            )
+        return self.remark_aliases().merge_totals(cursor.fetchall())
+
+    def range_totals(self, since=None, until=None):
+        """日期范围的合计直接在每日汇总表上按日期范围查询（日期是主键的第一列）"""
+        bounds = (since or "", until or "9999-12-31")
+        total, count = self.conn.execute(
+            "SELECT COALESCE(SUM(total), 0), COALESCE(SUM(count), 0) FROM daily_rollup "
+            "WHERE date BETWEEN ? AND ?", bounds
+        ).fetchone()
+        remarks = self.conn.execute(
+            "SELECT remark, SUM(total) AS total FROM daily_remark_rollup "
+            "WHERE date BETWEEN ? AND ? GROUP BY remark ORDER BY total DESC", bounds
+        ).fetchall()
+        return total, count, self.remark_aliases().merge_totals(remarks)
+
+    def chart_rows(self):
+        """图表缓存直接由每日汇总表生成"""
+        return self.conn.execute("SELECT date, remark, total FROM daily_remark_rollup")
+
+    def remark_days(self):
+        """(日期, 备注) 对直接来自每日汇总表"""
+        return self.conn.execute("SELECT date, remark FROM daily_remark_rollup")
+
+    def records_for_date(self, date):
+        """通过日期索引读取当天记录"""
+        cursor = self.conn.execute(
+            "SELECT date, start, end, duration, remark FROM sessions WHERE date = ? ORDER BY id",
+            (date,)
+        )
+        return [Record(*row) for row in cursor]
+
+    def grand_total(self):
+        """所有记录的总时长"""
+        return self.conn.execute("SELECT COALESCE(SUM(total), 0) FROM daily_rollup").fetchone()[0]
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+
+def migrate_csv(csv_file, db_file):
+    """把 CSV 历史记录一次性迁移到 SQLite 数据库，返回迁移条数"""
+    store = SqliteHistoryStore(db_file)
+    try:
+        if store.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]:
+            raise ValueError(f"{db_file} 中已有记录，不能重复迁移")
+
+        def rows():
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                next(reader, None)  # 跳过标题行
+                for row in reader:
+                    if len(row) >= 5:
+                        yield (row[0], row[1], row[2], float(row[3]), row[4])
+
+        with store.conn:
+            cursor = store.conn.executemany(
+                "INSERT INTO sessions (date, start, end, duration, remark) VALUES (?, ?, ?, ?, ?)",
+                rows()
+            )
+        store.rebuild_rollups()
+        return cursor.rowcount
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把 CSV 历史记录迁移到 SQLite 数据库")
+    parser.add_argument("source", help="CSV 历史记录文件")
+    parser.add_argument("target", help="SQLite 数据库文件")
+    args = parser.parse_args()
+    try:
+        count = migrate_csv(args.source, args.target)
+    except ValueError as e:
+        parser.exit(1, f"迁移失败: {e}\n")
+    print(f"已迁移 {count} 条记录")
+
+
+if __name__ == "__main__":
+    main()
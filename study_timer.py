@@ -1,16 +1,128 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import time
-import csv
+from tkinter import ttk, messagebox, filedialog
+import multiprocessing
 import os
-from datetime import datetime
+import queue
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from chart_rollups import bucket_days
+from history_store import HISTORY_BACKENDS
+from history_worker import HistoryWorker
+from instrumentation import metrics, profile_from_environment, timed
+from profiles import (DEFAULT_PROFILE, leaderboard, list_profiles, open_profile_store, period_range,
+                      profile_dir, profile_journal, validate_profile)
+from remarks import RemarkIndex
+from timer_client import ensure_daemon
+from timer_core import TimerCore, TimerService, format_clock, format_duration
+from virtual_tree import RowSource, VirtualTreeview
+
+
+# cProfile 采样结果（可用 python -m pstats study_timer.prof 或 snakeviz 查看）
+PROFILE_FILE = "study_timer.prof"
+
+# 备注输入框的占位文字
+REMARK_PLACEHOLDER = "例如：高数、英语等"
+# 输入备注时下拉列表中最多显示的候选数
+REMARK_SUGGESTIONS = 10
+# 这些按键不改变输入内容，不重新搜索
+NAVIGATION_KEYS = {"Up", "Down", "Left", "Right", "Return", "Escape", "Tab", "Home", "End"}
+
+# 窗口最小化时本进程中的计时服务多久 tick 一次（毫秒）
+MINIMIZED_TICK_MS = 5000
+
+# 排行榜的统计范围
+LEADERBOARD_PERIODS = {"今天": "today", "本周": "week", "本月": "month", "全部": "all"}
+# 每日汇总窗口中日期范围的快捷选项
+RANGE_PRESETS = ["最近7天", "最近30天", "本周", "本月", "全部"]
+# 日期范围合计中最多列出的学习内容数
+RANGE_REMARKS = 6
+
+# 图表窗口：初始范围、最细粒度（自动为按天，放不下时逐级变粗）和显示方式
+CHART_RANGES = ["最近30天", "最近90天", "最近365天", "全部"]
+CHART_LEVELS = {"自动": "day", "按周": "week", "按月": "month"}
+CHART_MODES = ["总时长", "按内容堆叠"]
+LEVEL_NAMES = {"day": "按天", "week": "按周", "month": "按月"}
+# 堆叠图中单独显示的学习内容数，其余合并为“其他”
+CHART_REMARKS = 6
+CHART_COLORS = ["#3498db", "#e67e22", "#2ecc71", "#9b59b6", "#e74c3c", "#1abc9c", "#95a5a6"]
+# 每个桶至少占多少像素（决定请求的最多桶数）
+CHART_PIXELS_PER_POINT = 3
+# 缩放/拖动停下多久后再请求数据（毫秒）
+CHART_DEBOUNCE_MS = 150
+# 缩放到最小时显示的天数
+CHART_MIN_DAYS = 7
+
+
+def preset_range(name, today=None):
+    """快捷选项对应的 (起始日期, 结束日期)，不限时为空字符串"""
+    today = today or datetime.now()
+    if name.startswith("最近"):
+        days = int(name[2:-1])
+        return (today - timedelta(days=days - 1)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+    since, until = period_range({"本周": "week", "本月": "month"}.get(name, "all"), today)
+    return since or "", until or ""
+
+
+def parse_date(text):
+    """空字符串为不限（None）；格式不对时抛出 ValueError"""
+    text = text.strip()
+    if not text:
+        return None
+    return datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def chart_layers(buckets, limit=CHART_REMARKS):
+    """堆叠图的各层：按总时长取前 limit 个学习内容，其余合并为“其他”。
+    返回 (层名, 每个桶各层的秒数)"""
+    totals = {}
+    for _, remarks in buckets:
+        for remark, duration in remarks.items():
+            totals[remark] = totals.get(remark, 0.0) + duration
+    names = sorted(totals, key=totals.get, reverse=True)
+    top = names[:limit]
+    has_other = len(names) > limit
+    rows = []
+    for _, remarks in buckets:
+        row = [remarks.get(remark, 0.0) for remark in top]
+        if has_other:
+            row.append(sum(duration for remark, duration in remarks.items() if remark not in top))
+        rows.append(row)
+    return top + (["其他"] if has_other else []), rows
+
+
+def zoom_range(since, until, factor, anchor, first, last):
+    """以 anchor（0~1，在当前范围中的位置）为中心把 [since, until] 缩放 factor 倍，
+    不超出 [first, last]（与当前范围的并集）"""
+    start = date.fromisoformat(since).toordinal()
+    end = date.fromisoformat(until).toordinal()
+    # 当前范围超出记录的日期范围时（例如最近 30 天都没有记录）也能缩放
+    low = min(date.fromisoformat(first).toordinal(), start)
+    high = max(date.fromisoformat(last).toordinal(), end)
+    days = min(max(CHART_MIN_DAYS, round((end - start + 1) * factor)), high - low + 1)
+    start = round(start + (end - start + 1) * anchor - days * anchor)
+    start = min(max(start, low), max(low, high - days + 1))
+    return date.fromordinal(start).isoformat(), date.fromordinal(start + days - 1).isoformat()
+
+
+def pan_range(since, until, days, first, last):
+    """把 [since, until] 平移 days 天，不超出 [first, last]（与当前范围的并集）"""
+    start = date.fromisoformat(since).toordinal()
+    end = date.fromisoformat(until).toordinal()
+    low = min(date.fromisoformat(first).toordinal(), start)
+    high = max(date.fromisoformat(last).toordinal(), end)
+    shift = min(max(days, low - start), high - end)
+    return date.fromordinal(start + shift).isoformat(), date.fromordinal(end + shift).isoformat()
 
 
 class StudyTimer:
-    def __init__(self, root):
+    def __init__(self, root, backend="csv", use_daemon=True, profile=DEFAULT_PROFILE):
         self.root = root
-        self.root.title("学习计时器")
-        self.root.geometry("500x400")
+        # 当前用户：每个用户有自己的历史记录、计时日志和守护进程
+        self.profile = validate_profile(profile)
+        self.root.title(self.window_title())
+        self.root.geometry("500x430")
         self.root.resizable(False, False)
         # 添加窗口状态变量
         self.minimized = False
@@ -22,49 +134,171 @@ class StudyTimer:
             "英语", "政治",
             "结构", "计组", "计网", "系统"
         ]
-        # 初始化计时器变量
-        self.running = False
-        self.start_time = 0
-        self.elapsed_time = 0
-        self.history_file = "timer_history.csv"
-        # 创建历史文件（如果不存在）
-        self.create_history_file()
-        # +++ 修正：启动时加载当天已有的总学习时间 +++
-        self.elapsed_time = self.load_today_total_time_value()
-        # +++ 结束修正 +++
+        # 历史备注的自动补全索引（原文/拼音前缀，按常用程度排序），历史记录加载后补充
+        self.remark_index = RemarkIndex(self.remark_options)
+        # 计时和写入都由计时服务负责（默认是 timer_daemon.py 守护进程，多个窗口共用同一个计时），
+        # 这里的 TimerCore 只是服务状态的本地副本，用于显示
+        self.core = TimerCore()
+        # 存储后端："csv"（默认，timer_history.csv）、"binary"（timer_history.bin）或 "sqlite"（timer_history.db）
+        self.history_backend = backend
+        self.history_file = HISTORY_BACKENDS[self.history_backend]
+        self.use_daemon = use_daemon
+        # 守护进程推送的状态（订阅线程放入，主线程在 <<TimerStatus>> 事件中取出）
+        self.status_events = queue.Queue()
+        # 计时服务是否在本进程中（需要界面定期调用 service.tick()，守护进程会自己执行）
+        self.local_service = False
+        # 下一次刷新显示的 after 任务；暂停时为 None，不再定时唤醒
+        self.display_job = None
+        # 当前显示的文字，只有变化时才更新标签
+        self.shown_text = None
         # 创建UI (此时 remark_options 已经存在)
         self.create_widgets()
-        # 定期更新计时器
-        self.update_timer()
+        # 与计时服务的通信都交给后台线程（包括连接/启动守护进程和读取历史文件），界面不会被 I/O 卡住
+        self.worker = HistoryWorker(self.root, self.open_service)
+        # +++ 修正：启动时加载当天已有的总学习时间 +++
+        self.request_today_total()
+        # +++ 结束修正 +++
+        # 关闭窗口前先写完未保存的记录
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # 推送的状态由订阅线程通过虚拟事件交给主线程；窗口从最小化恢复时重新开始刷新显示
+        self.root.bind("<<TimerStatus>>", lambda event: self.drain_status_events())
+        self.root.bind("<Map>", lambda event: event.widget is self.root and self.update_timer())
+        # 隐藏的诊断窗口（运行时统计和 cProfile）
+        self.root.bind("<Control-Shift-D>", lambda event: self.show_diagnostics())
+
+    def window_title(self):
+        if self.profile == DEFAULT_PROFILE:
+            return "学习计时器"
+        return f"学习计时器 - {self.profile}"
+
+    def open_service(self):
+        """后台线程：连接当前用户的计时服务，没有时启动守护进程；启动失败则在本进程中直接读写历史文件"""
+        profile = self.profile
+        # 推送的状态放入打开服务时的队列，切换用户后旧连接推送的状态不会显示到新用户上
+        events = self.status_events
+        if self.use_daemon:
+            try:
+                service = ensure_daemon(self.history_backend, self.history_file, profile=profile)
+                service.subscribe(lambda status: self.post_status(status, events))
+                return service
+            except (OSError, ValueError) as e:
+                print(f"连接计时服务失败，改为直接读写历史文件: {e}")
+        self.local_service = True
+        store = open_profile_store(profile, self.history_backend, self.history_file)
+        return TimerService(store, profile_journal(profile))
+
+    def post_status(self, status, events=None):
+        """订阅线程：放入推送的状态并唤醒主线程（event_generate 可以在其他线程中调用）"""
+        (events or self.status_events).put(status)
+        try:
+            self.root.event_generate("<<TimerStatus>>", when="tail")
+        except (tk.TclError, RuntimeError):
+            # 窗口已经关闭
+            pass
 
-    def create_history_file(self):
-        """创建历史记录文件（如果不存在）"""
-        if not os.path.exists(self.history_file):
-            with open(self.history_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(["日期", "开始时间", "结束时间", "持续时间(秒)", "备注"])
+    @property
+    def running(self):
+        """是否正在计时"""
+        return self.core.running
 
+    @timed("ui.load_today_total_time_value")
     def load_today_total_time_value(self):
-        """加载并返回今天已有的总学习时间（秒），不修改实例变量"""
-        if not os.path.exists(self.history_file):
-            return 0.0
-        today = datetime.now().strftime("%Y-%m-%d")
-        total_seconds = 0.0
+        """返回今天已有的总学习时间（秒），直接读取内存中的值，不访问磁盘"""
+        return self.core.today_base
+
+    def request_today_total(self):
+        """在后台线程中读取计时服务的状态（包括今天已有的总学习时间），完成后更新计时核心"""
+        self.status_var.set("正在加载历史记录...")
+
+        def loaded(status):
+            self.apply_status(status)
+            recovered = status.get("recovered")
+            if recovered:
+                self.status_var.set(f"已恢复上次中断的计时: {recovered.remark} ({recovered.duration:.1f}秒)")
+            elif self.running:
+                self.status_var.set(f"计时中: {self.core.remark}")
+            else:
+                self.status_var.set("就绪")
+
+        def failed(e):
+            self.status_var.set(f"加载历史记录失败: {e}")
+
+        # 计时服务只从文件末尾读取今天的记录，不等待完整读取历史文件
+        self.worker.submit(lambda service: service.status(), loaded, failed)
+        # 之后在后台预先构建完整汇总，第一次打开历史记录时不用再等待
+        self.worker.submit(lambda service: service.store.preload())
+        # 汇总构建后统计各备注的学习天数，用于自动补全的排序
+        self.worker.submit(lambda service: service.store.remark_stats(), self.load_remark_stats)
+
+    def load_remark_stats(self, rows):
+        self.remark_index.update(rows)
+        self.refresh_remark_suggestions()
+
+    def refresh_remark_suggestions(self, event=None):
+        """按输入框中的文字更新下拉列表：原文或拼音前缀匹配的历史备注，常用的在前"""
+        if event is not None and event.keysym in NAVIGATION_KEYS:
+            return
+        if str(self.remark_combo.cget("state")) == "disabled":
+            return
+        text = self.remark_combo.get()
+        if text == REMARK_PLACEHOLDER:
+            text = ""
+        with metrics.timer("ui.remark_search"):
+            suggestions = self.remark_index.search(text, REMARK_SUGGESTIONS)
+        self.remark_combo.config(values=suggestions)
+
+    def apply_status(self, status):
+        """按计时服务的状态更新显示（其他窗口或命令行开始/暂停时也会推送过来）"""
+        self.core.apply_status(status)
+        if self.running:
+            self.start_button.config(text="暂停", bg="#e74c3c")
+            self.remark_combo.config(state="normal")
+            self.remark_combo.set(self.core.remark)
+            self.remark_combo.config(state="disabled")
+        else:
+            self.start_button.config(text="开始", bg="#27ae60")
+            self.remark_combo.config(state="normal")
+            self.show_elapsed(self.load_today_total_time_value())
+        # 开始计时后按整秒刷新显示，暂停后停止
+        self.update_timer()
+
+    def switch_profile(self, name):
+        """切换到另一个用户（不存在时新建）：断开当前用户的计时服务，连接新用户的"""
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                header = next(reader, None)
-                if header is None:
-                    return 0.0
-                for row in reader:
-                    if len(row) >= 5:
-                        date_str = row[0]
-                        duration_str = row[3]
-                        if date_str == today:
-                            total_seconds += float(duration_str)
-        except Exception as e:
-            print(f"读取今日学习时间失败: {e}")
-        return total_seconds
+            name = validate_profile(name)
+        except ValueError as e:
+            messagebox.showwarning("用户名", str(e))
+            self.profile_combo.set(self.profile)
+            return
+        if name == self.profile:
+            return
+        if self.running:
+            messagebox.showwarning("切换用户", "请先暂停当前的计时")
+            self.profile_combo.set(self.profile)
+            return
+        if name != DEFAULT_PROFILE:
+            os.makedirs(profile_dir(name), exist_ok=True)
+        # 先让旧用户的计时服务写完缓冲中的记录再断开
+        self.worker.submit(lambda service: service.close())
+        self.worker.stop()
+        self.profile = name
+        self.root.title(self.window_title())
+        self.profile_combo.set(name)
+        self.status_events = queue.Queue()
+        self.core = TimerCore()
+        self.local_service = False
+        self.remark_index = RemarkIndex(self.remark_options)
+        self.show_elapsed(0)
+        self.worker = HistoryWorker(self.root, self.open_service)
+        self.request_today_total()
+
+    def on_close(self):
+        """关闭窗口：等待后台线程处理完已提交的请求后断开计时服务"""
+        if metrics.profiling:
+            metrics.stop_profile(PROFILE_FILE)
+        self.worker.submit(lambda service: service.close())
+        self.worker.stop()
+        self.root.destroy()
 
     def create_widgets(self):
         """创建UI组件"""
@@ -72,7 +306,8 @@ class StudyTimer:
         timer_frame = tk.Frame(self.root, pady=10)
         timer_frame.pack(fill="x")
 
-        self.time_var = tk.StringVar(value="00:00:00")
+        # 今天的总时长在后台加载完成前先显示占位符
+        self.time_var = tk.StringVar(value="--:--:--")
         time_label = tk.Label(
             timer_frame,
             textvariable=self.time_var,
@@ -94,7 +329,31 @@ class StudyTimer:
             state="normal"  # 允许编辑
         )
         self.remark_combo.pack(side="left", padx=10, fill="x", expand=True)
-        self.remark_combo.insert(0, "例如：高数、英语等")
+        self.remark_combo.insert(0, REMARK_PLACEHOLDER)
+        # 输入时按前缀（支持拼音）从历史备注中补全
+        self.remark_combo.bind("<KeyRelease>", self.refresh_remark_suggestions)
+
+        # 用户区域：切换用户（输入新名字即新建）和查看排行榜
+        self.profile_frame = profile_frame = tk.Frame(self.root, padx=20)
+        profile_frame.pack(fill="x")
+        tk.Label(profile_frame, text="用户:", font=("Helvetica", 10)).pack(side="left")
+        self.profile_combo = ttk.Combobox(
+            profile_frame,
+            values=list_profiles(),
+            font=("Helvetica", 10),
+            width=16,
+            postcommand=lambda: self.profile_combo.config(values=list_profiles())
+        )
+        self.profile_combo.set(self.profile)
+        self.profile_combo.pack(side="left", padx=10)
+        self.profile_combo.bind("<<ComboboxSelected>>", lambda event: self.switch_profile(self.profile_combo.get()))
+        self.profile_combo.bind("<Return>", lambda event: self.switch_profile(self.profile_combo.get()))
+        tk.Button(
+            profile_frame,
+            text="排行榜",
+            font=("Helvetica", 10),
+            command=self.show_leaderboard
+        ).pack(side="left")
 
         # 按钮区域
         button_frame = tk.Frame(self.root, padx=20, pady=10)
@@ -193,9 +452,10 @@ class StudyTimer:
         """切换窗口最小化状态"""
         if self.minimized:
             # 恢复正常窗口
-            self.root.geometry("500x400")
+            self.root.geometry("500x430")
             self.minimize_button.config(text="最小化")
             # 重新添加隐藏的组件
+            self.profile_frame.pack(fill="x", before=self.start_button.master)
             self.history_button.pack(side="right", padx=5)
             self.status_label.pack(fill="x", pady=(0, 10))
             self.minimized = False
@@ -206,6 +466,7 @@ class StudyTimer:
             self.root.geometry(f"500x{int(min_height)}")
             self.minimize_button.config(text="恢复")
             # 隐藏不需要的组件
+            self.profile_frame.pack_forget()
             self.history_button.pack_forget()
             self.status_label.pack_forget()
             self.minimized = True
@@ -221,129 +482,222 @@ class StudyTimer:
         if not self.running:
             # 检查备注是否为空
             remark = self.remark_combo.get().strip()
-            if not remark or remark == "例如：高数、英语等":
+            if not remark or remark == REMARK_PLACEHOLDER:
                 messagebox.showwarning("输入提示", "请选择或输入学习内容（如：高数）")
                 return
-            # 开始计时
-            self.running = True
-            self.start_time = time.time()
-            self.start_button.config(text="暂停", bg="#e74c3c")
-            self.status_var.set(f"计时中: {remark}")
-            self.remark_combo.config(state="disabled")
+            # 开始计时（由计时服务记录开始时间）
+            def started(status):
+                self.apply_status(status)
+                self.status_var.set(f"计时中: {remark}")
+
+            def failed(e):
+                self.status_var.set(f"开始计时失败: {e}")
+
+            self.worker.submit(lambda service: service.start(remark), started, failed)
         else:
-            # 暂停计时
-            self.running = False
-            self.start_button.config(text="开始", bg="#27ae60")
-            self.status_var.set("计时已暂停")
-            self.remark_combo.config(state="normal")
-            # 保存本次计时记录
+            # 暂停计时并保存本次计时记录
             self.save_record()
 
+    @timed("ui.save_record")
     def save_record(self):
-        """保存计时记录到历史文件"""
-        remark = self.remark_combo.get().strip()
-        end_time = time.time()
-        duration = end_time - self.start_time
-        start_str = time.strftime("%H:%M:%S", time.localtime(self.start_time))
-        end_str = time.strftime("%H:%M:%S", time.localtime(end_time))
-        date_str = time.strftime("%Y-%m-%d", time.localtime(self.start_time))
-        with open(self.history_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                date_str,
-                start_str,
-                end_str,
-                f"{duration:.1f}",
-                remark
-            ])
-        # 更新状态
-        self.status_var.set(f"已保存: {remark} ({duration:.1f}秒)")
+        """暂停计时，由计时服务把本次记录写入历史文件"""
+        self.status_var.set(f"正在保存: {self.core.remark}...")
+        requested = time.perf_counter()
+
+        def saved(result):
+            # 从点击暂停到记录写入（进入计时服务的日志）的延迟
+            metrics.observe("ui.save_record.latency", time.perf_counter() - requested)
+            record = result["record"]
+            # 状态中已包含写入后今天的总时长
+            self.apply_status(result["status"])
+            # 更新状态（已经开始下一次计时时不覆盖状态）
+            if not self.running:
+                self.status_var.set(f"已保存: {record.remark} ({record.duration:.1f}秒)")
+            self.remark_index.touch(record.remark, record.date)
+            # 记录在计时服务的写入缓冲中，稍后成批写入历史文件
+            self.root.after(1000, self.flush_pending)
 
+        def failed(e):
+            self.status_var.set("保存失败")
+            messagebox.showerror("错误", f"保存记录失败: {str(e)}")
+
+        self.worker.submit(lambda service: service.pause(), saved, failed)
+
+    def drain_status_events(self):
+        """主线程：应用其他窗口或命令行开始/暂停后推送过来的状态"""
+        while True:
+            try:
+                status = self.status_events.get_nowait()
+            except queue.Empty:
+                break
+            if status is None:
+                self.status_var.set("计时服务已断开")
+            else:
+                self.apply_status(status)
+
+    @timed("ui.update_timer")
     def update_timer(self):
-        """定期更新计时器显示"""
-        if self.running:
-            current_time = time.time()
-            current_elapsed = (current_time - self.start_time)
-            self.elapsed_time = self.load_today_total_time_value() + current_elapsed
-            hours, rem = divmod(self.elapsed_time, 3600)
-            minutes, seconds = divmod(rem, 60)
-            time_str = "{:02d}:{:02d}:{:02d}".format(
-                int(hours), int(minutes), int(seconds)
-            )
-            self.time_var.set(time_str)
-        # 每100ms更新一次
-        self.root.after(100, self.update_timer)
+        """计时中在下一个整秒刷新显示；暂停时不再定时唤醒，窗口最小化时不刷新显示"""
+        if self.display_job is not None:
+            self.root.after_cancel(self.display_job)
+            self.display_job = None
+        if not self.running:
+            return
+        if self.root.state() == "iconic":
+            # 计时服务在本进程中时只能由这里调用 service.tick()：最小化时仍低频唤醒，
+            # 继续写 checkpoint 和成批写入记录，只是不刷新显示
+            if self.local_service:
+                self.display_job = self.root.after(MINIMIZED_TICK_MS, self.on_timer_tick)
+            return
+        # 今天已保存的时长 + 本次计时的时长（跨过午夜后从 0 开始），按单调时钟计算
+        elapsed = self.core.today_elapsed()
+        self.show_elapsed(elapsed)
+        # 到显示的秒数变化时再唤醒，多等 5ms 避免因计时器误差提前唤醒后重复刷新同一秒
+        delay = int((1 - elapsed % 1) * 1000) + 5
+        self.display_job = self.root.after(delay, self.on_timer_tick)
+
+    def on_timer_tick(self):
+        self.display_job = None
+        if self.local_service:
+            # 计时服务在本进程中时，让它写 checkpoint 和成批写入记录（守护进程会自己执行）
+            self.worker.submit(lambda service: service.tick())
+        self.update_timer()
 
+    def flush_pending(self):
+        """暂停后（不再按秒唤醒）让本进程中的计时服务写入缓冲中的记录，写完为止"""
+        if not self.local_service or self.running:
+            return
+
+        def ticked(needs_tick):
+            if needs_tick and not self.running:
+                self.root.after(1000, self.flush_pending)
+
+        self.worker.submit(lambda service: service.tick(), ticked)
+
+    def show_elapsed(self, elapsed):
+        """以 HH:MM:SS 显示时长（文字没有变化时不更新标签）"""
+        text = format_clock(elapsed)
+        if text != self.shown_text:
+            self.shown_text = text
+            self.time_var.set(text)
+
+    @timed("ui.show_daily_summary")
     def show_daily_summary(self):
         """显示每日学习汇总窗口（主界面）"""
+        opened = time.perf_counter()
         summary_window = tk.Toplevel(self.root)
         summary_window.title("每日学习汇总")
-        summary_window.geometry("600x400")
+        summary_window.geometry("600x460")
         summary_window.transient(self.root)
         summary_window.grab_set()
 
-        # 创建汇总树
-        tree = ttk.Treeview(
-            summary_window,
-            columns=("date", "total_duration", "sessions"),
-            show="headings"
-        )
-        tree.heading("date", text="日期")
-        tree.heading("total_duration", text="总学习时间")
-        tree.heading("sessions", text="学习次数")
-        tree.column("date", width=150, anchor="center")
-        tree.column("total_duration", width=180, anchor="center")
-        tree.column("sessions", width=100, anchor="center")
+        # 日期范围：任意 [起始, 结束] 的合计和按内容的拆分（树状数组查询，不重新扫描记录）
+        range_frame = tk.Frame(summary_window)
+        range_frame.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(range_frame, text="从").pack(side="left")
+        since_entry = tk.Entry(range_frame, width=11)
+        since_entry.pack(side="left", padx=3)
+        tk.Label(range_frame, text="到").pack(side="left")
+        until_entry = tk.Entry(range_frame, width=11)
+        until_entry.pack(side="left", padx=3)
+        preset_combo = ttk.Combobox(range_frame, values=RANGE_PRESETS, state="readonly", width=8)
+        preset_combo.pack(side="left", padx=5)
+        range_button = tk.Button(range_frame, text="统计", bg="#3498db", fg="white")
+        range_button.pack(side="left", padx=5)
+        range_label = tk.Label(summary_window, text="", fg="#2c3e50", anchor="w", justify="left", wraplength=570)
+        range_label.pack(fill="x", padx=10)
 
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(summary_window, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
-        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        def show_range(result):
+            if not summary_window.winfo_exists():
+                return
+            total, count, remarks = result
+            parts = [f"{remark} {self.format_duration(duration)}" for remark, duration in remarks[:RANGE_REMARKS]]
+            if len(remarks) > RANGE_REMARKS:
+                parts.append(f"等 {len(remarks)} 项")
+            text = f"合计: {self.format_duration(total)}，{count} 次"
+            range_label.config(text=text + ("\n" + " · ".join(parts) if parts else ""))
 
-        # 计算每日汇总
-        daily_summary = {}
-        all_dates = set()  # 用于存储所有出现过的日期
-        try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)  # 跳过标题行
-                for row in reader:
-                    if len(row) >= 5:
-                        date = row[0]
-                        duration = float(row[3])
-                        all_dates.add(date)
-                        if date in daily_summary:
-                            daily_summary[date]["total"] += duration
-                            daily_summary[date]["count"] += 1
-                        else:
-                            daily_summary[date] = {"total": duration, "count": 1}
-        except Exception as e:
-            messagebox.showerror("错误", f"计算汇总失败: {str(e)}")
-            return
+        def range_failed(e):
+            if summary_window.winfo_exists():
+                range_label.config(text=f"统计失败: {e}")
 
-        # 按日期降序排序
-        sorted_dates = sorted(daily_summary.keys(), reverse=True)
+        def query_range():
+            try:
+                since = parse_date(since_entry.get())
+                until = parse_date(until_entry.get())
+            except ValueError:
+                messagebox.showwarning("日期格式", "请按 YYYY-MM-DD 输入日期（留空为不限）", parent=summary_window)
+                return
+            range_label.config(text="正在统计...")
+            self.worker.submit(lambda service: service.store.range_totals(since, until), show_range, range_failed)
 
-        # 添加到树中
-        for date in sorted_dates:
-            total_seconds = daily_summary[date]["total"]
+        def apply_preset(event=None):
+            since, until = preset_range(preset_combo.get())
+            since_entry.delete(0, "end")
+            since_entry.insert(0, since)
+            until_entry.delete(0, "end")
+            until_entry.insert(0, until)
+            query_range()
+
+        range_button.config(command=query_range)
+        preset_combo.bind("<<ComboboxSelected>>", apply_preset)
+        since_entry.bind("<Return>", lambda event: query_range())
+        until_entry.bind("<Return>", lambda event: query_range())
+        preset_combo.set(RANGE_PRESETS[0])
+        apply_preset()
+
+        # 列表区域：数据加载完成前先显示加载提示
+        list_frame = tk.Frame(summary_window)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        loading_label = tk.Label(list_frame, text="正在加载...", fg="#7f8c8d")
+        loading_label.pack(expand=True)
+
+        def format_seconds(total_seconds):
             hours, rem = divmod(total_seconds, 3600)
             minutes, seconds = divmod(rem, 60)
-            time_str = f"{int(hours)}小时{int(minutes)}分{int(seconds)}秒"
-            tree.insert("", "end", values=(
-                date,
-                time_str,
-                daily_summary[date]["count"]
-            ), tags=(date,))
+            return f"{int(hours)}小时{int(minutes)}分{int(seconds)}秒"
 
-        # 添加双击事件
-        def on_double_click(event):
-            item = tree.selection()[0]
-            selected_date = tree.item(item, "values")[0]
-            self.show_daily_detail(selected_date, summary_window)
+        def format_daily_row(row):
+            date, total_seconds, count, dedup_seconds = row
+            return (date, format_seconds(total_seconds), format_seconds(dedup_seconds), count)
 
-        tree.bind("<Double-1>", on_double_click)
+        def populate(result):
+            if not summary_window.winfo_exists():
+                return
+            daily_rows, dedup_totals = result
+            loading_label.destroy()
+            # 每行附上去重后的时长（同一天内重叠的记录只算一次）
+            rows = [(date, total, count, dedup_totals.get(date, total)) for date, total, count in daily_rows]
+            # 创建汇总列表（虚拟滚动，只生成可见的行；数据已按日期降序排序）
+            source = RowSource(rows, format_daily_row, sort_keys={
+                "date": lambda row: row[0],
+                "total_duration": lambda row: row[1],
+                "dedup_duration": lambda row: row[3],
+                "sessions": lambda row: row[2],
+            })
+            tree = VirtualTreeview(list_frame, [
+                ("date", "日期", 110),
+                ("total_duration", "总学习时间", 160),
+                ("dedup_duration", "去掉重叠后", 160),
+                ("sessions", "学习次数", 80),
+            ], source)
+            tree.pack(fill="both", expand=True)
+            # 从打开窗口到列表显示出数据的时间
+            metrics.observe("ui.show_daily_summary.ready", time.perf_counter() - opened)
+
+            # 添加双击事件
+            tree.bind_row("<Double-1>", lambda row: self.show_daily_detail(row[0], summary_window))
+
+        def failed(e):
+            if summary_window.winfo_exists():
+                loading_label.config(text="加载失败")
+            messagebox.showerror("错误", f"计算汇总失败: {str(e)}")
+
+        # 在后台线程中读取每日汇总（文件未变化时不会重新解析）
+        self.worker.submit(
+            lambda service: (service.store.daily_rows(), service.store.dedup_daily_totals()),
+            populate, failed
+        )
 
         # +++ 新增：添加“总学习时长”按钮 +++
         total_summary_frame = tk.Frame(summary_window)
@@ -356,6 +710,14 @@ class StudyTimer:
             font=("Helvetica", 10, "bold"),
             command=lambda: self.show_total_summary(summary_window)
         ).pack(side="right", padx=5)
+        tk.Button(
+            total_summary_frame,
+            text="图表",
+            bg="#16a085",
+            fg="white",
+            font=("Helvetica", 10, "bold"),
+            command=lambda: self.show_charts(summary_window)
+        ).pack(side="right", padx=5)
         # +++ 结束新增 +++
 
         # 添加关闭按钮
@@ -373,103 +735,101 @@ class StudyTimer:
         :param seconds: 秒数
         :return: 格式化后的字符串
         """
-        if seconds < 60:
-            return f"{int(seconds)}s"  # 少于1分钟显示秒
-        elif seconds < 3600:
-            minutes = seconds // 60
-            return f"{int(minutes)}min"
-        else:
-            hours = seconds // 3600
-            minutes = (seconds % 3600) // 60
-            if minutes > 0:
-                return f"{int(hours)}h{int(minutes)}min"
-            else:
-                return f"{int(hours)}h"
+        return format_duration(seconds)
 
+    @timed("ui.show_daily_detail")
     def show_daily_detail(self, target_date, parent_window):
         """显示指定日期的详细学习记录（按备注分类）"""
+        opened = time.perf_counter()
         detail_window = tk.Toplevel(parent_window)
         detail_window.title(f"{target_date} 学习详情")
         detail_window.geometry("600x350")
         detail_window.transient(parent_window)
 
-        # 创建详细记录树
-        tree = ttk.Treeview(
-            detail_window,
-            columns=("remark", "duration", "start", "end"),
-            show="headings"
-        )
-        tree.heading("remark", text="学习内容")
-        tree.heading("duration", text="学习时长")  # 修改列名
-        tree.heading("start", text="开始时间")
-        tree.heading("end", text="结束时间")
-        tree.column("remark", width=150, anchor="center")
-        tree.column("duration", width=100, anchor="center")
-        tree.column("start", width=100, anchor="center")
-        tree.column("end", width=100, anchor="center")
+        # 列表区域：数据加载完成前先显示加载提示
+        list_frame = tk.Frame(detail_window)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        loading_label = tk.Label(list_frame, text="正在加载...", fg="#7f8c8d")
+        loading_label.pack(expand=True)
 
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(detail_window, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side="right", fill="y")
-        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        def populate(result):
+            if not detail_window.winfo_exists():
+                return
+            loading_label.destroy()
+            records, archived = result
+            # 每行为 (学习内容, 时长, 开始, 结束)；已归档的日期没有逐条记录，每个学习内容显示一行汇总
+            rows = [(record.remark, record.duration, record.start, record.end) for record in records]
+            rows += [(remark, duration, "已归档", f"共{count}次") for remark, duration, count in archived]
+            # 创建详细记录列表（虚拟滚动，时长在显示时才格式化）
+            source = RowSource(
+                rows,
+                lambda row: (row[0], self.format_duration(row[1]), row[2], row[3]),
+                sort_keys={
+                    "remark": lambda row: row[0],
+                    "duration": lambda row: row[1],
+                    "start": lambda row: row[2],
+                    "end": lambda row: row[3],
+                }
+            )
+            tree = VirtualTreeview(list_frame, [
+                ("remark", "学习内容", 150),
+                ("duration", "学习时长", 100),
+                ("start", "开始时间", 100),
+                ("end", "结束时间", 100),
+            ], source)
+            tree.pack(fill="both", expand=True)
+            metrics.observe("ui.show_daily_detail.ready", time.perf_counter() - opened)
 
-        # 加载目标日期的详细数据
-        try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)  # 跳过标题行
-                for row in reader:
-                    if len(row) >= 5 and row[0] == target_date:
-                        duration_sec = float(row[3])
-                        # 使用新的格式化函数
-                        formatted_duration = self.format_duration(duration_sec)
-                        tree.insert("", "end", values=(row[4], formatted_duration, row[1], row[2]))
-        except Exception as e:
+        def failed(e):
+            if detail_window.winfo_exists():
+                loading_label.config(text="加载失败")
             messagebox.showerror("错误", f"加载详细记录失败: {str(e)}")
-            return
+
+        # 在后台线程中读取目标日期的详细数据
+        self.worker.submit(
+            lambda service: (service.store.records_for_date(target_date), service.store.archived_totals(target_date)),
+            populate, failed
+        )
 
         # 添加按备注汇总的按钮
         def show_remark_summary():
-            remark_summary = {}
-            for child in tree.get_children():
-                values = tree.item(child, "values")
-                remark = values[0]
-                # 注意：values[1] 是格式化后的字符串，无法直接计算，需要重新从原始数据获取
-                # 所以这里我们不使用 tree 的数据，而是重新读取文件
-            try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    next(reader)
-                    for row in reader:
-                        if len(row) >= 5 and row[0] == target_date:
-                            remark = row[4]
-                            duration = float(row[3])
-                            remark_summary[remark] = remark_summary.get(remark, 0) + duration
-            except Exception as e:
-                messagebox.showerror("错误", f"汇总计算失败: {str(e)}")
-                return
+            # 直接使用 (日期, 备注) 汇总，不再重新读取文件
+            self.worker.submit(
+                lambda service: (service.store.remark_totals(target_date),
+                                 service.store.dedup_remark_totals(target_date)),
+                show_remark_window,
+                lambda e: messagebox.showerror("错误", f"汇总计算失败: {str(e)}")
+            )
 
+        def show_remark_window(result):
+            if not detail_window.winfo_exists():
+                return
+            remark_summary, dedup_summary = result
+            dedup_totals = dict(dedup_summary)
             summary_window = tk.Toplevel(detail_window)
             summary_window.title(f"{target_date} 内容汇总")
-            summary_window.geometry("400x300")
+            summary_window.geometry("450x300")
             sum_tree = ttk.Treeview(
                 summary_window,
-                columns=("remark", "total_duration"),
+                columns=("remark", "total_duration", "dedup_duration"),
                 show="headings"
             )
             sum_tree.heading("remark", text="学习内容")
             sum_tree.heading("total_duration", text="总时长")
-            sum_tree.column("remark", width=150, anchor="center")
-            sum_tree.column("total_duration", width=150, anchor="center")
+            sum_tree.heading("dedup_duration", text="去掉重叠后")
+            sum_tree.column("remark", width=130, anchor="center")
+            sum_tree.column("total_duration", width=130, anchor="center")
+            sum_tree.column("dedup_duration", width=130, anchor="center")
             scrollbar_sum = ttk.Scrollbar(summary_window, orient="vertical", command=sum_tree.yview)
             sum_tree.configure(yscrollcommand=scrollbar_sum.set)
             scrollbar_sum.pack(side="right", fill="y")
             sum_tree.pack(fill="both", expand=True, padx=10, pady=10)
 
-            for remark, total_seconds in remark_summary.items():
-                formatted_total = self.format_duration(total_seconds)
-                sum_tree.insert("", "end", values=(remark, formatted_total))
+            with metrics.timer("ui.tree.insert"):
+                for remark, total_seconds in remark_summary:
+                    formatted_total = self.format_duration(total_seconds)
+                    formatted_dedup = self.format_duration(dedup_totals.get(remark, total_seconds))
+                    sum_tree.insert("", "end", values=(remark, formatted_total, formatted_dedup))
 
         tk.Button(
             detail_window,
@@ -489,8 +849,10 @@ class StudyTimer:
         ).pack(pady=5)
 
     # +++ 新增方法：显示总学习时长和按备注汇总 +++
+    @timed("ui.show_total_summary")
     def show_total_summary(self, parent_window):
         """显示所有历史记录的总学习时长和按备注的分类汇总"""
+        opened = time.perf_counter()
         total_window = tk.Toplevel(parent_window)
         total_window.title("总学习时长")
         total_window.geometry("600x400")
@@ -504,68 +866,40 @@ class StudyTimer:
         total_tab = tk.Frame(notebook)
         notebook.add(total_tab, text="总学习时间")
 
-        # 读取所有记录并计算总时长
-        total_seconds = 0.0
-        try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)  # 跳过标题行
-                for row in reader:
-                    if len(row) >= 5:
-                        total_seconds += float(row[3])
-        except Exception as e:
-            messagebox.showerror("错误", f"计算总时长失败: {str(e)}")
-            total_seconds = 0.0
-
-        # 使用统一的格式化函数
-        time_str = self.format_duration(total_seconds)
-
-        # 在标签页中显示
+        # 在标签页中显示（数据加载完成前显示加载提示）
         tk.Label(
             total_tab,
             text="所有历史学习总时长:",
             font=("Helvetica", 14, "bold"),
             fg="#2c3e50"
         ).pack(pady=20)
-        tk.Label(
+        total_label = tk.Label(
             total_tab,
-            text=time_str,
+            text="正在加载...",
             font=("Helvetica", 20, "bold"),
             fg="#e74c3c"
-        ).pack()
+        )
+        total_label.pack()
+        # 同时开着两段计时等重叠的时间只算一次
+        dedup_label = tk.Label(total_tab, text="", font=("Helvetica", 12), fg="#7f8c8d")
+        dedup_label.pack(pady=10)
 
         # --- 标签页2: 按备注汇总 ---
         remark_tab = tk.Frame(notebook)
         notebook.add(remark_tab, text="按内容汇总")
 
-        # 计算按备注的汇总
-        remark_summary = {}
-        try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)  # 跳过标题行
-                for row in reader:
-                    if len(row) >= 5:
-                        remark = row[4]
-                        duration = float(row[3])
-                        remark_summary[remark] = remark_summary.get(remark, 0) + duration
-        except Exception as e:
-            messagebox.showerror("错误", f"计算按内容汇总失败: {str(e)}")
-            return
-
-        # 按总时长降序排序
-        sorted_remarks = sorted(remark_summary.items(), key=lambda x: x[1], reverse=True)
-
         # 创建树形视图
         tree = ttk.Treeview(
             remark_tab,
-            columns=("remark", "total_duration"),
+            columns=("remark", "total_duration", "dedup_duration"),
             show="headings"
         )
         tree.heading("remark", text="学习内容")
         tree.heading("total_duration", text="总学习时间")
-        tree.column("remark", width=200, anchor="center")
-        tree.column("total_duration", width=200, anchor="center")
+        tree.heading("dedup_duration", text="去掉重叠后")
+        tree.column("remark", width=160, anchor="center")
+        tree.column("total_duration", width=160, anchor="center")
+        tree.column("dedup_duration", width=160, anchor="center")
 
         # 添加滚动条
         scrollbar = ttk.Scrollbar(remark_tab, orient="vertical", command=tree.yview)
@@ -573,15 +907,416 @@ class StudyTimer:
         scrollbar.pack(side="right", fill="y")
         tree.pack(fill="both", expand=True, padx=10, pady=10)
 
-        # 添加数据
-        for remark, total_sec in sorted_remarks:
-            time_str = self.format_duration(total_sec)
-            tree.insert("", "end", values=(remark, time_str))
+        def populate(result):
+            if not total_window.winfo_exists():
+                return
+            total_seconds, sorted_remarks, dedup_seconds, dedup_remarks = result
+            dedup_totals = dict(dedup_remarks)
+            # 使用统一的格式化函数
+            total_label.config(text=self.format_duration(total_seconds))
+            dedup_label.config(text=f"去掉重叠的时间后: {self.format_duration(dedup_seconds)}")
+            # 添加数据
+            with metrics.timer("ui.tree.insert"):
+                for remark, total_sec in sorted_remarks:
+                    time_str = self.format_duration(total_sec)
+                    dedup_str = self.format_duration(dedup_totals.get(remark, total_sec))
+                    tree.insert("", "end", values=(remark, time_str, dedup_str))
+            metrics.observe("ui.show_total_summary.ready", time.perf_counter() - opened)
+
+        def failed(e):
+            if total_window.winfo_exists():
+                total_label.config(text="加载失败")
+            messagebox.showerror("错误", f"计算总时长失败: {str(e)}")
+
+        # 总时长和按备注汇总在同一个后台任务中读取，都来自同一份汇总缓存
+        self.worker.submit(
+            lambda service: (service.store.grand_total(), service.store.remark_totals(),
+                             service.store.dedup_grand_total(), service.store.dedup_remark_totals()),
+            populate, failed
+        )
 
     # +++ 结束新增 +++
 
+    @timed("ui.show_charts")
+    def show_charts(self, parent_window):
+        """学习时长图表：每天/每周/每月的总时长柱状图或按内容的堆叠面积图。
+        滚轮缩放、拖动平移、双击恢复；数据来自按天/周/月的汇总缓存，点数不超过画布宽度能放下的数量"""
+        opened = time.perf_counter()
+        chart_window = tk.Toplevel(parent_window)
+        chart_window.title("学习图表")
+        chart_window.geometry("760x460")
+        chart_window.transient(parent_window)
+
+        control_frame = tk.Frame(chart_window)
+        control_frame.pack(fill="x", padx=10, pady=(10, 0))
+        range_combo = ttk.Combobox(control_frame, values=CHART_RANGES, state="readonly", width=9)
+        range_combo.pack(side="left")
+        level_combo = ttk.Combobox(control_frame, values=list(CHART_LEVELS), state="readonly", width=6)
+        level_combo.pack(side="left", padx=5)
+        mode_combo = ttk.Combobox(control_frame, values=CHART_MODES, state="readonly", width=10)
+        mode_combo.pack(side="left", padx=5)
+        status_label = tk.Label(control_frame, text="正在加载...", fg="#7f8c8d")
+        status_label.pack(side="right")
+
+        canvas = tk.Canvas(chart_window, bg="white", highlightthickness=0)
+        canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        tk.Label(chart_window, text="滚轮缩放，拖动平移，双击恢复", fg="#7f8c8d").pack(pady=(0, 5))
+
+        # 绘图区到画布边缘的距离（左边留给纵轴刻度，下边留给日期）
+        margin_left, margin_right, margin_top, margin_bottom = 50, 10, 10, 25
+        # 当前显示的日期范围、全部记录的日期范围、最近一次取回的数据，以及等待中的请求和拖动的位置
+        state = {"since": None, "until": None, "first": None, "last": None,
+                 "series": None, "job": None, "drag": None, "ready": False}
+
+        def day_width():
+            """每天占多少像素"""
+            days = date.fromisoformat(state["until"]).toordinal() - date.fromisoformat(state["since"]).toordinal() + 1
+            return (canvas.winfo_width() - margin_left - margin_right) / days
+
+        def draw():
+            canvas.delete("all")
+            series = state["series"]
+            if series is None or state["since"] is None:
+                return
+            started = time.perf_counter()
+            left, right = margin_left, canvas.winfo_width() - margin_right
+            top, bottom = margin_top, canvas.winfo_height() - margin_bottom
+            start = date.fromisoformat(state["since"]).toordinal()
+            scale_x = day_width()
+            level = series["level"]
+            buckets = series["buckets"]
+            stacked = mode_combo.get() == CHART_MODES[1]
+            if stacked:
+                names, rows = chart_layers(buckets)
+            else:
+                names, rows = [], [[sum(remarks.values())] for _, remarks in buckets]
+            peak = max((sum(row) for row in rows), default=0.0) or 1.0
+            scale_y = (bottom - top) / peak
+            # 每个桶在画布上的 [起点, 终点)
+            spans = []
+            for bucket_date, _ in buckets:
+                x = left + (date.fromisoformat(bucket_date).toordinal() - start) * scale_x
+                spans.append((x, x + bucket_days(bucket_date, level, series["step"]) * scale_x))
+
+            if stacked:
+                def outline(values):
+                    """阶梯状的边：每个桶一段水平线，没有记录的间隔落到 0"""
+                    points = []
+                    previous_end = None
+                    for (x0, x1), value in zip(spans, values):
+                        if previous_end is not None and x0 - previous_end > 0.5:
+                            points += [(previous_end, 0.0), (x0, 0.0)]
+                        points += [(x0, value), (x1, value)]
+                        previous_end = x1
+                    return [(min(max(x, left), right), bottom - value * scale_y) for x, value in points]
+
+                # 从下往上逐层累加，每层是上下两条边围成的多边形
+                base = [0.0] * len(rows)
+                for layer, name in enumerate(names):
+                    tops = [below + row[layer] for below, row in zip(base, rows)]
+                    points = outline(tops) + outline(base)[::-1]
+                    canvas.create_polygon(points, fill=CHART_COLORS[layer % len(CHART_COLORS)], outline="")
+                    base = tops
+                for layer, name in enumerate(names):
+                    y = top + 5 + layer * 16
+                    canvas.create_rectangle(right - 100, y, right - 90, y + 10,
+                                            fill=CHART_COLORS[layer % len(CHART_COLORS)], outline="")
+                    canvas.create_text(right - 85, y + 5, text=name, anchor="w")
+            else:
+                for (x0, x1), row in zip(spans, rows):
+                    if x1 <= left or x0 >= right:
+                        continue
+                    canvas.create_rectangle(max(x0, left), bottom - row[0] * scale_y,
+                                            max(min(x1 - 1, right), max(x0, left) + 1), bottom,
+                                            fill=CHART_COLORS[0], outline="")
+
+            # 坐标轴：纵轴标最大值（小时），横轴均匀标 5 个日期
+            canvas.create_line(left, bottom, right, bottom)
+            canvas.create_line(left, top, left, bottom)
+            canvas.create_text(left - 4, top, text=f"{peak / 3600:.1f}h", anchor="ne")
+            canvas.create_text(left - 4, bottom, text="0", anchor="e")
+            days = date.fromisoformat(state["until"]).toordinal() - start + 1
+            for i in range(5):
+                offset = round((days - 1) * i / 4)
+                canvas.create_text(left + (offset + 0.5) * scale_x, bottom + 4,
+                                   text=date.fromordinal(start + offset).isoformat(), anchor="n")
+            elapsed = time.perf_counter() - started
+            metrics.observe("ui.charts.draw", elapsed)
+            level_name = LEVEL_NAMES[level] if series["step"] == 1 else f"每{series['step']}个月"
+            status_label.config(text=f"{level_name} · {len(buckets)} 个点 · 绘制 {elapsed * 1000:.0f}ms")
+
+        def show(series):
+            if not chart_window.winfo_exists():
+                return
+            state["series"] = series
+            state["first"], state["last"] = series["first"], series["last"]
+            if series["first"] is None:
+                canvas.delete("all")
+                status_label.config(text="还没有学习记录")
+                return
+            if state["since"] is None:
+                # “全部”：显示全部记录的日期范围
+                state["since"], state["until"] = series["first"], series["last"]
+            draw()
+            if not state["ready"]:
+                state["ready"] = True
+                metrics.observe("ui.show_charts.ready", time.perf_counter() - opened)
+
+        def failed(e):
+            if chart_window.winfo_exists():
+                status_label.config(text="加载失败")
+            messagebox.showerror("错误", f"加载图表数据失败: {str(e)}")
+
+        def request():
+            """在后台线程中取当前范围的数据，最多取画布宽度能放下的点数"""
+            state["job"] = None
+            if not chart_window.winfo_exists():
+                return
+            since, until = state["since"], state["until"]
+            level = CHART_LEVELS[level_combo.get()]
+            width = canvas.winfo_width() - margin_left - margin_right
+            max_points = max(10, width // CHART_PIXELS_PER_POINT)
+            self.worker.submit(lambda service: service.store.chart_series(since, until, max_points, level),
+                               show, failed)
+
+        def schedule():
+            """缩放/拖动时先用已有的数据重画，停下后再请求新的数据"""
+            if state["job"] is not None:
+                chart_window.after_cancel(state["job"])
+            state["job"] = chart_window.after(CHART_DEBOUNCE_MS, request)
+
+        def apply_range(event=None):
+            since, until = preset_range(range_combo.get())
+            state["since"], state["until"] = since or None, until or None
+            request()
+
+        def zoom(event, factor):
+            if state["since"] is None or state["first"] is None:
+                return
+            width = canvas.winfo_width() - margin_left - margin_right
+            anchor = min(max((event.x - margin_left) / max(1, width), 0.0), 1.0)
+            state["since"], state["until"] = zoom_range(state["since"], state["until"], factor, anchor,
+                                                        state["first"], state["last"])
+            draw()
+            schedule()
+
+        def start_drag(event):
+            state["drag"] = event.x
+
+        def drag(event):
+            if state["drag"] is None or state["since"] is None or state["first"] is None:
+                return
+            scale_x = day_width()
+            days = round((state["drag"] - event.x) / scale_x)
+            if days:
+                state["since"], state["until"] = pan_range(state["since"], state["until"], days,
+                                                           state["first"], state["last"])
+                state["drag"] -= days * scale_x
+                draw()
+                schedule()
+
+        def resized(event):
+            draw()
+            if state["series"] is not None:
+                schedule()
+
+        range_combo.bind("<<ComboboxSelected>>", apply_range)
+        level_combo.bind("<<ComboboxSelected>>", lambda event: request())
+        mode_combo.bind("<<ComboboxSelected>>", lambda event: draw())
+        canvas.bind("<MouseWheel>", lambda event: zoom(event, 0.8 if event.delta > 0 else 1.25))
+        canvas.bind("<Button-4>", lambda event: zoom(event, 0.8))
+        canvas.bind("<Button-5>", lambda event: zoom(event, 1.25))
+        canvas.bind("<ButtonPress-1>", start_drag)
+        canvas.bind("<B1-Motion>", drag)
+        canvas.bind("<Double-1>", apply_range)
+        canvas.bind("<Configure>", resized)
+        range_combo.set(CHART_RANGES[0])
+        level_combo.set(list(CHART_LEVELS)[0])
+        mode_combo.set(CHART_MODES[0])
+        apply_range()
+
+    @timed("ui.show_leaderboard")
+    def show_leaderboard(self):
+        """各用户的学习时长排行榜（今天/本周/本月/全部）"""
+        board_window = tk.Toplevel(self.root)
+        board_window.title("排行榜")
+        board_window.geometry("480x360")
+        board_window.transient(self.root)
+
+        top_frame = tk.Frame(board_window, padx=10, pady=10)
+        top_frame.pack(fill="x")
+        tk.Label(top_frame, text="范围:", font=("Helvetica", 10)).pack(side="left")
+        period_combo = ttk.Combobox(top_frame, values=list(LEADERBOARD_PERIODS), state="readonly", width=8)
+        period_combo.set("本周")
+        period_combo.pack(side="left", padx=10)
+        status_label = tk.Label(top_frame, text="", font=("Helvetica", 10), fg="#7f8c8d")
+        status_label.pack(side="left")
+
+        tree = ttk.Treeview(board_window, columns=("rank", "profile", "total", "count"), show="headings")
+        tree.heading("rank", text="名次")
+        tree.heading("profile", text="用户")
+        tree.heading("total", text="总时长")
+        tree.heading("count", text="次数")
+        tree.column("rank", width=60, anchor="center")
+        tree.column("profile", width=160, anchor="center")
+        tree.column("total", width=140, anchor="center")
+        tree.column("count", width=80, anchor="center")
+        tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        def populate(rows):
+            if not board_window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for rank, (profile, total, count) in enumerate(rows, 1):
+                tree.insert("", "end", values=(rank, profile, self.format_duration(total), count))
+            status_label.config(text="")
+
+        def failed(e):
+            if board_window.winfo_exists():
+                status_label.config(text="加载失败")
+            messagebox.showerror("错误", f"计算排行榜失败: {str(e)}")
+
+        def load():
+            status_label.config(text="正在统计...")
+            since, until = period_range(LEADERBOARD_PERIODS[period_combo.get()])
+
+            def rank(service):
+                # 先让当前用户缓冲中的记录写入文件，排行榜直接读取各用户的文件
+                service.store.today_total()
+                return leaderboard(since, until, backend=self.history_backend, default_file=self.history_file)
+
+            self.worker.submit(rank, populate, failed)
+
+        period_combo.bind("<<ComboboxSelected>>", lambda event: load())
+        load()
+
+    def show_diagnostics(self):
+        """诊断窗口（Ctrl+Shift+D）：运行时统计、导出 JSON、cProfile 采样"""
+        diag_window = tk.Toplevel(self.root)
+        diag_window.title("诊断")
+        diag_window.geometry("640x420")
+        diag_window.transient(self.root)
+
+        tree = ttk.Treeview(
+            diag_window,
+            columns=("name", "count", "mean", "p50", "p99", "max"),
+            show="headings"
+        )
+        for column, text, width in [("name", "名称", 220), ("count", "次数/计数", 80), ("mean", "平均(ms)", 80),
+                                    ("p50", "p50(ms)", 70), ("p99", "p99(ms)", 70), ("max", "最大(ms)", 70)]:
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor="w" if column == "name" else "e")
+        scrollbar = ttk.Scrollbar(diag_window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+
+        button_frame = tk.Frame(diag_window)
+        button_frame.pack(side="bottom", fill="x", padx=10, pady=5)
+        scrollbar.pack(side="right", fill="y")
+        tree.pack(fill="both", expand=True, padx=10, pady=5)
+
+        # 每次刷新加一，较早的刷新返回的计时服务统计不再显示
+        refreshes = [0]
+
+        def refresh():
+            if not diag_window.winfo_exists():
+                return
+            refreshes[0] += 1
+            tree.delete(*tree.get_children())
+            snapshot = metrics.snapshot()
+            for name, summary in snapshot["timings"].items():
+                tree.insert("", "end", values=(
+                    name, summary["count"], f"{summary['mean'] * 1000:.3f}",
+                    f"{summary['p50'] * 1000:.3f}", f"{summary['p99'] * 1000:.3f}", f"{summary['max'] * 1000:.3f}"
+                ))
+            for name, value in sorted(snapshot["counters"].items()):
+                tree.insert("", "end", values=(name, value, "", "", "", ""))
+            # 计时服务的 I/O 计数（守护进程开启统计时也包含它的 metrics）
+            current = refreshes[0]
+            self.worker.submit(lambda service: service.stats(), lambda stats: show_service_stats(stats, current))
+            enable_button.config(text="关闭统计" if metrics.enabled else "开启统计")
+            profile_button.config(text="停止 cProfile" if metrics.profiling else "开始 cProfile")
+
+        def show_service_stats(stats, refresh_id):
+            if not diag_window.winfo_exists() or refresh_id != refreshes[0]:
+                return
+            remote = stats.pop("metrics", None)
+            for name, value in sorted(stats.items()):
+                tree.insert("", "end", values=(f"service.{name}", value, "", "", "", ""))
+            if remote:
+                for name, summary in remote["timings"].items():
+                    tree.insert("", "end", values=(
+                        f"service.{name}", summary["count"], f"{summary['mean'] * 1000:.3f}",
+                        f"{summary['p50'] * 1000:.3f}", f"{summary['p99'] * 1000:.3f}",
+                        f"{summary['max'] * 1000:.3f}"
+                    ))
+
+        def toggle_enabled():
+            metrics.enabled = not metrics.enabled
+            refresh()
+
+        def reset():
+            metrics.reset()
+            refresh()
+
+        def export_json():
+            path = filedialog.asksaveasfilename(
+                parent=diag_window, defaultextension=".json", initialfile="study_timer_metrics.json",
+                filetypes=[("JSON", "*.json")]
+            )
+            if not path:
+                return
+            try:
+                metrics.dump(path)
+            except OSError as e:
+                messagebox.showerror("错误", f"导出统计失败: {str(e)}", parent=diag_window)
+
+        def toggle_profile():
+            if not metrics.profiling:
+                # 采样时同时开启统计
+                metrics.enabled = True
+                metrics.start_profile()
+                refresh()
+                return
+            report = metrics.stop_profile(PROFILE_FILE)
+            refresh()
+            report_window = tk.Toplevel(diag_window)
+            report_window.title(f"cProfile（已保存到 {PROFILE_FILE}）")
+            report_window.geometry("800x500")
+            text = tk.Text(report_window, font=("Courier", 9), wrap="none")
+            text.insert("1.0", report)
+            text.config(state="disabled")
+            text.pack(fill="both", expand=True)
+
+        enable_button = tk.Button(button_frame, command=toggle_enabled, width=10)
+        enable_button.pack(side="left", padx=5)
+        profile_button = tk.Button(button_frame, command=toggle_profile, width=12)
+        profile_button.pack(side="left", padx=5)
+        tk.Button(button_frame, text="刷新", command=refresh, width=8).pack(side="left", padx=5)
+        tk.Button(button_frame, text="清零", command=reset, width=8).pack(side="left", padx=5)
+        tk.Button(button_frame, text="导出 JSON", command=export_json, width=10).pack(side="left", padx=5)
+        tk.Button(button_frame, text="关闭", command=diag_window.destroy,
+                  bg="#e74c3c", fg="white").pack(side="right", padx=5)
+        refresh()
+
 
 if __name__ == "__main__":
+    # 打包成 exe 后，读取大文件时的子进程（parallel_ingest.py）也由这个 exe 启动
+    multiprocessing.freeze_support()
+    if "--daemon" in sys.argv[1:]:
+        # 打包成 exe 后由界面以 --daemon 参数在后台启动计时服务
+        from timer_daemon import main
+        args = sys.argv[1:]
+        args.remove("--daemon")
+        sys.exit(main(args))
+    # STUDY_TIMER_METRICS=1 开启运行时统计，STUDY_TIMER_PROFILE=1 启动即开始 cProfile（关闭窗口时保存）
+    profile_from_environment()
     root = tk.Tk()
-    app = StudyTimer(root)
+    # 可通过环境变量 STUDY_TIMER_BACKEND 切换存储后端，STUDY_TIMER_DAEMON=0 时不使用守护进程，
+    # STUDY_TIMER_USER 指定启动时的用户
+    app = StudyTimer(
+        root,
+        backend=os.environ.get("STUDY_TIMER_BACKEND", "csv"),
+        use_daemon=os.environ.get("STUDY_TIMER_DAEMON", "1") != "0",
+        profile=os.environ.get("STUDY_TIMER_USER", DEFAULT_PROFILE)
+    )
     root.mainloop()
\ No newline at end of file
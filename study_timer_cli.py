@@ -0,0 +1,127 @@
+"""学习计时器命令行（不依赖 tkinter，可在没有图形界面的服务器上使用）
+
+    python study_timer_cli.py start 高数
+    python study_timer_cli.py stop
+    python study_timer_cli.py today
+    python study_timer_cli.py report
+    python study_timer_cli.py report --date 2025-08-07
+    python study_timer_cli.py report --since 2025-08-01 --until 2025-08-31
+    python study_timer_cli.py --profile 小明 start 英语
+
+计时服务（timer_daemon.py）在运行时通过它开始/暂停和查询，与界面共用同一个计时；
+没有运行时直接读写历史文件。
+"""
+import argparse
+import sys
+
+from history_store import HISTORY_BACKENDS
+from profiles import DEFAULT_PROFILE, open_profile_store, profile_journal
+from timer_client import connect
+from session_journal import JOURNAL_FILE
+from timer_core import TimerCore, TimerService, format_clock, format_duration
+
+
+def cmd_start(service, args):
+    status = service.start(args.remark)
+    print(f"开始计时: {status['remark']}")
+    return 0
+
+
+def cmd_stop(service, args):
+    record = service.pause()["record"]
+    print(f"已保存: {record.remark} ({record.duration:.1f}秒)")
+    return 0
+
+
+def cmd_today(service, args):
+    core = TimerCore()
+    core.apply_status(service.status())
+    line = f"今天: {format_clock(core.today_elapsed())}"
+    if core.running:
+        line += f"（计时中: {core.remark} {format_clock(core.elapsed())}）"
+    print(line)
+    return 0
+
+
+def cmd_stats(service, args):
+    for name, value in service.stats().items():
+        print(f"{name:<20} {value}")
+    return 0
+
+
+def cmd_report(service, args):
+    store = service.store
+    if args.date:
+        print(f"{args.date} 学习详情:")
+        for record in store.records_for_date(args.date):
+            print(f"  {record.start} - {record.end}  {format_duration(record.duration):>8}  {record.remark}")
+        for remark, duration, count in store.archived_totals(args.date):
+            print(f"  已归档（共{count}次）  {format_duration(duration):>8}  {remark}")
+        print("按内容汇总:")
+        for remark, total in store.remark_totals(args.date):
+            print(f"  {remark:<10} {format_duration(total)}")
+        return 0
+    if args.since or args.until:
+        total, count, remarks = store.range_totals(args.since, args.until)
+        print(f"{args.since or '最早'} 至 {args.until or '今天'}: {format_duration(total)}，{count} 次")
+        for remark, seconds in remarks:
+            print(f"  {remark:<10} {format_duration(seconds)}")
+        return 0
+    print(f"所有历史学习总时长: {format_duration(store.grand_total())}"
+          f"（去掉重叠后 {format_duration(store.dedup_grand_total())}）")
+    print(f"最近 {args.days} 天:")
+    for date, total, count in store.daily_rows()[:args.days]:
+        print(f"  {date}  {format_duration(total):>8}  {count} 次")
+    print("按内容汇总:")
+    for remark, total in store.remark_totals():
+        print(f"  {remark:<10} {format_duration(total)}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="学习计时器命令行")
+    parser.add_argument("--backend", default="csv", choices=sorted(HISTORY_BACKENDS), help="存储后端")
+    parser.add_argument("--file", help="历史记录文件（默认使用该后端的默认文件名）")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help=f"用户（默认“{DEFAULT_PROFILE}”）")
+    parser.add_argument("--journal", help=f"正在进行的计时的日志文件（默认 {JOURNAL_FILE}，其他用户在各自的目录中）")
+    parser.add_argument("--port", type=int, help="计时服务的端口")
+    parser.add_argument("--no-daemon", action="store_true", help="不连接计时服务，直接读写历史文件")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    start = commands.add_parser("start", help="开始计时")
+    start.add_argument("remark", help="学习内容，如：高数")
+    start.set_defaults(func=cmd_start)
+
+    commands.add_parser("stop", help="暂停计时并保存记录").set_defaults(func=cmd_stop)
+    commands.add_parser("today", help="今天的总学习时间").set_defaults(func=cmd_today)
+
+    commands.add_parser("stats", help="计时日志和写入的 I/O 计数").set_defaults(func=cmd_stats)
+
+    report = commands.add_parser("report", help="学习汇总")
+    report.add_argument("--date", help="查看指定日期（YYYY-MM-DD）的详细记录")
+    report.add_argument("--days", type=int, default=7, help="显示最近多少天的每日汇总")
+    report.add_argument("--since", help="统计日期范围的起始日期（YYYY-MM-DD，含当天）")
+    report.add_argument("--until", help="统计日期范围的结束日期（YYYY-MM-DD，含当天）")
+    report.set_defaults(func=cmd_report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = None if args.no_daemon else connect(args.port, args.profile)
+    try:
+        if service is None:
+            store = open_profile_store(args.profile, args.backend, args.file)
+            service = TimerService(store, args.journal or profile_journal(args.profile))
+        return args.func(service, args)
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        if service is not None:
+            service.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""计时服务（timer_daemon.py）的客户端：界面、命令行和脚本通过它共用同一个计时和同一个写入者
+
+    from timer_client import connect
+    service = connect()              # 没有守护进程时返回 None
+    service.start("高数")
+    service.store.daily_rows()
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from history_store import Record
+from profiles import DEFAULT_PROFILE
+from timer_daemon import HOST, daemon_port, daemon_ports, load_token
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_daemon.py")
+
+
+class TimerClient:
+    """一个到守护进程的连接，按“一行一个 JSON”收发；连接后先用令牌文件中的令牌认证"""
+
+    def __init__(self, port=None, timeout=60):
+        self.sock = socket.create_connection((HOST, daemon_port(port)), timeout)
+        self.reader = self.sock.makefile("rb")
+        self.next_id = 0
+        try:
+            self.call("auth", token=load_token())
+        except (OSError, ValueError) as e:
+            self.close()
+            raise ConnectionRefusedError(f"计时服务认证失败: {e}")
+
+    def send(self, message):
+        self.sock.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def receive(self):
+        """读取下一条消息，连接断开时抛出 ConnectionError"""
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("计时服务已断开")
+        return json.loads(line)
+
+    def call(self, cmd, **params):
+        """发送一条命令并等待应答；守护进程返回错误时抛出 ValueError"""
+        self.next_id += 1
+        self.send(dict(params, id=self.next_id, cmd=cmd))
+        while True:
+            message = self.receive()
+            # 订阅后的推送消息没有 id，这里跳过
+            if message.get("id") == self.next_id:
+                break
+        if not message["ok"]:
+            raise ValueError(message["error"])
+        return message["result"]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RemoteHistoryStore:
+    """通过守护进程查询历史记录，提供与本地存储相同的查询方法"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def query(self, method, *args):
+        return self.client.call("query", method=method, args=list(args))
+
+    def day_total(self, date):
+        return self.query("day_total", date)
+
+    def today_total(self):
+        return self.query("today_total")
+
+    def preload(self):
+        self.query("preload")
+
+    def grand_total(self):
+        return self.query("grand_total")
+
+    def daily_rows(self):
+        return [tuple(row) for row in self.query("daily_rows")]
+
+    def remark_totals(self, date=None):
+        return [tuple(row) for row in self.query("remark_totals", date)]
+
+    def records_for_date(self, date):
+        return [Record(*row) for row in self.query("records_for_date", date)]
+
+    def archived_totals(self, date):
+        return [tuple(row) for row in self.query("archived_totals", date)]
+
+    def range_totals(self, since=None, until=None):
+        total, count, remarks = self.query("range_totals", since, until)
+        return total, count, [tuple(row) for row in remarks]
+
+    def chart_series(self, since=None, until=None, max_points=400, level="day"):
+        return self.query("chart_series", since, until, max_points, level)
+
+    def remark_stats(self):
+        return [tuple(row) for row in self.query("remark_stats")]
+
+    def dedup_daily_totals(self):
+        return self.query("dedup_daily_totals")
+
+    def dedup_remark_totals(self, date=None):
+        return [tuple(row) for row in self.query("dedup_remark_totals", date)]
+
+    def dedup_grand_total(self):
+        return self.query("dedup_grand_total")
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        self.client.call("append", records=[list(record) for record in records])
+
+
+class RemoteTimerService:
+    """与 timer_core.TimerService 方法相同，实际的计时和写入都在守护进程中"""
+
+    def __init__(self, client):
+        self.client = client
+        self.store = RemoteHistoryStore(client)
+        self.subscription = None
+
+    def status(self):
+        status = self.client.call("status")
+        if status.get("recovered"):
+            status["recovered"] = Record(*status["recovered"])
+        return status
+
+    def start(self, remark):
+        return self.client.call("start", remark=remark)
+
+    def pause(self):
+        result = self.client.call("pause")
+        result["record"] = Record(*result["record"])
+        return result
+
+    def tick(self):
+        """checkpoint 和成批写入由守护进程自己定时执行，客户端不需要定期调用"""
+        return False
+
+    def stats(self):
+        return self.client.call("stats")
+
+    def subscribe(self, callback):
+        """在单独的连接和线程中接收状态推送，每次调用 callback(状态)；连接断开时调用 callback(None)"""
+        subscription = TimerClient(self.client.sock.getpeername()[1], timeout=None)
+        callback(subscription.call("subscribe"))
+
+        def listen():
+            try:
+                while True:
+                    message = subscription.receive()
+                    if message.get("event") == "status":
+                        callback(message["status"])
+            except (OSError, ValueError):
+                pass
+            if self.subscription is subscription:
+                callback(None)
+
+        self.subscription = subscription
+        threading.Thread(target=listen, name="timer-subscription", daemon=True).start()
+
+    def close(self):
+        subscription, self.subscription = self.subscription, None
+        if subscription is not None:
+            # shutdown 让订阅线程中阻塞的读取立即返回
+            try:
+                subscription.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            subscription.close()
+        self.client.close()
+
+
+def connect(port=None, profile=DEFAULT_PROFILE):
+    """连接用户正在运行的守护进程，没有时返回 None。
+    用户的端口被其他用户的守护进程占用时，守护进程顺延到之后的端口，这里按同样的顺序查找"""
+    for candidate in daemon_ports(port, profile):
+        try:
+            client = TimerClient(candidate)
+        except OSError:
+            continue
+        try:
+            remote_profile = client.call("profile")
+        except ValueError:
+            # 不支持 profile 命令的旧版守护进程只服务默认用户
+            remote_profile = DEFAULT_PROFILE
+        except OSError:
+            client.close()
+            continue
+        if remote_profile == profile:
+            return RemoteTimerService(client)
+        client.close()
+    return None
+
+
+def spawn_daemon(backend="csv", history_file=None, port=None, profile=DEFAULT_PROFILE):
+    """在后台启动守护进程，最后一个客户端断开且没有在计时时自动退出"""
+    if getattr(sys, "frozen", False):
+        # 打包的 exe 中没有单独的脚本，由主程序的 --daemon 参数启动
+        command = [sys.executable, "--daemon"]
+    else:
+        command = [sys.executable, DAEMON_SCRIPT]
+    command += ["--backend", backend, "--exit-when-idle"]
+    if history_file is not None:
+        command += ["--file", history_file]
+    if port is not None:
+        command += ["--port", str(port)]
+    if profile != DEFAULT_PROFILE:
+        command += ["--profile", profile]
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, **options)
+
+
+def ensure_daemon(backend="csv", history_file=None, port=None, timeout=5, profile=DEFAULT_PROFILE):
+    """连接用户的守护进程，没有在运行时启动一个；超时仍连不上时抛出 OSError"""
+    service = connect(port, profile)
+    if service is not None:
+        return service
+    spawn_daemon(backend, history_file, port, profile)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        service = connect(port, profile)
+        if service is not None:
+            return service
+    raise OSError(f"无法连接计时服务（端口 {daemon_port(port, profile)}）")
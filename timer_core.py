@@ -0,0 +1,317 @@
+import math
+import time
+from datetime import datetime
+
+from history_store import Record
+from session_journal import JOURNAL_FILE, SessionJournal
+
+
+def today_str():
+    """今天的日期字符串"""
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def make_record(remark, start_time, end_time):
+    """根据开始/结束时间戳生成一条学习记录"""
+    return Record(
+        time.strftime("%Y-%m-%d", time.localtime(start_time)),
+        time.strftime("%H:%M:%S", time.localtime(start_time)),
+        time.strftime("%H:%M:%S", time.localtime(end_time)),
+        end_time - start_time,
+        remark
+    )
+
+
+def parse_record(values):
+    """检查客户端发来的一条记录 [日期, 开始时间, 结束时间, 时长(秒), 备注] 并转换为 Record，格式错误时抛出 ValueError"""
+    if not isinstance(values, (list, tuple)) or len(values) != 5:
+        raise ValueError(f"记录应为 [日期, 开始时间, 结束时间, 时长, 备注]: {values!r}")
+    date_str, start, end, duration, remark = values
+    for value, fmt in ((date_str, "%Y-%m-%d"), (start, "%H:%M:%S"), (end, "%H:%M:%S")):
+        try:
+            valid = isinstance(value, str) and datetime.strptime(value, fmt).strftime(fmt) == value
+        except ValueError:
+            valid = False
+        if not valid:
+            raise ValueError(f"记录的日期或时间格式错误: {values!r}")
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or \
+            not math.isfinite(duration) or duration < 0:
+        raise ValueError(f"记录的时长应为非负数: {values!r}")
+    if not isinstance(remark, str):
+        raise ValueError(f"记录的备注应为字符串: {values!r}")
+    return Record(date_str, start, end, float(duration), remark)
+
+
+def format_clock(seconds):
+    """把秒数格式化为 HH:MM:SS"""
+    hours, rem = divmod(seconds, 3600)
+    minutes, seconds = divmod(rem, 60)
+    return "{:02d}:{:02d}:{:02d}".format(int(hours), int(minutes), int(seconds))
+
+
+def format_duration(seconds):
+    """
+    将秒数格式化为 xx min 或 xx h xx min 的形式
+    :param seconds: 秒数
+    :return: 格式化后的字符串
+    """
+    if seconds < 60:
+        return f"{int(seconds)}s"  # 少于1分钟显示秒
+    elif seconds < 3600:
+        minutes = seconds // 60
+        return f"{int(minutes)}min"
+    else:
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
+        if minutes > 0:
+            return f"{int(hours)}h{int(minutes)}min"
+        else:
+            return f"{int(hours)}h"
+
+
+class TimerCore:
+    """计时器核心（不依赖 tkinter）：开始/暂停状态机和今天的累计时长。
+
+    传入 store 时 save() 直接写入存储；图形界面不传 store，由后台线程负责写入。
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.running = False
+        self.remark = None
+        self.start_time = 0.0
+        # 开始时间对应的 time.monotonic()，已过的时长按单调时钟计算，系统时间被调整时显示不会跳变
+        self.start_monotonic = 0.0
+        # 今天已保存的总学习时间（秒）及其对应的日期
+        self.today_date = today_str()
+        self.today_base = 0.0
+
+    def start(self, remark, start_time=None):
+        """开始计时"""
+        remark = (remark or "").strip()
+        if not remark:
+            raise ValueError("请选择或输入学习内容（如：高数）")
+        if self.running:
+            raise ValueError(f"已在计时: {self.remark}")
+        self.running = True
+        self.remark = remark
+        self.start_time = time.time() if start_time is None else start_time
+        self.anchor_start()
+
+    def anchor_start(self):
+        """按当前的系统时间把开始时间换算到单调时钟上"""
+        self.start_monotonic = time.monotonic() - (time.time() - self.start_time)
+
+    def stop(self, end_time=None):
+        """暂停计时，返回本次的学习记录（不写入存储）"""
+        if not self.running:
+            raise ValueError("当前没有在计时")
+        end_time = time.time() if end_time is None else end_time
+        record = make_record(self.remark, self.start_time, end_time)
+        self.running = False
+        self.remark = None
+        return record
+
+    def elapsed(self):
+        """本次计时已经过的秒数"""
+        return time.monotonic() - self.start_monotonic if self.running else 0.0
+
+    def roll_day(self):
+        """跨过午夜后，今天的总时长从 0 开始"""
+        today = today_str()
+        if today != self.today_date:
+            self.today_date = today
+            self.today_base = 0.0
+
+    def today_elapsed(self):
+        """今天的总学习时间（已保存的 + 正在进行的）"""
+        self.roll_day()
+        return self.today_base + self.elapsed()
+
+    def set_day_total(self, date, total):
+        """设置从存储中读取到的某天总时长（只有是今天时才生效）"""
+        if date == self.today_date:
+            self.today_base = total
+
+    def record_saved(self, record):
+        """记录写入存储后累加今天的总时长（与文件中保存的精度一致）"""
+        if record.date == self.today_date:
+            self.today_base += float(f"{record.duration:.1f}")
+
+    def status(self):
+        """当前状态（可以 JSON 序列化，守护进程推送给各个客户端）"""
+        self.roll_day()
+        return {
+            "running": self.running,
+            "remark": self.remark,
+            "start_time": self.start_time,
+            "today_date": self.today_date,
+            "today_base": self.today_base,
+        }
+
+    def apply_status(self, status):
+        """按守护进程推送的状态更新本地的计时核心（客户端只用它来显示）"""
+        self.running = status["running"]
+        self.remark = status["remark"]
+        self.start_time = status["start_time"]
+        self.today_date = status["today_date"]
+        self.today_base = status["today_base"]
+        if self.running:
+            self.anchor_start()
+
+    def load_today(self):
+        """从存储中读取今天已有的总学习时间"""
+        self.set_day_total(self.today_date, self.store.day_total(self.today_date))
+        return self.today_base
+
+    def save(self, record):
+        """写入存储并累加今天的总时长"""
+        self.store.append(record)
+        self.record_saved(record)
+
+
+class TimerService:
+    """计时服务：计时核心 + 历史记录存储，开始/暂停/查询都经过这里。
+
+    守护进程（timer_daemon.py）通过 socket 对外提供同样的方法（见 timer_client.RemoteTimerService），
+    没有守护进程时界面和命令行直接在本进程中使用它。
+    正在进行的计时定期写入 SessionJournal；暂停后的记录先进入日志和写入缓冲，
+    每隔 commit_delay 秒（或缓冲满 commit_size 条、查询、退出时）成批写入历史文件并同步一次。
+    """
+
+    def __init__(self, store, journal_file=JOURNAL_FILE, checkpoint_interval=30,
+                 fsync_interval=120, commit_delay=1.0, commit_size=64):
+        self.history = store
+        self.core = TimerCore(store)
+        self.journal = SessionJournal(journal_file, checkpoint_interval, fsync_interval)
+        self.commit_delay = commit_delay
+        self.commit_size = commit_size
+        # 已暂停但还没写入历史文件的记录，及其中第一条进入缓冲的时间
+        self.pending = []
+        self.pending_since = 0.0
+        # 启动时从日志中恢复的、崩溃时中断的计时
+        self.recovered = None
+        self.recover()
+        self.core.load_today()
+
+    @property
+    def store(self):
+        """查询前先写入缓冲中的记录，查询结果总是包含已暂停的计时"""
+        if self.pending:
+            self.flush(force=True)
+        return self.history
+
+    def recover(self):
+        """处理上次留下的日志：补写未写入的记录；崩溃时中断的计时以最后一次 checkpoint 结束并保存，
+        正常退出时仍在进行的计时（命令行开始的，或关闭窗口时仍在计时的）继续计时"""
+        records, session = self.journal.recover()
+        if session is not None:
+            if session["detached"]:
+                self.core.start(session["remark"], session["start_time"])
+            elif session["checkpoint"] > session["start_time"]:
+                self.recovered = make_record(session["remark"], session["start_time"], session["checkpoint"])
+                records.append(self.recovered)
+        # 崩溃发生在写入历史文件之后、清空日志之前时，这些记录已经在历史文件中
+        existing = {}
+        for record in records:
+            if record.date not in existing:
+                existing[record.date] = {
+                    (r.start, r.end, f"{r.duration:.1f}", r.remark)
+                    for r in self.history.records_for_date(record.date)
+                }
+            if (record.start, record.end, f"{record.duration:.1f}", record.remark) not in existing[record.date]:
+                self.pending.append(record)
+        self.flush(force=True)
+
+    def running_session(self):
+        return (self.core.remark, self.core.start_time) if self.core.running else None
+
+    def status(self):
+        status = self.core.status()
+        status["recovered"] = self.recovered
+        return status
+
+    def start(self, remark):
+        """开始计时，返回新的状态"""
+        self.core.start(remark)
+        self.journal.start(self.core.remark, self.core.start_time)
+        return self.status()
+
+    def pause(self):
+        """暂停计时，返回 {"record": 记录, "status": 新的状态}；记录写入日志后即不会丢失，之后成批写入历史文件"""
+        record = self.core.stop()
+        self.journal.end(record)
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending.append(record)
+        self.core.record_saved(record)
+        try:
+            self.flush()
+        except OSError as e:
+            # 记录已在日志中，下次写入或下次启动时还会再写
+            print(f"写入历史记录失败（记录已保存在日志中）: {e}")
+        return {"record": record, "status": self.status()}
+
+    def append(self, records):
+        """追加外部的记录（脚本批量导入）：与暂停后的记录一样先写入日志（只 fsync 一次）再进入写入缓冲，
+        之后成批写入历史文件。返回追加的条数"""
+        records = list(records)
+        if not records:
+            return 0
+        self.journal.end_many(records)
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending.extend(records)
+        for record in records:
+            self.core.record_saved(record)
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"写入历史记录失败（记录已保存在日志中）: {e}")
+        return len(records)
+
+    def flush(self, force=False):
+        """把缓冲中的记录成批写入历史文件，同步后清空日志。
+        不强制时只有缓冲已满或已等待 commit_delay 秒才写入（查询前通过 store 属性强制写入）"""
+        if not self.pending:
+            if force and self.journal.unsynced:
+                self.journal.sync()
+            return
+        if not force and len(self.pending) < self.commit_size and \
+                time.monotonic() - self.pending_since < self.commit_delay:
+            return
+        self.history.append_many(self.pending)
+        self.history.sync()
+        self.pending = []
+        self.journal.commit(self.running_session())
+
+    def tick(self):
+        """定期调用（守护进程每秒一次）：计时中写 checkpoint，到时间后写入缓冲中的记录。
+        返回是否还需要继续调用（计时中或缓冲中还有记录）"""
+        if self.core.running:
+            self.journal.checkpoint()
+        if self.pending:
+            self.flush()
+        return self.core.running or bool(self.pending)
+
+    def stats(self):
+        """日志和成批写入的 I/O 计数"""
+        return dict(
+            self.journal.stats,
+            pending=len(self.pending),
+            checkpoint_interval=self.journal.checkpoint_interval,
+            fsync_interval=self.journal.fsync_interval,
+            commit_delay=self.commit_delay,
+        )
+
+    def subscribe(self, callback):
+        """本进程中只有一个使用者，没有需要推送的状态变化"""
+
+    def close(self):
+        """写入缓冲中的记录；仍在计时时在日志中标记为继续计时，下次启动时恢复"""
+        self.flush(force=True)
+        if self.core.running:
+            self.journal.detach()
+        self.journal.close()
+        if hasattr(self.history, "close"):
+            self.history.close()
@@ -0,0 +1,367 @@
+"""学习计时器守护进程：独占历史记录文件和正在进行的计时，界面、命令行和脚本都作为客户端连接
+
+    python timer_daemon.py
+    python timer_daemon.py --backend sqlite --port 47615
+
+协议：本机 TCP（127.0.0.1），每行一个 JSON 对象。
+请求 {"id": 1, "cmd": "start", "remark": "高数"}，应答 {"id": 1, "ok": true, "result": ...}
+或 {"id": 1, "ok": false, "error": "..."}。
+每个连接的第一条请求必须是 {"cmd": "auth", "token": ...}，令牌为 TOKEN_FILE 的内容
+（守护进程第一次启动时生成，只有当前系统用户可以读取），令牌不对时断开连接，
+所以同一台电脑上的其他账户不能读写本用户的计时。命令：
+- status                       当前状态
+- start {remark}               开始计时
+- pause                        暂停并保存本次记录，结果为 {"record": [...], "status": {...}}
+- query {method, args}         查询历史记录（day_total / daily_rows / remark_totals / range_totals 等）
+- append {records}             追加记录（脚本批量导入用），与暂停后的记录一样经过日志和写入缓冲；
+                               每条为 [日期, 开始时间, 结束时间, 时长, 备注]，有一条格式错误时整批不写入
+- subscribe                    之后状态变化时推送 {"event": "status", "status": {...}}
+- profile                      守护进程所属的用户
+- stats                        计时日志和成批写入的 I/O 计数（开启统计时附带 metrics，见 instrumentation.py）
+- shutdown                     退出守护进程
+同一端口只能有一个守护进程，所以历史文件只有一个写入者，也只读取一次。
+"""
+import argparse
+import hmac
+import json
+import os
+import selectors
+import secrets
+import socket
+import sys
+import zlib
+
+from history_store import HISTORY_BACKENDS
+from instrumentation import metrics
+from profiles import DEFAULT_PROFILE, open_profile_store, profile_journal
+from session_journal import JOURNAL_FILE
+from timer_core import TimerService, parse_record
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 47615
+# 其他用户的守护进程使用 DEFAULT_PORT 之后的这么多个端口之一（按用户名的 CRC32 选择）
+PROFILE_PORTS = 1000
+# 端口被其他用户的守护进程占用（用户名的 CRC32 冲突）时，依次尝试之后的这么多个端口
+PROFILE_PORT_PROBES = 8
+# 确认端口上是哪个用户的守护进程时的超时（秒）
+PROBE_TIMEOUT = 2
+# 认证令牌文件（可用环境变量 STUDY_TIMER_TOKEN_FILE 修改），在用户主目录中，权限 0600
+TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".study_timer", "daemon.token")
+
+# 允许客户端调用的存储查询方法
+QUERY_METHODS = {
+    "day_total", "today_total", "daily_rows", "remark_totals",
+    "records_for_date", "archived_totals", "grand_total", "preload",
+    "dedup_daily_totals", "dedup_remark_totals", "dedup_grand_total", "remark_stats",
+    "range_totals", "chart_series",
+}
+
+
+def daemon_ports(port=None, profile=None):
+    """守护进程可能使用的端口，按尝试的顺序：参数 > 环境变量 STUDY_TIMER_PORT > 默认端口。
+    每个用户有自己的守护进程（各自独占自己的历史记录），默认用户之外的端口按用户名偏移，
+    被其他用户占用时顺延到之后的端口"""
+    if port is None:
+        port = int(os.environ.get("STUDY_TIMER_PORT", DEFAULT_PORT))
+    if profile is None or profile == DEFAULT_PROFILE:
+        return [port]
+    offset = zlib.crc32(profile.encode("utf-8"))
+    return [port + 1 + (offset + i) % PROFILE_PORTS for i in range(PROFILE_PORT_PROBES)]
+
+
+def daemon_port(port=None, profile=None):
+    """用户的守护进程首选的端口"""
+    return daemon_ports(port, profile)[0]
+
+
+def load_token(create=False):
+    """读取认证令牌，不存在或读取失败时返回 None；create 时不存在就生成一个（目录 0700、文件 0600，
+    Windows 上由主目录的权限保护）"""
+    path = os.environ.get("STUDY_TIMER_TOKEN_FILE", TOKEN_FILE)
+    if create:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            if os.name != "nt":
+                os.chmod(path, 0o600)
+        else:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(secrets.token_hex(32))
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def port_profile(port, timeout=PROBE_TIMEOUT):
+    """端口上的守护进程所属的用户；连不上、认证失败或不是计时服务时返回 None"""
+    try:
+        with socket.create_connection((HOST, port), timeout) as sock:
+            sock.sendall(encode_message({"id": 0, "cmd": "auth", "token": load_token()})
+                         + encode_message({"id": 1, "cmd": "profile"}))
+            with sock.makefile("rb") as reader:
+                auth = json.loads(reader.readline())
+                message = json.loads(reader.readline())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(auth, dict) or not auth.get("ok") or not isinstance(message, dict):
+        return None
+    return message.get("result") if message.get("ok") else None
+
+
+class AuthenticationError(Exception):
+    """连接的第一条请求不是令牌正确的 auth"""
+
+
+def encode_message(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class TimerDaemon:
+    """单线程的 socket 服务：所有请求按到达顺序执行，不需要加锁"""
+
+    # 向客户端发送数据的超时（秒），超时的客户端直接断开
+    SEND_TIMEOUT = 5
+    # 计时中或有待写入的记录时，没有请求也每隔这么多秒调用一次 service.tick()（写 checkpoint、成批写入记录）
+    TICK_INTERVAL = 1.0
+
+    def __init__(self, service_factory, port=None, exit_when_idle=False, profile=DEFAULT_PROFILE):
+        # 客户端连接后用 profile 命令确认连到的是同一个用户的守护进程
+        self.profile = profile
+        # 由界面自动启动时，最后一个客户端断开且没有在计时就退出
+        self.exit_when_idle = exit_when_idle
+        self.selector = selectors.DefaultSelector()
+        self.token = load_token(create=True)
+        if self.token is None:
+            raise OSError(f"无法读取认证令牌 {os.environ.get('STUDY_TIMER_TOKEN_FILE', TOKEN_FILE)}")
+        self.server, self.port = self.bind(daemon_ports(port, profile))
+        self.server.listen()
+        self.server.setblocking(False)
+        # 先占用端口再打开存储：已有守护进程时不会读取历史文件
+        try:
+            self.service = service_factory()
+        except Exception:
+            self.server.close()
+            raise
+        self.selector.register(self.server, selectors.EVENT_READ)
+        # 客户端 socket -> 未处理完的接收缓冲
+        self.buffers = {}
+        # 已通过认证的客户端
+        self.authenticated = set()
+        self.subscribers = set()
+        self.running = False
+
+    def bind(self, ports):
+        """绑定第一个可用的端口，返回 (socket, 端口)。端口被其他用户的守护进程占用时尝试下一个；
+        被同一个用户的守护进程（或无法确认是谁）占用时抛出 OSError，保证每个用户只有一个写入者"""
+        for i, port in enumerate(ports):
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if os.name == "nt":
+                # Windows 上 SO_REUSEADDR 允许多个进程绑定同一端口，这里需要独占
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+            else:
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                server.bind((HOST, port))
+            except OSError:
+                server.close()
+                owner = port_profile(port)
+                if owner is None or owner == self.profile or i == len(ports) - 1:
+                    raise
+                metrics.count("daemon.port_collisions")
+                continue
+            # 前面的端口空出来后再启动时，同一个用户的守护进程可能还在之后的端口上
+            for later in ports[i + 1:]:
+                if port_profile(later) == self.profile:
+                    server.close()
+                    raise OSError(f"用户 {self.profile} 的计时服务已在端口 {later} 上运行")
+            return server, port
+
+    def serve_forever(self):
+        self.running = True
+        try:
+            needs_tick = True
+            while self.running:
+                # 暂停且没有待写入的记录时不需要定时唤醒，一直等到有请求为止
+                for key, _ in self.selector.select(self.TICK_INTERVAL if needs_tick else None):
+                    if key.fileobj is self.server:
+                        self.accept()
+                    else:
+                        self.receive(key.fileobj)
+                needs_tick = self.service.tick()
+        finally:
+            self.close()
+
+    def accept(self):
+        try:
+            conn, _ = self.server.accept()
+        except OSError:
+            return
+        # 只在可读时接收，发送使用带超时的阻塞模式，避免大结果发送一半
+        conn.settimeout(self.SEND_TIMEOUT)
+        self.buffers[conn] = b""
+        self.selector.register(conn, selectors.EVENT_READ)
+
+    def receive(self, conn):
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(conn)
+            return
+        buffer = self.buffers[conn] + data
+        *lines, self.buffers[conn] = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                self.handle_line(conn, line)
+            if conn not in self.buffers:
+                break
+
+    def handle_line(self, conn, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("请求必须是 JSON 对象")
+            request_id = request.get("id")
+            with metrics.timer(f"daemon.{request.get('cmd')}"):
+                result = self.handle(conn, request)
+            response = {"id": request_id, "ok": True, "result": result}
+        except AuthenticationError as e:
+            metrics.count("daemon.auth_failures")
+            self.send(conn, {"id": request_id, "ok": False, "error": str(e)})
+            self.disconnect(conn)
+            return
+        except ValueError as e:
+            # 命令参数错误（如没有填写学习内容）和请求格式错误都返回给客户端
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        except Exception as e:
+            print(f"处理请求失败: {e}")
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        self.send(conn, response)
+
+    def handle(self, conn, request):
+        """执行一条请求，返回结果"""
+        cmd = request.get("cmd")
+        if conn not in self.authenticated:
+            # 第一条请求必须是令牌正确的 auth
+            token = request.get("token")
+            if cmd != "auth" or not isinstance(token, str) or \
+                    not hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8")):
+                raise AuthenticationError("认证失败")
+            self.authenticated.add(conn)
+            return True
+        service = self.service
+        if cmd == "status":
+            return service.status()
+        if cmd == "start":
+            status = service.start(request.get("remark"))
+            self.broadcast(status)
+            return status
+        if cmd == "pause":
+            result = service.pause()
+            self.broadcast(result["status"])
+            return result
+        if cmd == "query":
+            method = request.get("method")
+            if method not in QUERY_METHODS:
+                raise ValueError(f"不支持的查询: {method}")
+            return getattr(service.store, method)(*request.get("args", []))
+        if cmd == "append":
+            records = request.get("records", [])
+            if not isinstance(records, list):
+                raise ValueError("records 应为记录的列表")
+            # 整批检查通过后才写入，格式错误时一条也不写
+            count = service.append([parse_record(record) for record in records])
+            self.broadcast(service.status())
+            return count
+        if cmd == "stats":
+            stats = service.stats()
+            if metrics.enabled:
+                stats["metrics"] = metrics.snapshot()
+            return stats
+        if cmd == "subscribe":
+            self.subscribers.add(conn)
+            return service.status()
+        if cmd == "profile":
+            return self.profile
+        if cmd == "shutdown":
+            self.running = False
+            return None
+        raise ValueError(f"未知命令: {cmd}")
+
+    def send(self, conn, message):
+        if conn not in self.buffers:
+            return
+        try:
+            conn.sendall(encode_message(message))
+        except OSError:
+            self.disconnect(conn)
+
+    def broadcast(self, status):
+        """把新的状态推送给所有订阅的客户端"""
+        for conn in list(self.subscribers):
+            self.send(conn, {"event": "status", "status": status})
+
+    def disconnect(self, conn):
+        self.buffers.pop(conn, None)
+        self.subscribers.discard(conn)
+        self.authenticated.discard(conn)
+        try:
+            self.selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+        conn.close()
+        if self.exit_when_idle and not self.buffers and not self.service.core.running:
+            self.running = False
+
+    def close(self):
+        for conn in list(self.buffers):
+            self.buffers.pop(conn)
+            conn.close()
+        self.selector.close()
+        self.server.close()
+        self.service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="学习计时器守护进程")
+    parser.add_argument("--backend", default="csv", choices=sorted(HISTORY_BACKENDS), help="存储后端")
+    parser.add_argument("--file", help="历史记录文件（默认使用该后端的默认文件名）")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="用户（默认用户使用原来的历史文件，其他用户使用按月分片）")
+    parser.add_argument("--journal", help=f"正在进行的计时的日志文件（默认 {JOURNAL_FILE}，其他用户在各自的目录中）")
+    parser.add_argument("--checkpoint-interval", type=float, default=30,
+                        help="计时中每隔多少秒把当前时间写入日志（默认 30）")
+    parser.add_argument("--fsync-interval", type=float, default=120,
+                        help="checkpoint 每隔多少秒 fsync 一次（默认 120）")
+    parser.add_argument("--commit-delay", type=float, default=1.0,
+                        help="暂停后的记录最多缓冲多少秒再成批写入历史文件（默认 1）")
+    parser.add_argument("--port", type=int, help=f"监听端口（默认 {DEFAULT_PORT}，或环境变量 STUDY_TIMER_PORT）")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="最后一个客户端断开且没有在计时时退出（界面自动启动时使用）")
+    args = parser.parse_args(argv)
+    try:
+        daemon = TimerDaemon(
+            lambda: TimerService(
+                open_profile_store(args.profile, args.backend, args.file),
+                args.journal or profile_journal(args.profile),
+                args.checkpoint_interval, args.fsync_interval, args.commit_delay
+            ),
+            args.port, args.exit_when_idle, args.profile
+        )
+    except OSError as e:
+        print(f"启动计时服务失败（端口 {daemon_port(args.port, args.profile)} 可能已有计时服务在运行）: {e}")
+        return 1
+    except ValueError as e:
+        print(f"启动计时服务失败: {e}")
+        return 1
+    print(f"计时服务已启动: {HOST}:{daemon.port}")
+    daemon.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import tkinter as tk
+from tkinter import ttk
+
+from instrumentation import metrics, timed
+
+
+class RowSource:
+    """虚拟列表的数据源：保存原始数据，只在行进入可见区域时才格式化"""
+
+    def __init__(self, rows, formatter, sort_keys=None):
+        self.rows = rows
+        # 原始行 -> Treeview 显示的 values
+        self.formatter = formatter
+        # 列名 -> 排序键函数，没有的列不能排序
+        self.sort_keys = sort_keys or {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row(self, index):
+        """返回第 index 行的原始数据"""
+        return self.rows[index]
+
+    def values(self, index):
+        """返回第 index 行格式化后的显示值"""
+        return self.formatter(self.rows[index])
+
+    def sort(self, column, reverse=False):
+        """按列排序，返回是否排序成功"""
+        key = self.sort_keys.get(column)
+        if key is None:
+            return False
+        self.rows.sort(key=key, reverse=reverse)
+        return True
+
+
+class VirtualTreeview(tk.Frame):
+    """虚拟滚动列表：Treeview 中只保留一屏的行，滚动时复用这些行显示不同的数据"""
+
+    def __init__(self, master, columns, source):
+        """
+        :param columns: [(列名, 标题, 宽度), ...]
+        :param source: RowSource 数据源
+        """
+        super().__init__(master)
+        self.source = source
+        self.column_names = [name for name, _, _ in columns]
+        # 当前显示的第一行在数据中的下标
+        self.first = 0
+        # 可见区域能容纳的行数
+        self.visible = 1
+        # 选中行在数据中的下标（可能已滚出可见区域）
+        self.selected = None
+        self.sort_reverse = {}
+
+        self.tree = ttk.Treeview(self, columns=self.column_names, show="headings", selectmode="browse")
+        for name, heading, width in columns:
+            self.tree.heading(name, text=heading, command=lambda c=name: self.sort_by(c))
+            self.tree.column(name, width=width, anchor="center")
+
+        # 滚动条由自己驱动，范围对应整个数据源而不是 Treeview 中的行
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(fill="both", expand=True)
+
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self.visible))
+        self.tree.bind("<Home>", lambda e: self.move_selection(-len(self.source)))
+        self.tree.bind("<End>", lambda e: self.move_selection(len(self.source)))
+        self.render()
+
+    def set_source(self, source):
+        """替换数据源并回到顶部"""
+        self.source = source
+        self.first = 0
+        self.selected = None
+        self.render()
+
+    def row_height(self):
+        """Treeview 的行高（像素）"""
+        height = ttk.Style().lookup("Treeview", "rowheight")
+        try:
+            return max(1, int(height))
+        except (TypeError, ValueError):
+            return 20
+
+    def on_configure(self, event):
+        """窗口大小变化时重新计算可见行数"""
+        row_height = self.row_height()
+        slots = self.tree.get_children()
+        bbox = self.tree.bbox(slots[0]) if slots else None
+        # 标题栏高度：有行时按第一行的位置计算，否则按一行估算
+        header = bbox[1] if bbox else row_height + 4
+        self.visible = max(1, (event.height - header) // row_height)
+        self.render()
+
+    @timed("ui.tree.render")
+    def render(self):
+        """把 first 开始的一屏数据填入 Treeview 中复用的行"""
+        total = len(self.source)
+        count = min(self.visible, total)
+        self.first = max(0, min(self.first, total - count))
+
+        # 行数只在窗口大小或数据量变化时调整
+        slots = self.tree.get_children()
+        for slot in range(len(slots), count):
+            self.tree.insert("", "end", iid=str(slot))
+        for slot in range(count, len(slots)):
+            self.tree.delete(str(slot))
+
+        for slot in range(count):
+            self.tree.item(str(slot), values=self.source.values(self.first + slot))
+        metrics.count("ui.tree.rows_rendered", count)
+
+        if self.selected is not None and self.first <= self.selected < self.first + count:
+            slot = str(self.selected - self.first)
+            self.tree.selection_set(slot)
+            self.tree.focus(slot)
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, delta):
+        """滚动 delta 行"""
+        self.first += delta
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        """处理滚动条的拖动（moveto）和点击（scroll）"""
+        if action == "moveto":
+            self.first = int(float(amount) * len(self.source))
+            self.render()
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        """Windows/macOS 的鼠标滚轮"""
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_select(self, event):
+        """记录用户选中的数据行"""
+        selection = self.tree.selection()
+        if selection:
+            self.selected = self.first + int(selection[0])
+
+    def move_selection(self, delta):
+        """键盘移动选中行，超出可见区域时自动滚动"""
+        total = len(self.source)
+        if not total:
+            return "break"
+        current = self.selected if self.selected is not None else self.first - (1 if delta > 0 else -1)
+        self.selected = max(0, min(total - 1, current + delta))
+        if self.selected < self.first:
+            self.first = self.selected
+        elif self.selected >= self.first + self.visible:
+            self.first = self.selected - self.visible + 1
+        self.render()
+        return "break"
+
+    def sort_by(self, column):
+        """点击标题按该列排序，再次点击反向排序"""
+        reverse = self.sort_reverse.get(column, False)
+        if self.source.sort(column, reverse):
+            self.sort_reverse[column] = not reverse
+            self.first = 0
+            self.selected = None
+            self.render()
+
+    def selected_row(self):
+        """返回选中行的原始数据，没有选中时返回 None"""
+        if self.selected is None or self.selected >= len(self.source):
+            return None
+        return self.source.row(self.selected)
+
+    def bind_row(self, sequence, callback):
+        """绑定行事件，callback 收到事件所在行的原始数据"""
+        def handler(event):
+            slot = self.tree.identify_row(event.y)
+            if slot:
+                self.selected = self.first + int(slot)
+                callback(self.source.row(self.selected))
+        self.tree.bind(sequence, handler)